@@ -0,0 +1,145 @@
+"""
+Microbenchmarks for the postcode and website normalisers used by the
+scrapers and `update_geodata`.
+
+Compares the memoised normalisers with the previous implementations, using
+values that repeat in the way they do across the charity and school
+imports.
+
+    python -m benchmarks.normalise
+"""
+
+import os
+import random
+import re
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "findthatcharity.settings")
+django.setup()
+
+import validators  # noqa: E402
+
+from ftc.management.commands._normalise import (  # noqa: E402
+    POSTCODE_REGEX,
+    match_postcode,
+    normalise_postcode,
+    normalise_url,
+)
+
+VALUES = 200_000
+DISTINCT_POSTCODES = 20_000
+DISTINCT_URLS = 5_000
+REPEAT = 3
+
+
+def make_postcodes():
+    random.seed(0)
+    letters = "ABCDEFGHJKLMNPRSTUWYZ"
+    distinct = [
+        "{}{}{} {}{}{}".format(
+            random.choice(letters),
+            random.choice(letters),
+            random.randint(1, 99),
+            random.randint(0, 9),
+            random.choice(letters),
+            random.choice(letters),
+        )
+        for _ in range(DISTINCT_POSTCODES)
+    ]
+    # some postcodes need cleaning up
+    distinct = [
+        p.lower().replace(" ", "") if random.random() < 0.2 else p for p in distinct
+    ]
+    return [random.choice(distinct) for _ in range(VALUES)]
+
+
+def make_urls():
+    random.seed(0)
+    formats = ["https://www.{}.org.uk/", "www.{}.org.uk", "http//{}.co.uk", "{}.com"]
+    distinct = [
+        random.choice(formats).format("charity{}".format(i))
+        for i in range(DISTINCT_URLS)
+    ]
+    return [random.choice(distinct) for _ in range(VALUES // 10)]
+
+
+def previous_parse_postcode(postcode):
+    if postcode is None:
+        return None
+    postcode = postcode.strip().upper()
+    if postcode == "":
+        return None
+    postcode = re.sub("[^0-9a-zA-Z]+", "", postcode)
+    if postcode == "":
+        return None
+    if len(postcode) > 7:
+        return postcode
+    first_part = list(postcode[:-3].strip())
+    last_part = list(postcode[-3:].strip())
+    if last_part and last_part[0] == "O":
+        last_part[0] = "0"
+    return "%s %s" % ("".join(first_part), "".join(last_part))
+
+
+def previous_match_postcode(value):
+    postcode = previous_parse_postcode(value)
+    if postcode and POSTCODE_REGEX.match(postcode):
+        return postcode
+
+
+def previous_parse_url(url):
+    if url is None:
+        return None
+    url = url.strip()
+    if validators.url(url):
+        return url
+    if validators.url("http://%s" % url):
+        return "http://%s" % url
+    for i in [
+        "http;//",
+        "http//",
+        "http.//",
+        "http:\\\\",
+        "http://http://",
+        "www://",
+        "www.http://",
+    ]:
+        url = url.replace(i, "http://")
+    url = url.replace("http:/www", "http://www")
+    for i in ["www,", ":www", "www:", "www/", "www\\\\", ".www"]:
+        url = url.replace(i, "www.")
+    url = url.replace(",", ".")
+    url = url.replace("..", ".")
+    if validators.url(url):
+        return url
+    if validators.url("http://%s" % url):
+        return "http://%s" % url
+
+
+def run(name, func, values):
+    seconds = min(
+        timeit.repeat(lambda: [func(v) for v in values], number=1, repeat=REPEAT)
+    )
+    print("{:<24} {:>8.3f} µs per value".format(name, seconds / len(values) * 1e6))
+
+
+def main():
+    postcodes = make_postcodes()
+    urls = make_urls()
+    assert [normalise_postcode(p) for p in postcodes] == [
+        previous_parse_postcode(p) for p in postcodes
+    ]
+    assert [normalise_url(u) for u in urls] == [previous_parse_url(u) for u in urls]
+
+    run("parse_postcode (before)", previous_parse_postcode, postcodes)
+    run("normalise_postcode", normalise_postcode, postcodes)
+    run("split_address (before)", previous_match_postcode, postcodes)
+    run("match_postcode", match_postcode, postcodes)
+    run("parse_url (before)", previous_parse_url, urls)
+    run("normalise_url", normalise_url, urls)
+
+
+if __name__ == "__main__":
+    main()
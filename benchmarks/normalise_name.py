@@ -0,0 +1,81 @@
+"""
+Benchmark for `normalise_name` at indexing scale.
+
+Compares building the stopword list for every call with the precompiled
+stopword set, with and without the cache, and the batch `normalise_names`.
+
+    python -m benchmarks.normalise_name
+"""
+
+import os
+import random
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "findthatcharity.settings")
+django.setup()
+
+from findthatcharity.utils import (  # noqa: E402
+    WORD_BOUNDARY_REGEX,
+    normalise_name,
+    normalise_names,
+)
+
+NAMES = 500_000
+REPEAT = 3
+WORDS = (
+    "the trust of charity community association friends school church parish "
+    "limited ltd uk and for sports club foundation st mary society village hall"
+).split()
+
+
+def make_names():
+    random.seed(0)
+    return [
+        " ".join(random.choice(WORDS) for _ in range(random.randint(2, 7))).title()
+        for _ in range(NAMES)
+    ]
+
+
+def previous_normalise_name(n):
+    stopwords = [
+        "the",
+        "of",
+        "in",
+        "uk",
+        "ltd",
+        "limited",
+        "and",
+        "&",
+        "+",
+        "co",
+        "for",
+    ]
+    return " ".join(
+        [w for w in WORD_BOUNDARY_REGEX.findall(n.lower()) if w not in stopwords]
+    ).strip()
+
+
+def main():
+    names = make_names()
+    expected = [previous_normalise_name(n) for n in names]
+    assert [normalise_name(n) for n in names] == expected
+    assert normalise_names(names) == expected
+
+    for name, func in (
+        ("before", lambda: [previous_normalise_name(n) for n in names]),
+        ("uncached", lambda: [normalise_name.__wrapped__(n) for n in names]),
+        ("cached", lambda: [normalise_name(n) for n in names]),
+        ("batch", lambda: normalise_names(names)),
+    ):
+        seconds = min(
+            timeit.repeat(
+                func, setup=normalise_name.cache_clear, number=1, repeat=REPEAT
+            )
+        )
+        print("{:<10} {:>8.3f} µs per name".format(name, seconds / NAMES * 1e6))
+
+
+if __name__ == "__main__":
+    main()
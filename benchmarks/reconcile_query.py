@@ -0,0 +1,62 @@
+"""
+Microbenchmark for building the reconciliation query.
+
+Compares the precompiled `ReconcileQuery.build()` with deep copying the
+template from `query.json` for every request.
+
+    python -m benchmarks.reconcile_query
+"""
+
+import copy
+import json
+import os
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "findthatcharity.settings")
+django.setup()
+
+from reconcile.query import RECONCILE_QUERY  # noqa: E402
+
+NUMBER = 100_000
+
+with open(os.path.join("reconcile", "query.json")) as a:
+    TEMPLATE = json.load(a)
+
+
+def deepcopy_query():
+    json_q = copy.deepcopy(TEMPLATE)
+    json_q["inline"]["query"]["function_score"]["functions"].append(
+        {"filter": {"match": {"postalCode": "{{postcode}}"}}, "weight": 2}
+    )
+    json_q["inline"]["query"]["function_score"]["query"]["bool"]["filter"] = [
+        {"terms": {"organisationType": ["registered-charity"]}}
+    ]
+    return json_q["inline"], {"name": "Test", "postcode": "SW1A 1AA"}
+
+
+def build_query():
+    return RECONCILE_QUERY.build(
+        "Test",
+        postcode="SW1A 1AA",
+        filter_=[{"terms": {"organisationType": ["registered-charity"]}}],
+    )
+
+
+def main():
+    for name, func in (("deepcopy", deepcopy_query), ("build", build_query)):
+        seconds = min(timeit.repeat(func, number=NUMBER, repeat=5))
+        print("{:<10} {:>8.2f} µs per query".format(name, seconds / NUMBER * 1_000_000))
+        seconds = min(
+            timeit.repeat(lambda: json.dumps(func()[0]), number=NUMBER, repeat=5)
+        )
+        print(
+            "{:<10} {:>8.2f} µs per query (serialised)".format(
+                name, seconds / NUMBER * 1_000_000
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
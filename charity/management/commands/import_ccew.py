@@ -4,7 +4,6 @@ import io
 import re
 import zipfile
 
-import psycopg2
 import tqdm
 
 from charity.management.commands._ccew_sql import UPDATE_CCEW
@@ -24,6 +23,7 @@ from charity.models import (
     CCEWCharityTrustee,
 )
 from ftc.management.commands._base_scraper import BaseScraper
+from ftc.management.commands._bulk_upsert import bulk_copy
 from ftc.models import (
     Organisation,
     OrganisationClassification,
@@ -113,7 +113,6 @@ class Command(BaseScraper):
 
     def process_file(self, csvfile, filename):
         db_table = self.ccew_file_to_object.get(filename)
-        page_size = 1000
 
         def get_data(reader, row_count=None):
             for k, row in tqdm.tqdm(enumerate(reader)):
@@ -146,17 +145,17 @@ class Command(BaseScraper):
         )
         self.logger.info("Starting table insert [{}]".format(db_table._meta.db_table))
         db_table.objects.all().delete()
-        statement = """INSERT INTO "{table}" ("{fields}") VALUES %s;""".format(
-            table=db_table._meta.db_table,
-            fields='", "'.join(["id"] + list(reader.fieldnames)),
-        )
-        psycopg2.extras.execute_values(
+        row_count = bulk_copy(
             self.cursor,
-            statement,
+            db_table._meta.db_table,
+            ["id"] + list(reader.fieldnames),
             get_data(reader, len(reader.fieldnames) + 1),
-            page_size=page_size,
         )
-        self.logger.info("Finished table insert [{}]".format(db_table._meta.db_table))
+        self.logger.info(
+            "Finished table insert [{}] ({:,.0f} rows)".format(
+                db_table._meta.db_table, row_count
+            )
+        )
 
     def close_spider(self):
         # execute SQL statements
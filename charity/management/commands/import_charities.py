@@ -1,20 +1,6 @@
-from django.core import management
-from django.core.management.base import BaseCommand
+from ftc.management.commands.run_pipeline import Command as PipelineCommand
 
 
-class Command(BaseCommand):
-    scrapers = [
-        "ccni",
-        # "oscr",
-        "ccew",
-    ]
-
-    def handle(self, *args, **options):
-        for scraper in self.scrapers:
-            try:
-                management.call_command("import_{}".format(scraper))
-            except Exception:
-                self.stdout.write(self.style.ERROR("Command {} failed".format(scraper)))
-        management.call_command("import_ukcat")
-        management.call_command("calculate_scale")
-        management.call_command("import_names")
+class Command(PipelineCommand):
+    help = "Run the charity imports"
+    pipeline = "charities"
@@ -1,5 +1,7 @@
 import datetime
+import functools
 import os
+import time
 
 from charity_django.utils.text import list_to_string, regex_search, to_titlecase
 from django.conf import settings
@@ -22,60 +24,121 @@ from findthatcharity.utils import (
     url_remove,
     url_replace,
 )
-from ftc.models import Organisation, OrganisationType, OrgidScheme, Source
+from ftc.models import Organisation, OrganisationType, OrgidScheme, Scrape, Source
 from geo.models import GeoLookup
 from jinja2 import Environment
 
+# how long lookups are kept in process memory before checking for new data
+LOCAL_CACHE_TIMEOUT = 60
+SHARED_CACHE_TIMEOUT = 60 * 60
 
+_local_cache = {}
+
+
+def clear_local_cache():
+    _local_cache.clear()
+
+
+def get_data_version():
+    """
+    Return the id of the latest successful scrape, which changes whenever new
+    data has been loaded. Checked at most every `LOCAL_CACHE_TIMEOUT` seconds.
+    """
+    expires, version = _local_cache.get("data_version", (0, None))
+    if time.monotonic() < expires:
+        return version
+    version = None
+    if Scrape._meta.db_table in connections["data"].introspection.table_names():
+        version = (
+            Scrape.objects.filter(
+                status__in=[Scrape.ScrapeStatus.SUCCESS, Scrape.ScrapeStatus.ERRORS]
+            )
+            .order_by("-id")
+            .values_list("id", flat=True)
+            .first()
+        )
+    _local_cache["data_version"] = (time.monotonic() + LOCAL_CACHE_TIMEOUT, version)
+    return version
+
+
+def cached_lookup(cache_key, shared=True):
+    """
+    Cache the result of a lookup in process memory, in front of the shared
+    django cache. Both are keyed to the latest successful scrape, so the
+    lookup is only run again once new data has been loaded.
+
+    Lookups that are too big to be worth pickling into the shared cache can
+    be kept in process memory only with `shared=False`.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            expires, version, value = _local_cache.get(cache_key, (0, None, None))
+            if time.monotonic() < expires:
+                return value
+
+            current_version = get_data_version()
+            if value is None or version != current_version:
+                shared_key = "{}:{}".format(cache_key, current_version)
+                value = cache.get(shared_key) if shared else None
+                if value is None:
+                    value = func(*args, **kwargs)
+                    if value and shared:
+                        cache.set(shared_key, value, SHARED_CACHE_TIMEOUT)
+            _local_cache[cache_key] = (
+                time.monotonic() + LOCAL_CACHE_TIMEOUT,
+                current_version,
+                value,
+            )
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+@cached_lookup("orgtypes")
 def get_orgtypes():
-    cache_key = "orgtypes"
-    value = cache.get(cache_key)
-    if value:
-        return value
     if (
         OrganisationType._meta.db_table
-        in connections["data"].introspection.table_names()
+        not in connections["data"].introspection.table_names()
     ):
-        by_orgtype = {
-            ot["orgtype"]: ot["records"]
-            for ot in Organisation.objects.annotate(
-                orgtype=Func(F("organisationType"), function="unnest")
-            )
-            .values("orgtype")
-            .annotate(records=Count("*"))
-            .order_by("-records")
-        }
-        value = {}
-        for o in OrganisationType.objects.all():
-            o.records = by_orgtype.get(o.slug, 0)
-            value[o.slug] = o
-        value = {
-            k: v for k, v in sorted(value.items(), key=lambda item: -item[1].records)
-        }
-        cache.set(cache_key, value, 60 * 60)
-    else:
-        value = {}
-    return value
+        return {}
+    by_orgtype = {
+        ot["orgtype"]: ot["records"]
+        for ot in Organisation.objects.annotate(
+            orgtype=Func(F("organisationType"), function="unnest")
+        )
+        .values("orgtype")
+        .annotate(records=Count("*"))
+        .order_by("-records")
+    }
+    value = {}
+    for o in OrganisationType.objects.all():
+        o.records = by_orgtype.get(o.slug, 0)
+        value[o.slug] = o
+    return {k: v for k, v in sorted(value.items(), key=lambda item: -item[1].records)}
 
 
 def orgtypes_to_dict(orgtypes):
     return {o.slug: o.title for o in orgtypes.values()}
 
 
+@cached_lookup("sources")
+def get_all_sources():
+    if Source._meta.db_table not in connections["data"].introspection.table_names():
+        return {}
+    return {
+        s.id: s
+        for s in Source.objects.all()
+        .annotate(records=Count("organisations"))
+        .order_by("-records")
+    }
+
+
 def get_sources(split=False):
-    cache_key = "sources"
-    value = cache.get(cache_key)
-    if not value:
-        if Source._meta.db_table in connections["data"].introspection.table_names():
-            value = {
-                s.id: s
-                for s in Source.objects.all()
-                .annotate(records=Count("organisations"))
-                .order_by("-records")
-            }
-            cache.set(cache_key, value, 60 * 60)
-        else:
-            value = {}
+    value = get_all_sources()
 
     if split:
         MONTH_AGO = datetime.datetime.now() - datetime.timedelta(days=30)
@@ -95,41 +158,41 @@ def get_sources(split=False):
     return value
 
 
+@cached_lookup("orgidschemes")
 def get_orgidschemes():
-    cache_key = "orgidschemes"
-    value = cache.get(cache_key)
-    if value:
-        return value
-    if OrgidScheme._meta.db_table in connections["data"].introspection.table_names():
-        value = {s.code: s for s in OrgidScheme.objects.all()}
-        cache.set(cache_key, value, 60 * 60)
-    else:
-        value = {}
-    return value
+    if (
+        OrgidScheme._meta.db_table
+        not in connections["data"].introspection.table_names()
+    ):
+        return {}
+    return {s.code: s for s in OrgidScheme.objects.all()}
 
 
+@cached_lookup("locationnames")
 def get_locations(areatypes=settings.DEFAULT_AREA_TYPES):
-    cache_key = "locationnames"
-    value = cache.get(cache_key)
-    if value:
-        return value
-    if GeoLookup._meta.db_table in connections["data"].introspection.table_names():
-        value = {}
-        for s in GeoLookup.objects.filter(geoCodeType__in=areatypes):
-            if s.geoCodeType not in value:
-                value[s.geoCodeType] = {}
-            value[s.geoCodeType][s.geoCode] = s.name
-        cache.set(cache_key, value, 60 * 60)
-    else:
-        value = {}
+    if GeoLookup._meta.db_table not in connections["data"].introspection.table_names():
+        return {}
+    value = {}
+    for s in GeoLookup.objects.filter(geoCodeType__in=areatypes):
+        if s.geoCodeType not in value:
+            value[s.geoCodeType] = {}
+        value[s.geoCodeType][s.geoCode] = s.name
     return value
 
 
+@cached_lookup("geonames", shared=False)
+def get_geonames():
+    """
+    Map of every geography code to its name. This has a row for every
+    geography, so it is only kept in process memory.
+    """
+    if GeoLookup._meta.db_table not in connections["data"].introspection.table_names():
+        return {}
+    return dict(GeoLookup.objects.values_list("geoCode", "name").iterator())
+
+
 def get_geoname(code):
-    try:
-        return GeoLookup.objects.get(geoCode=code).name
-    except GeoLookup.DoesNotExist:
-        return code
+    return get_geonames().get(code, code)
 
 
 def environment(**options):
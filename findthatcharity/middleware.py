@@ -1,10 +1,18 @@
+import atexit
 import datetime
+import logging
+import queue
+import threading
+import time
+from functools import lru_cache
+from itertools import groupby
 
 from django.conf import settings
-from django.urls import Resolver404, resolve
 from sqlite_utils import Database
 from ua_parser import user_agent_parser
 
+logger = logging.getLogger(__name__)
+
 
 class XCLacksMiddleware:
     def __init__(self, get_response):
@@ -16,34 +24,126 @@ class XCLacksMiddleware:
         return response
 
 
+@lru_cache(maxsize=2048)
+def parse_user_agent(user_agent_string):
+    ua = user_agent_parser.Parse(user_agent_string)
+    return {k: v for k, v in ua.items() if k != "string"}
+
+
+class LogWriter:
+    """
+    Write request logs to a sqlite database from a background thread.
+
+    Records are queued by the request and inserted in batches of
+    `batch_size`, or every `flush_ms` milliseconds, in one transaction. If the
+    queue is full the record is dropped and counted rather than blocking the
+    request. The database filename is formatted with the date of each record
+    so the files roll over.
+    """
+
+    def __init__(self, filename, batch_size=500, flush_ms=1000, queue_size=10000):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.dropped_reported = 0
+        self._db = None
+        self._db_filename = None
+        self._thread = threading.Thread(
+            target=self._run, name="ftc-log-writer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        atexit.unregister(self.close)
+        try:
+            self.queue.put(None, timeout=self.flush_interval)
+        except queue.Full:
+            return
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        finished = False
+        while not finished:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if record is None:
+                    finished = True
+                    break
+                batch.append(record)
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as err:
+                    logger.exception(err)
+
+    def _get_filename(self, record):
+        date = datetime.date.fromisoformat(record["timestamp"][:10])
+        return self.filename.format(year=date.year, month=date.month, day=date.day)
+
+    def _get_db(self, filename):
+        if filename != self._db_filename:
+            if self._db is not None:
+                self._db.close()
+            self._db = Database(filename)
+            self._db_filename = filename
+        return self._db
+
+    def _write(self, batch):
+        for record in batch:
+            if record["user_agent_string"]:
+                record["user_agent"] = parse_user_agent(record["user_agent_string"])
+        for filename, records in groupby(batch, key=self._get_filename):
+            db = self._get_db(filename)
+            with db.conn:
+                db["logs"].insert_all(records)
+
+        if self.dropped > self.dropped_reported:
+            logger.warning(
+                "Request log queue full, dropped {:,.0f} records".format(
+                    self.dropped - self.dropped_reported
+                )
+            )
+            self.dropped_reported = self.dropped
+
+
 class FTCLoggingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
         if settings.LOGGING_DB:
-            self.db_args = dict(
-                filename_or_conn=settings.LOGGING_DB.format(
-                    year=datetime.datetime.now().year,
-                    month=datetime.datetime.now().month,
-                    day=datetime.datetime.now().day,
-                )
+            self.writer = LogWriter(
+                settings.LOGGING_DB,
+                batch_size=settings.LOGGING_DB_BATCH_SIZE,
+                flush_ms=settings.LOGGING_DB_FLUSH_MS,
+                queue_size=settings.LOGGING_DB_QUEUE_SIZE,
             )
         else:
-            self.db_args = dict(memory=True)
-
-    def _get_db(self):
-        return Database(**self.db_args)
+            self.writer = None
 
     def __call__(self, request):
         response = self.get_response(request)
-        if isinstance(request.META.get("HTTP_USER_AGENT"), str):
-            ua = user_agent_parser.Parse(request.META.get("HTTP_USER_AGENT"))
-        else:
-            ua = None
-        try:
-            resolver_match = resolve(request.path_info)
-        except Resolver404:
-            resolver_match = None
-        self._get_db()["logs"].insert(
+        if self.writer is None:
+            return response
+
+        user_agent_string = request.META.get("HTTP_USER_AGENT")
+        if not isinstance(user_agent_string, str):
+            user_agent_string = None
+        # set by django when the view was resolved
+        resolver_match = getattr(request, "resolver_match", None)
+        self.writer.write(
             {
                 "app": "findthatcharity",
                 "timestamp": datetime.datetime.now().isoformat(),
@@ -56,10 +156,9 @@ class FTCLoggingMiddleware:
                 # "remote_addr": request.remote_addr,  # we don't collect IP address
                 "endpoint": resolver_match.view_name if resolver_match else None,
                 "view_args": resolver_match.kwargs if resolver_match else None,
-                "user_agent_string": ua.get("string") if ua else None,
-                "user_agent": {k: v for k, v in ua.items() if k != "string"}
-                if ua
-                else None,
+                "user_agent_string": user_agent_string,
+                # parsed by the log writer
+                "user_agent": None,
                 "status_code": response.status_code,
                 "response_size": response.get("Content-Length", ""),
                 "content_type": response.get("Content-Type", "").replace(
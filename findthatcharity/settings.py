@@ -275,6 +275,9 @@ LOGGING = {
 }
 # Separate logging of requests
 LOGGING_DB = os.environ.get("LOGGING_DB")
+LOGGING_DB_BATCH_SIZE = int(os.environ.get("LOGGING_DB_BATCH_SIZE", 500))
+LOGGING_DB_FLUSH_MS = int(os.environ.get("LOGGING_DB_FLUSH_MS", 1000))
+LOGGING_DB_QUEUE_SIZE = int(os.environ.get("LOGGING_DB_QUEUE_SIZE", 10000))
 
 CORS_ALLOW_ALL_ORIGINS = True
 SECURE_REFERRER_POLICY = "strict-origin-when-cross-origin"
@@ -348,6 +351,16 @@ S3_ACCESS_ID = os.environ.get("S3_ACCESS_ID")
 S3_SECRET_KEY = os.environ.get("S3_SECRET_KEY")
 S3_BUCKET = os.environ.get("S3_BUCKET")
 
+# pre-generated bulk downloads, written by the `export_downloads` command.
+# The web servers only see files in DOWNLOADS_DIR if it is on a volume shared
+# with the container that runs the command. Otherwise use
+# `export_downloads --upload-to-storage` and set DOWNLOADS_URL to the public
+# URL of S3_BUCKET, and downloads are redirected there.
+DOWNLOADS_DIR = os.environ.get(
+    "DOWNLOADS_DIR", os.path.join(BASE_DIR, "data", "downloads")
+)
+DOWNLOADS_URL = os.environ.get("DOWNLOADS_URL")
+
 SIMPLE_ANALYTICS_API_KEY = os.environ.get("SIMPLE_ANALYTICS_API_KEY")
 HESA_SUPPLIER_HEADER = os.environ.get("HESA_SUPPLIER_HEADER")
 HESA_SUPPLIER_ID = os.environ.get("HESA_SUPPLIER_ID")
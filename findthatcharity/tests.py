@@ -1,12 +1,23 @@
+import datetime
+import json
+import os
+import tempfile
+import time
 import unittest
+from unittest.mock import patch
 
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
 from django.urls import reverse
+from sqlite_utils import Database
 
 import ftc.tests
+from findthatcharity.middleware import FTCLoggingMiddleware, LogWriter
 from findthatcharity.utils import (
     format_currency,
     get_domain,
     normalise_name,
+    normalise_names,
     number_format,
     str_format,
 )
@@ -47,6 +58,10 @@ class TestUtils(unittest.TestCase):
         )
         for name, normalised in items:
             self.assertEqual(normalise_name(name), normalised)
+        self.assertEqual(
+            normalise_names([name for name, _ in items]),
+            [normalised for _, normalised in items],
+        )
 
     def test_str_format(self):
         self.assertEqual(str_format("test", "[{}]"), "[test]")
@@ -104,3 +119,103 @@ class TestClacks(ftc.tests.TestCase):
     def test_xheader_exists(self):
         response = self.client.get(reverse("about"))
         self.assertEqual(response["X-Clacks-Overhead"], "GNU Terry Pratchett")
+
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0"
+)
+
+
+class LoggingMiddlewareTests(ftc.tests.TestCase):
+    def setUp(self):
+        super().setUp()
+        logs_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(logs_dir.cleanup)
+        self.logging_db = os.path.join(logs_dir.name, "logs-{year}-{month}-{day}.db")
+
+        # stop the background thread of every writer the middleware starts
+        patcher = patch(
+            "findthatcharity.middleware.LogWriter", side_effect=self.start_writer
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start_writer(self, *args, **kwargs):
+        writer = LogWriter(*args, **kwargs)
+        self.addCleanup(self.stop_writer, writer)
+        return writer
+
+    def stop_writer(self, writer):
+        writer.close()
+        self.assertFalse(writer._thread.is_alive())
+
+    def get_rows(self, expected, timeout=5):
+        """Wait for the log writer to write the expected number of rows"""
+        today = datetime.date.today()
+        filename = self.logging_db.format(
+            year=today.year, month=today.month, day=today.day
+        )
+        deadline = time.monotonic() + timeout
+        while True:
+            rows = []
+            if os.path.exists(filename):
+                db = Database(filename)
+                if db["logs"].exists():
+                    rows = list(db["logs"].rows)
+                db.close()
+            if len(rows) >= expected or time.monotonic() >= deadline:
+                return rows
+            time.sleep(0.05)
+
+    def get_middleware(self):
+        return FTCLoggingMiddleware(lambda request: HttpResponse("ok"))
+
+    def test_requests_logged(self):
+        with override_settings(LOGGING_DB=self.logging_db, LOGGING_DB_FLUSH_MS=10):
+            response = self.client.get(
+                reverse("about"), {"q": "test"}, headers={"User-Agent": USER_AGENT}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.client.get("/does-not-exist")
+
+        rows = self.get_rows(2)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["path"], reverse("about"))
+        self.assertEqual(rows[0]["method"], "GET")
+        self.assertEqual(rows[0]["endpoint"], "about")
+        self.assertEqual(rows[0]["status_code"], 200)
+        self.assertEqual(json.loads(rows[0]["params"]), {"q": ["test"]})
+        self.assertEqual(rows[0]["user_agent_string"], USER_AGENT)
+        self.assertEqual(
+            json.loads(rows[0]["user_agent"])["user_agent"]["family"], "Firefox"
+        )
+        self.assertEqual(rows[1]["path"], "/does-not-exist")
+        self.assertEqual(rows[1]["status_code"], 404)
+        self.assertIsNone(rows[1]["endpoint"])
+        self.assertIsNone(rows[1]["user_agent"])
+
+    def test_batch_written(self):
+        with override_settings(
+            LOGGING_DB=self.logging_db,
+            LOGGING_DB_BATCH_SIZE=2,
+            LOGGING_DB_FLUSH_MS=60_000,
+        ):
+            middleware = self.get_middleware()
+        for path in ("/one", "/two", "/three"):
+            middleware(RequestFactory().get(path))
+
+        # a full batch is written without waiting for the flush interval
+        rows = self.get_rows(2)
+        self.assertEqual([row["path"] for row in rows], ["/one", "/two"])
+
+    def test_flush_on_close(self):
+        with override_settings(LOGGING_DB=self.logging_db, LOGGING_DB_FLUSH_MS=60_000):
+            middleware = self.get_middleware()
+        for path in ("/one", "/two"):
+            middleware(RequestFactory().get(path))
+        self.assertEqual(self.get_rows(1, timeout=0.2), [])
+
+        # records still queued are written when the process shuts down
+        middleware.writer.close()
+        rows = self.get_rows(2, timeout=0)
+        self.assertEqual([row["path"] for row in rows], ["/one", "/two"])
@@ -1,5 +1,6 @@
 import re
 from dataclasses import dataclass
+from functools import lru_cache
 from urllib.parse import urlparse
 
 import babel.numbers
@@ -7,6 +8,22 @@ import inflect
 from django.conf import settings
 
 WORD_BOUNDARY_REGEX = re.compile(r"\b\w+\b")
+NAME_STOPWORDS = frozenset(
+    [
+        "the",
+        "of",
+        "in",
+        "uk",
+        "ltd",
+        "limited",
+        "and",
+        "&",
+        "+",
+        "co",
+        "for",
+    ]
+)
+NAME_CACHE_SIZE = 2**16
 
 p = inflect.engine()
 
@@ -71,23 +88,23 @@ def a_or_an(value):
     return p.a(value).split()[0]
 
 
+@lru_cache(maxsize=NAME_CACHE_SIZE)
 def normalise_name(n):
-    stopwords = [
-        "the",
-        "of",
-        "in",
-        "uk",
-        "ltd",
-        "limited",
-        "and",
-        "&",
-        "+",
-        "co",
-        "for",
-    ]
     return " ".join(
-        [w for w in WORD_BOUNDARY_REGEX.findall(n.lower()) if w not in stopwords]
-    ).strip()
+        [w for w in WORD_BOUNDARY_REGEX.findall(n.lower()) if w not in NAME_STOPWORDS]
+    )
+
+
+def normalise_names(names):
+    """
+    Normalise a list of names, giving the same result as `normalise_name`
+    for each one without using the cache
+    """
+    findall = WORD_BOUNDARY_REGEX.findall
+    return [
+        " ".join([w for w in findall(n.lower()) if w not in NAME_STOPWORDS])
+        for n in names
+    ]
 
 
 def get_domain(url):
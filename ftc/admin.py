@@ -117,7 +117,7 @@ class ScrapeAdmin(SourceAdmin):
     readonly_fields = [
         "start_time",
         "finish_time",
-        "log",
+        "scrape_log",
         "result",
         "items",
         "errors",
@@ -130,6 +130,10 @@ class ScrapeAdmin(SourceAdmin):
     class Media:
         css = {"all": ("css/admin/scrape.css",)}
 
+    @admin.display(description="Log")
+    def scrape_log(self, obj):
+        return obj.get_log()
+
 
 class VocabularyEntriesInline(admin.TabularInline):
     model = ftc.VocabularyEntries
@@ -28,3 +28,12 @@ class OrganisationIn(Schema):
     active: bool = True
     page: int = 1
     limit: int = 10
+    cursor: str = None
+    count: bool = True
+
+
+class OrganisationBulkIn(Schema):
+    org_ids: List[str] = []
+    charity_numbers: List[str] = []
+    company_numbers: List[str] = []
+    canonical: bool = False
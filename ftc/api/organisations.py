@@ -1,17 +1,23 @@
+import base64
+import binascii
+import json
 from typing import List, Optional
 
-from django.core.paginator import Paginator
+from django.db.models import CharField, F, Func, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import Http404, get_object_or_404
 from ninja import Query, Router, Schema
 
+from charity.utils import regno_to_orgid
 from findthatcharity.utils import url_replace
-from ftc.api.filters import OrganisationFilter, OrganisationIn
+from ftc.api.filters import OrganisationBulkIn, OrganisationFilter, OrganisationIn
 from ftc.api.schema import Organisation as OrganisationOut
 from ftc.api.schema import Source as SourceOut
 from ftc.documents import OrganisationGroup
 from ftc.models import Organisation
 from ftc.query import get_linked_organisations as query_linked_organisations
 from ftc.query import get_organisation as query_organisation
+from ftc.query import get_organisations as query_organisations
 from ftc.query import random_query as query_random_organisation
 
 
@@ -33,7 +39,7 @@ class OrganisationResultList(Schema):
     success: bool = True
     error: Optional[str] = None
     params: dict = {}
-    count: int = 0
+    count: Optional[int] = 0
     next: Optional[str] = None
     previous: Optional[str] = None
     result: List[OrganisationOut]
@@ -47,6 +53,20 @@ class OrganisationResultList(Schema):
         return results
 
 
+class OrganisationBulkMatch(Schema):
+    query: str
+    found: bool = False
+    result: Optional[OrganisationOut] = None
+
+
+class OrganisationBulkResultList(Schema):
+    success: bool = True
+    error: Optional[str] = None
+    params: dict = {}
+    count: int = 0
+    result: List[OrganisationBulkMatch]
+
+
 class SourceResult(Schema):
     success: bool = True
     error: Optional[str] = None
@@ -56,39 +76,198 @@ class SourceResult(Schema):
 
 api = Router(tags=["Organisations"])
 
+BULK_LIMIT = 5000
+BULK_CHUNK_SIZE = 500
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def encode_cursor(organisation, direction):
+    """
+    Opaque token for the position of an organisation in the list ordered by
+    name and org_id
+    """
+    return base64.urlsafe_b64encode(
+        json.dumps([organisation.name, organisation.org_id, direction]).encode("utf8")
+    ).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        name, org_id, direction = json.loads(base64.urlsafe_b64decode(cursor))
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if direction not in ("next", "previous"):
+        raise ValueError("Invalid cursor")
+    return name, org_id, direction
+
+
+class Row(Func):
+    """
+    Row constructor, so the cursor is compared with (name, org_id) as a
+    single value that can use the index on those columns
+    """
+
+    function = "ROW"
+    output_field = CharField()
+
 
 @api.api_operation(
     methods=["GET", "POST"],
     path="",
-    response={200: OrganisationResultList, 404: ResultError},
+    response={200: OrganisationResultList, 400: ResultError, 404: ResultError},
 )
 def get_organisation_list(request, filters: OrganisationIn = Query({})):
+    """
+    List organisations, ordered by name.
+
+    Pages are fetched using the `next` and `previous` links, which use a
+    cursor on (name, org_id) rather than an offset so later pages are as
+    fast as the first. The total `count` is only included on the first page,
+    and can be turned off with `count=false`.
+    """
     filters = filters.dict()
     f = OrganisationFilter(
         request.GET,
         queryset=Organisation.objects.prefetch_related("organisationTypePrimary"),
         request=request,
     )
-    paginator = Paginator(f.qs.order_by("name"), filters["limit"])
-    response = paginator.page(filters["page"])
+    limit = filters["limit"]
+    qs = f.qs
+
+    has_next = False
+    has_previous = False
+    if filters["cursor"]:
+        try:
+            name, org_id, direction = decode_cursor(filters["cursor"])
+        except ValueError as e:
+            return 400, {"error": str(e), "params": filters}
+        if direction == "previous":
+            qs = qs.alias(key=Row(F("name"), F("org_id"))).filter(
+                key__lt=Row(Value(name), Value(org_id))
+            )
+            results = list(qs.order_by("-name", "-org_id")[: limit + 1])
+            has_previous = len(results) > limit
+            has_next = True
+            results = results[:limit][::-1]
+        else:
+            qs = qs.alias(key=Row(F("name"), F("org_id"))).filter(
+                key__gt=Row(Value(name), Value(org_id))
+            )
+            results = list(qs.order_by("name", "org_id")[: limit + 1])
+            has_next = len(results) > limit
+            has_previous = True
+            results = results[:limit]
+    else:
+        # first page, or an offset page for older clients
+        offset = (max(filters["page"], 1) - 1) * limit
+        results = list(qs.order_by("name", "org_id")[offset : offset + limit + 1])
+        has_next = len(results) > limit
+        has_previous = offset > 0
+        results = results[:limit]
+
+    count = None
+    if filters["count"] and not filters["cursor"]:
+        count = qs.count()
+
     return {
         "error": None,
         "params": filters,
-        "count": paginator.count,
-        "result": {"results": list(response.object_list), "request": request},
+        "count": count,
+        "result": {"results": results, "request": request},
         "next": (
-            url_replace(request, page=response.next_page_number())
-            if response.has_next()
+            url_replace(
+                request, cursor=encode_cursor(results[-1], "next"), count="false"
+            )
+            if has_next and results
             else None
         ),
         "previous": (
-            url_replace(request, page=response.previous_page_number())
-            if response.has_previous()
+            url_replace(
+                request, cursor=encode_cursor(results[0], "previous"), count="false"
+            )
+            if has_previous and results
             else None
         ),
     }
 
 
+def bulk_queries(bulk):
+    """
+    Turn the identifiers sent to the bulk lookup into (query, org_id) pairs
+    """
+    for org_id in bulk.org_ids:
+        yield org_id, org_id.strip()
+    for regno in bulk.charity_numbers:
+        yield regno, regno_to_orgid(regno)
+    for company_number in bulk.company_numbers:
+        regno = company_number.strip().upper()
+        if regno.isdigit():
+            regno = regno.zfill(8)
+        yield company_number, "GB-COH-{}".format(regno)
+
+
+def bulk_matches(request, queries, canonical=False):
+    """
+    Look up the organisations in chunks, so that each chunk only needs one
+    or two queries
+    """
+    for i in range(0, len(queries), BULK_CHUNK_SIZE):
+        chunk = queries[i : i + BULK_CHUNK_SIZE]
+        results = query_organisations(
+            [org_id for _, org_id in chunk], canonical=canonical
+        )
+        for query, org_id in chunk:
+            organisation = results.get(org_id)
+            if organisation:
+                organisation._request = request
+            yield {
+                "query": query,
+                "found": organisation is not None,
+                "result": organisation,
+            }
+
+
+@api.post(
+    "/_bulk",
+    response={200: OrganisationBulkResultList, 400: ResultError},
+)
+def get_organisations_bulk(request, bulk: OrganisationBulkIn):
+    """
+    Look up a list of organisation identifiers, charity numbers or company
+    numbers at once. `count` is the number of identifiers that were found.
+
+    Send an `Accept: application/x-ndjson` header to get the results streamed
+    back with one JSON object per line.
+    """
+    queries = list(bulk_queries(bulk))
+    params = {"canonical": bulk.canonical, "queries": len(queries)}
+    if len(queries) > BULK_LIMIT:
+        return 400, {
+            "error": "No more than {:,.0f} identifiers can be looked up at once".format(
+                BULK_LIMIT
+            ),
+            "params": params,
+        }
+
+    if NDJSON_CONTENT_TYPE in request.headers.get("Accept", ""):
+
+        def stream():
+            for match in bulk_matches(request, queries, bulk.canonical):
+                yield (
+                    OrganisationBulkMatch.model_validate(match).model_dump_json() + "\n"
+                )
+
+        return StreamingHttpResponse(stream(), content_type=NDJSON_CONTENT_TYPE)
+
+    matches = list(bulk_matches(request, queries, bulk.canonical))
+    return {
+        "error": None,
+        "params": params,
+        "count": sum(match["found"] for match in matches),
+        "result": matches,
+    }
+
+
 @api.get(
     "/_random",
     response={200: OrganisationResult, 404: ResultError},
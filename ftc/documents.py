@@ -1,13 +1,16 @@
-from itertools import groupby
+import re
+from itertools import groupby, islice
 from math import ceil
 
 import tqdm
 from charity_django.companies.models import Company
 from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
 from django.utils.translation import gettext_lazy as _
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
 from django_elasticsearch_dsl.search import Search
+from elasticsearch.exceptions import TransportError
 from elasticsearch.helpers import bulk
 from elasticsearch_dsl import analyzer, token_filter
 from elasticsearch_dsl.connections import get_connection
@@ -15,6 +18,25 @@ from elasticsearch_dsl.connections import get_connection
 from findthatcharity.utils import get_domain, normalise_name
 from ftc.models import Organisation, RelatedOrganisation
 
+TEMPLATE_PARAM_REGEX = re.compile(r"{{\s*(\w+)\s*}}")
+
+
+def render_template(template, params):
+    """
+    Fill in the mustache ``{{param}}`` placeholders in a search body. Values
+    are substituted into the parsed structure rather than the JSON text so
+    they don't need escaping, and the search only needs one request.
+    """
+    if isinstance(template, dict):
+        return {k: render_template(v, params) for k, v in template.items()}
+    if isinstance(template, list):
+        return [render_template(v, params) for v in template]
+    if isinstance(template, str) and "{{" in template:
+        return TEMPLATE_PARAM_REGEX.sub(
+            lambda m: str(params.get(m.group(1), "")), template
+        )
+    return template
+
 
 class SearchWithTemplate(Search):
     def execute(self, ignore_cache=False, params=None):
@@ -27,18 +49,40 @@ class SearchWithTemplate(Search):
         if ignore_cache or not hasattr(self, "_response"):
             es = get_connection(self._using)
 
+            search_body = self.to_dict()
             if params:
-                search_body = es.render_search_template(
-                    body={"source": self.to_dict(), "params": params},
-                )["template_output"]
-            else:
-                search_body = self.to_dict()
+                search_body = render_template(search_body, params)
             self._response = self._response_class(
                 self, es.search(index=self._index, body=search_body, **self._params)
             )
         return self._response
 
 
+def multi_search(searches):
+    """
+    Execute a list of ``(search, params)`` tuples in a single request and
+    return a ``Response`` for each search, in the same order.
+    """
+    if not searches:
+        return []
+    es = get_connection(searches[0][0]._using)
+
+    body = []
+    for search, params in searches:
+        body.append({"index": search._index})
+        search_body = search.to_dict()
+        if params:
+            search_body = render_template(search_body, params)
+        body.append(search_body)
+
+    results = []
+    for (search, params), response in zip(searches, es.msearch(body=body)["responses"]):
+        if response.get("error"):
+            raise TransportError("N/A", response["error"]["type"], response["error"])
+        results.append(search._response_class(search, response))
+    return results
+
+
 class DSEPaginator(Paginator):
     """
     Override Django's built-in Paginator class to take in a count/total number of items;
@@ -288,18 +332,62 @@ class OrganisationGroup(Document):
             "linked_orgs"
         )
 
-    def get_indexing_queryset(self):
+    def get_partitions(self, partitions):
+        """
+        Split the organisations into ranges of the first linked orgID, each
+        with roughly the same number of organisations. All the organisations
+        in a group share the same linked orgIDs so fall in the same range.
+        """
+        fractions = [i / partitions for i in range(1, partitions)]
+        boundaries = []
+        if fractions:
+            with connections["data"].cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT percentile_disc(%s::float[])
+                        WITHIN GROUP (ORDER BY linked_orgs[1])
+                    FROM ftc_organisation
+                    WHERE linked_orgs IS NOT NULL
+                    """,
+                    [fractions],
+                )
+                boundaries = sorted(set(b for b in cursor.fetchone()[0] or [] if b))
+        return list(zip([None] + boundaries, boundaries + [None]))
+
+    def get_indexing_queryset(
+        self, linked_orgs_range=None, org_ids=None, progress=True
+    ):
         """
         Build queryset (iterator) for use by indexing.
+
+        `linked_orgs_range` is an optional (start, end) tuple from
+        `get_partitions` used to only index part of the organisations.
+        `org_ids` limits indexing to the groups containing those org IDs.
         """
         qs = self.get_queryset()
-        for k, orgs in groupby(
-            tqdm.tqdm(
-                qs.iterator(), total=qs.count(), position=0, smoothing=0.1, leave=True
-            ),
-            key=lambda o: o.linked_orgs,
-        ):
-            yield RelatedOrganisation(orgs)
+        if org_ids is not None:
+            qs = qs.filter(linked_orgs__overlap=list(org_ids))
+        if linked_orgs_range:
+            start, end = linked_orgs_range
+            if start is not None:
+                qs = qs.filter(linked_orgs__0__gte=start)
+            if end is not None:
+                qs = qs.filter(linked_orgs__0__lt=end)
+        orgs = qs.select_related("organisationTypePrimary").iterator(
+            chunk_size=self.django.queryset_pagination
+        )
+        if progress:
+            orgs = tqdm.tqdm(
+                orgs, total=qs.count(), position=0, smoothing=0.1, leave=True
+            )
+        groups = (
+            RelatedOrganisation(group)
+            for k, group in groupby(orgs, key=lambda o: o.linked_orgs)
+        )
+
+        # load the related records for a chunk of groups at a time
+        while chunk := list(islice(groups, self.django.queryset_pagination)):
+            yield from RelatedOrganisation.prefetch(chunk)
 
     def bulk(self, actions, **kwargs):
         if self.django.queryset_pagination and "chunk_size" not in kwargs:
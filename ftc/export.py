@@ -0,0 +1,269 @@
+import csv
+import gzip
+import io
+import os
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, CharField, F, Func, Value, When
+from django.db.models.functions import NullIf
+
+from findthatcharity.jinja2 import cached_lookup
+from ftc.models import Scrape
+
+# columns in the CSV export of organisations, with the header used for each
+EXPORT_COLUMNS = {
+    "org_id": "id",
+    "name": "name",
+    "charityNumber": "charityNumber",
+    "companyNumber": "companyNumber",
+    "postalCode": "postalCode",
+    "url": "url",
+    "latestIncome": "latestIncome",
+    "latestIncomeDate": "latestIncomeDate",
+    "dateRegistered": "dateRegistered",
+    "dateRemoved": "dateRemoved",
+    "active": "active",
+    "dateModified": "dateModified",
+    "orgIDs": "orgIDs",
+    "linked_orgs": "linked_orgs",
+    "linked_orgs_verified": "linked_orgs_verified",
+    "organisationType": "organisationType",
+    "organisationTypePrimary__title": "organisationTypePrimary",
+    "source": "source",
+}
+# text columns that may contain empty strings
+TEXT_COLUMNS = (
+    "org_id",
+    "name",
+    "charityNumber",
+    "companyNumber",
+    "postalCode",
+    "url",
+    "organisationTypePrimary__title",
+    "source",
+)
+# organisations copied by each COPY statement when streaming an export
+COPY_CHUNK_ROWS = 10_000
+PARQUET_BLOCK_SIZE = 64 * 1024 * 1024
+# folder in the storage bucket that `export_downloads --upload-to-storage`
+# writes to, and the spider name its uploads are recorded under
+DOWNLOADS_STORAGE_PREFIX = "downloads"
+DOWNLOADS_SPIDER = "export_downloads"
+
+# escape backslashes and whitespace in an array element `x` as repr() does
+REPR_ESCAPED = (
+    r"replace(replace(replace(replace(x, '\', '\\'), "
+    r"chr(10), '\n'), chr(13), '\r'), chr(9), '\t')"
+)
+# quote an array element as repr() does: in double quotes if it contains a
+# single quote and no double quotes, otherwise in single quotes with any
+# single quotes escaped. Other non-printable characters aren't escaped.
+REPR_ELEMENT = (
+    r"CASE WHEN x IS NULL THEN 'None' "
+    r"""WHEN strpos(x, '''') > 0 AND strpos(x, '"') = 0 """
+    r"""THEN '"' || {escaped} || '"' """
+    r"ELSE '''' || replace({escaped}, '''', '\''') || '''' END"
+).format(escaped=REPR_ESCAPED)
+
+
+class ListText(Func):
+    """Format an array in the same way as `str()` of a python list"""
+
+    output_field = CharField()
+    template = (
+        "CASE WHEN %(expressions)s IS NULL THEN NULL "
+        "ELSE '[' || array_to_string(ARRAY("
+        "SELECT " + REPR_ELEMENT + " FROM unnest(%(expressions)s) AS x"
+        "), ', ') || ']' END"
+    )
+
+
+class DateTimeText(Func):
+    """Format a timestamp in the same way as `str()` of a UTC python datetime"""
+
+    output_field = CharField()
+    template = (
+        "to_char(%(expressions)s AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS') || "
+        "CASE WHEN date_trunc('second', %(expressions)s) = %(expressions)s THEN '' "
+        "ELSE to_char(%(expressions)s AT TIME ZONE 'UTC', '.US') END || '+00:00'"
+    )
+
+
+def export_expressions(show_postcode=False):
+    """
+    Expressions for each export column, which format the values in the
+    database the way the python csv writer would
+    """
+    expressions = {field: F(field) for field in EXPORT_COLUMNS}
+    # COPY quotes empty strings to tell them apart from nulls, but the csv
+    # writer leaves both unquoted
+    for field in TEXT_COLUMNS:
+        expressions[field] = NullIf(F(field), Value(""), output_field=CharField())
+    if not show_postcode:
+        expressions["postalCode"] = Value(None, output_field=CharField())
+    expressions["active"] = Case(
+        When(active=True, then=Value("True")),
+        When(active=False, then=Value("False")),
+        output_field=CharField(),
+    )
+    expressions["dateModified"] = DateTimeText("dateModified")
+    for field in ("orgIDs", "linked_orgs", "linked_orgs_verified", "organisationType"):
+        expressions[field] = ListText(field)
+    return expressions
+
+
+def export_header():
+    buffer_ = io.StringIO()
+    csv.writer(buffer_, lineterminator="\n").writerow(EXPORT_COLUMNS.values())
+    return buffer_.getvalue().encode("utf8")
+
+
+def export_sql(queryset, show_postcode=False, using="data"):
+    """
+    `COPY` statement that writes one CSV row for each organisation in a
+    queryset, without a header row
+    """
+    expressions = export_expressions(show_postcode)
+    aliases = {"export_{}".format(i): e for i, e in enumerate(expressions.values())}
+    queryset = (
+        queryset.order_by("org_id")
+        .distinct("org_id")
+        .annotate(**aliases)
+        .values_list(*aliases.keys())
+    )
+    sql, params = queryset.query.get_compiler(using).as_sql()
+    return "COPY ({}) TO STDOUT WITH (FORMAT csv)".format(
+        connections[using].ops.compose_sql(sql, params)
+    )
+
+
+def stream_copy(queryset, show_postcode=False, using="data", chunk_rows=None):
+    """
+    Yield the CSV rows for a queryset of organisations, without a header.
+
+    psycopg2 only writes COPY output to a file, so rather than one statement
+    for the whole export, the organisations are split into ranges of
+    `chunk_rows` org IDs. Each range is copied into memory on the request's
+    own connection and yielded, so nothing is left running if the response
+    is closed part way through.
+    """
+    chunk_rows = chunk_rows or COPY_CHUNK_ROWS
+    org_ids = queryset.order_by("org_id").values_list("org_id", flat=True).distinct()
+    after = None
+    while True:
+        chunk = queryset
+        remaining = org_ids
+        if after is not None:
+            chunk = chunk.filter(org_id__gt=after)
+            remaining = remaining.filter(org_id__gt=after)
+        # the last org ID in this range, or none if this is the last range
+        bound = list(remaining[chunk_rows - 1 : chunk_rows])
+        if bound:
+            chunk = chunk.filter(org_id__lte=bound[0])
+
+        output = io.BytesIO()
+        with connections[using].cursor() as cursor:
+            cursor.copy_expert(export_sql(chunk, show_postcode, using), output)
+        if output.tell():
+            yield output.getvalue()
+
+        if not bound:
+            break
+        after = bound[0]
+
+
+def stream_export(queryset, show_postcode=False, using="data"):
+    """Yield the CSV export of a queryset of organisations, with a header"""
+    yield export_header()
+    yield from stream_copy(queryset, show_postcode, using)
+
+
+def snapshot_path(kind=None, name="all", filetype="csv.gz"):
+    """
+    Location of the pre-generated export for all organisations, or for one
+    organisation type or source
+    """
+    if kind:
+        return os.path.join(
+            settings.DOWNLOADS_DIR, kind, "{}.{}".format(name, filetype)
+        )
+    return os.path.join(settings.DOWNLOADS_DIR, "{}.{}".format(name, filetype))
+
+
+def snapshot_key(kind=None, name="all", filetype="csv.gz"):
+    """Key of a pre-generated export in the storage bucket"""
+    if kind:
+        return "{}/{}/{}.{}".format(DOWNLOADS_STORAGE_PREFIX, kind, name, filetype)
+    return "{}/{}.{}".format(DOWNLOADS_STORAGE_PREFIX, name, filetype)
+
+
+@cached_lookup("uploaded_snapshots")
+def get_uploaded_snapshots():
+    """
+    Keys of the exports uploaded by the latest `export_downloads` run, with
+    the id of the run so that links change when the files do
+    """
+    scrape = (
+        Scrape.objects.filter(
+            spider=DOWNLOADS_SPIDER, status=Scrape.ScrapeStatus.SUCCESS
+        )
+        .order_by("-id")
+        .first()
+    )
+    if not scrape or not scrape.result:
+        return {}
+    return {key: scrape.id for key in scrape.result.get("uploaded", [])}
+
+
+def snapshot_url(kind=None, name="all", filetype="csv.gz"):
+    """
+    Public URL of a pre-generated export in the storage bucket, or `None` if
+    it hasn't been uploaded
+    """
+    if not settings.DOWNLOADS_URL:
+        return None
+    key = snapshot_key(kind, name, filetype)
+    version = get_uploaded_snapshots().get(key)
+    if version is None:
+        return None
+    return "{}/{}?v={}".format(settings.DOWNLOADS_URL.rstrip("/"), key, version)
+
+
+def write_snapshot(queryset, path, using="data"):
+    """
+    Write the gzipped CSV export of a queryset of organisations to a file.
+
+    The file is written under a temporary name and then moved into place, so
+    a download in progress never sees a partial file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wb") as f:
+        f.write(export_header())
+        with connections[using].cursor() as cursor:
+            cursor.copy_expert(export_sql(queryset, using=using), f)
+    os.replace(tmp_path, path)
+
+
+def write_parquet_snapshot(csv_path, path):
+    """
+    Convert a gzipped CSV snapshot into a parquet file, reading it in batches.
+    All columns are stored as strings so they match the CSV export.
+    """
+    from pyarrow import csv as pa_csv
+    from pyarrow import parquet, string
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=PARQUET_BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={column: string() for column in EXPORT_COLUMNS.values()}
+        ),
+    )
+    with parquet.ParquetWriter(tmp_path, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+    os.replace(tmp_path, path)
@@ -18,7 +18,7 @@ class ScrapesFeedRSS(Feed):
         return "SCRAPER FAILED: " + item.spider
 
     def item_description(self, item):
-        return "<pre>" + item.log + "</pre>"
+        return "<pre>" + item.get_log() + "</pre>"
 
     def item_pubdate(self, item):
         return item.start_time
@@ -1,13 +1,14 @@
 import csv
 import datetime
+import hashlib
 import io
 import logging
 import re
+import tempfile
 from collections import defaultdict
 
 import requests
 import requests_cache
-import validators
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import connections, transaction
@@ -15,6 +16,12 @@ from django.utils.text import slugify
 
 from ftc.management.commands._bulk_upsert import bulk_upsert
 from ftc.management.commands._db_logger import ScrapeHandler
+from ftc.management.commands._normalise import (
+    POSTCODE_REGEX,
+    match_postcode,
+    normalise_postcode,
+    normalise_url,
+)
 from ftc.models import (
     Organisation,
     OrganisationLink,
@@ -26,6 +33,19 @@ from ftc.models import (
 )
 
 DEFAULT_DATE_FORMAT = "%Y-%m-%d"
+BOOL_VALUES = {
+    **{v: False for v in ("f", "false", "no", "0", "n")},
+    **{v: True for v in ("t", "true", "yes", "1", "y")},
+}
+
+
+def clean_float(value):
+    if isinstance(value, str):
+        value = value.lower().strip()
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
 
 
 class BaseScraper(BaseCommand):
@@ -47,9 +67,19 @@ class BaseScraper(BaseCommand):
     verify_certificate = True
     user_agent = settings.DEFAULT_USER_AGENT
 
-    postcode_regex = re.compile(
-        r"([Gg][Ii][Rr] 0[Aa]{2})|((([A-Za-z][0-9]{1,2})|(([A-Za-z][A-Ha-hJ-Yj-y][0-9]{1,2})|(([A-Za-z][0-9][A-Za-z])|([A-Za-z][A-Ha-hJ-Yj-y][0-9][A-Za-z]?))))\s?[0-9][A-Za-z]{2})"
-    )
+    # if `stream_files` is set then downloaded files are written in chunks
+    # to a temporary file (spooled to disk above `spool_max_size` bytes)
+    # instead of being held in memory as a response
+    stream_files = False
+    spool_max_size = 10 * 1024 * 1024
+    download_chunk_size = 1024 * 1024
+
+    # finish without changing the records if none of the fetched files have
+    # changed since the last scrape. Turn off for scrapers where the fetched
+    # files only link to the data, which can change without them changing.
+    skip_unchanged_files = True
+
+    postcode_regex = POSTCODE_REGEX
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -64,6 +94,12 @@ class BaseScraper(BaseCommand):
         self.orgtype_cache = {}
         self.records = defaultdict(list)
         self.location_records = defaultdict(list)
+        self.clean_plans = {}
+
+        # conditional request metadata for each URL fetched by `fetch_url`,
+        # and the URLs that haven't changed since the last scrape
+        self.fetch_metadata = {}
+        self.unchanged_urls = set()
 
         # set up logging
         self.logger = logging.getLogger("ftc.{}".format(self.name))
@@ -89,6 +125,11 @@ class BaseScraper(BaseCommand):
             action="store_true",
             help="Run in debug mode",
         )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Import the files even if they haven't changed since the last scrape",
+        )
 
     def set_session(self, install_cache=False):
         if install_cache:
@@ -136,10 +177,27 @@ class BaseScraper(BaseCommand):
         self.fetch_file()
         self.logger.info("{:,.0f} files fetched".format(len(self.files)))
 
+        if (
+            self.skip_unchanged_files
+            and not options.get("force")
+            and self.files
+            and all(u in self.unchanged_urls for u in self.files)
+        ):
+            return self.keep_previous_records()
+
+        # download any files that were skipped because they hadn't changed
+        for u, f in self.files.items():
+            if f is None:
+                self.files[u] = self.fetch_url(u, conditional=False)
+
         # process needed files
         self.logger.info("Processing files")
-        for u, f in self.files.items():
+        for u in list(self.files.keys()):
+            # remove each file once it has been parsed so it can be freed
+            f = self.files.pop(u)
             self.parse_file(f, u)
+            if hasattr(f, "close"):
+                f.close()
         self.logger.info("Files processed.")
         for model, count in self.object_count.items():
             self.logger.info("Found {:,.0f} {} records".format(count, model.__name__))
@@ -192,6 +250,8 @@ class BaseScraper(BaseCommand):
         # do any SQL actions after the data has been included
         self.execute_sql_statements(self.post_sql)
 
+        self.save_fetch_metadata()
+
         self.scrape.errors = self.error_count
         self.scrape.result = results
         self.scrape_logger.teardown()
@@ -269,8 +329,13 @@ class BaseScraper(BaseCommand):
             for f in ["issued", "modified"]:
                 if not s.get(f):
                     s[f] = datetime.datetime.now().strftime("%Y-%m-%d")
+            # keep the metadata from previous fetches of this source
+            data = {k: v for k, v in s.items() if k != "fetch"}
+            previous = Source.objects.filter(id=s["identifier"]).first()
+            if previous and "fetch" in previous.data:
+                data["fetch"] = previous.data["fetch"]
             self.source, _ = Source.objects.update_or_create(
-                id=s["identifier"], defaults={"data": s}
+                id=s["identifier"], defaults={"data": data}
             )
 
     def set_access_url(self, url, overwrite=False):
@@ -283,14 +348,160 @@ class BaseScraper(BaseCommand):
             self.source.data["distribution"][0]["downloadURL"] = url
             self.source.save()
 
+    def download_file(self, url, conditional=False, **kwargs):
+        """
+        Download a URL in chunks to a temporary file, which is returned
+        positioned at the start. Small files stay in memory, larger ones
+        are spooled to disk.
+
+        If `conditional` is set then `None` is returned if the server says
+        the file hasn't changed since it was last fetched.
+        """
+        if conditional:
+            kwargs["headers"] = {
+                **kwargs.get("headers", {}),
+                **self.conditional_headers(url),
+            }
+        f = tempfile.SpooledTemporaryFile(max_size=self.spool_max_size)
+        sha256 = hashlib.sha256()
+        try:
+            with self.session.get(
+                url, stream=True, verify=self.verify_certificate, **kwargs
+            ) as r:
+                if conditional and r.status_code == 304:
+                    f.close()
+                    self.not_modified(url)
+                    return None
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=self.download_chunk_size):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                self.record_fetch(url, r.headers, sha256.hexdigest())
+        except Exception:
+            f.close()
+            raise
+        f.seek(0)
+        return f
+
+    def fetch_url(self, url, conditional=True):
+        """
+        Fetch a URL, sending the ETag and Last-Modified date from the last
+        scrape so that the server can say if it hasn't changed. Returns
+        `None` if the server says the file hasn't changed.
+        """
+        if self.stream_files:
+            return self.download_file(url, conditional=conditional)
+        r = self.session.get(
+            url,
+            verify=self.verify_certificate,
+            headers=self.conditional_headers(url) if conditional else {},
+        )
+        if conditional and r.status_code == 304:
+            self.not_modified(url)
+            return None
+        r.raise_for_status()
+        self.record_fetch(url, r.headers, hashlib.sha256(r.content).hexdigest())
+        return r
+
+    def previous_fetch(self, url):
+        if isinstance(getattr(self, "source", None), Source):
+            return self.source.data.get("fetch", {}).get(url, {})
+        return {}
+
+    def conditional_headers(self, url):
+        previous = self.previous_fetch(url)
+        headers = {}
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+        return headers
+
+    def not_modified(self, url):
+        self.logger.info("{} has not changed since the last scrape".format(url))
+        self.unchanged_urls.add(url)
+        self.fetch_metadata[url] = self.previous_fetch(url)
+
+    def record_fetch(self, url, headers, sha256):
+        """
+        Store the metadata for a downloaded file, and check whether its
+        contents are the same as last time, for servers that don't support
+        conditional requests
+        """
+        if sha256 == self.previous_fetch(url).get("sha256"):
+            self.logger.info("{} is the same as at the last scrape".format(url))
+            self.unchanged_urls.add(url)
+        self.fetch_metadata[url] = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "sha256": sha256,
+        }
+
+    def save_fetch_metadata(self):
+        if not self.fetch_metadata or not isinstance(
+            getattr(self, "source", None), Source
+        ):
+            return
+        self.source.data["fetch"] = {
+            **self.source.data.get("fetch", {}),
+            **self.fetch_metadata,
+        }
+        self.source.save()
+
+    def keep_previous_records(self):
+        """
+        Finish the scrape without importing anything when none of the files
+        have changed since the last scrape. The previous records are moved
+        to this scrape, so that they are still treated as the records from
+        the latest scrape (for example by `update_geodata`).
+        """
+        previous = (
+            Scrape.objects.filter(
+                spider=self.name,
+                status__in=[Scrape.ScrapeStatus.SUCCESS, Scrape.ScrapeStatus.ERRORS],
+            )
+            .exclude(id=self.scrape.id)
+            .order_by("-start_time")
+            .first()
+        )
+        self.logger.info("Files have not changed, keeping the previous records")
+        for model in self.models_to_delete:
+            update_sql = """
+                UPDATE "{db_table}"
+                SET "scrape_id" = %s
+                WHERE (
+                    "{db_table}"."spider" = %s
+                    AND NOT ("{db_table}"."scrape_id" = %s)
+                );
+            """.format(db_table=model._meta.db_table)
+            self.cursor.execute(
+                update_sql,
+                [
+                    self.scrape.id,
+                    self.name,
+                    self.scrape.id,
+                ],
+            )
+            self.logger.info(
+                "Kept {:,.0f} previous {} records".format(
+                    self.cursor.rowcount,
+                    model.__name__,
+                )
+            )
+        self.save_fetch_metadata()
+        self.scrape.items = previous.items if previous else 0
+        self.scrape.result = {
+            "unchanged": True,
+            "previous_scrape": previous.id if previous else None,
+        }
+        self.scrape_logger.teardown(expected_records=0)
+
     def fetch_file(self):
         self.files = {}
         if hasattr(self, "start_urls"):
             for u in self.start_urls:
                 self.set_download_url(u)
-                r = self.session.get(u, verify=self.verify_certificate)
-                r.raise_for_status()
-                self.files[u] = r
+                self.files[u] = self.fetch_url(u)
 
     def parse_file(self, response, source_url):
         self.logger.info(source_url)
@@ -330,58 +541,100 @@ class BaseScraper(BaseCommand):
         return "-".join([self.org_id_prefix, str(record.get(self.id_field))])
 
     def clean_fields(self, record, blank_values=[""]):
-        record = {k.strip(): v for k, v in record.items()}
-
-        for f in record.keys():
-            # clean blank values
-            if record[f] in blank_values:
-                record[f] = None
+        plan = self.get_clean_plan(tuple(record), tuple(blank_values))
+        return {
+            key: converter(value)
+            for (key, converter), value in zip(plan, record.values())
+        }
 
-            # clean date fields
-            elif f in self.date_fields and isinstance(record[f], str):
-                date_format = self.date_format
-                if isinstance(date_format, dict):
-                    date_format = date_format.get(f, DEFAULT_DATE_FORMAT)
+    def get_clean_plan(self, keys, blank_values):
+        """
+        Compile the field rules into a converter for each column, so that
+        the checks against `date_fields`, `bool_fields` and `float_fields`
+        only happen once for each set of columns rather than for every row.
+        """
+        cache_key = (keys, blank_values)
+        plan = self.clean_plans.get(cache_key)
+        if plan is None:
+            plan = [
+                (key.strip(), self.get_field_converter(key.strip(), blank_values))
+                for key in keys
+            ]
+            self.clean_plans[cache_key] = plan
+        return plan
+
+    def get_field_converter(self, f, blank_values):
+        """
+        Function used by `clean_fields` to clean the value of field `f`.
 
+        Blank values become `None`, date fields are parsed using
+        `date_format`, boolean and float fields are converted and any other
+        strings are stripped.
+        """
+        logger = self.logger
+
+        if f in self.date_fields:
+            date_format = self.date_format
+            if isinstance(date_format, dict):
+                date_format = date_format.get(f, DEFAULT_DATE_FORMAT)
+            strptime = datetime.datetime.strptime
+            # the same dates appear many times in a file, so keep the ones
+            # that have already been parsed
+            parsed = {}
+
+            def convert_str(value):
+                if not value:
+                    return value
+                if value in parsed:
+                    return parsed[value]
                 try:
-                    if record.get(f):
-                        record[f] = datetime.datetime.strptime(
-                            record.get(f).strip(), date_format
-                        )
+                    parsed[value] = strptime(value.strip(), date_format)
+                    return parsed[value]
                 except ValueError:
-                    self.logger.warn(
+                    logger.warn(
                         "Could not convert date field {} with value '{}' (expected format '{}')".format(
                             f,
-                            record[f],
+                            value,
                             date_format,
                         )
                     )
-                    record[f] = None
-
-            # clean boolean fields
-            elif f in self.bool_fields:
-                if isinstance(record[f], str):
-                    val = record[f].lower().strip()
-                    if val in ["f", "false", "no", "0", "n"]:
-                        record[f] = False
-                    elif val in ["t", "true", "yes", "1", "y"]:
-                        record[f] = True
-
-            # clean float fields
-            elif f in self.float_fields:
-                if isinstance(record[f], str):
-                    val = record[f].lower().strip()
-                else:
-                    val = record[f]
-                try:
-                    record[f] = float(val)
-                except (ValueError, TypeError):
-                    record[f] = None
+                    return None
+
+        elif f in self.bool_fields:
+
+            def convert_str(value):
+                return BOOL_VALUES.get(value.lower().strip(), value)
+
+        elif f in self.float_fields:
+            convert_str = clean_float
+
+        else:
+            # most fields are plain strings, so avoid the extra function call
+            def convert(value):
+                if value in blank_values:
+                    return None
+                if isinstance(value, str):
+                    return value.strip().replace("\x00", "")
+                return value
+
+            return convert
+
+        # values that aren't strings are only converted for float fields
+        if f in self.float_fields and f not in self.bool_fields:
+            convert_other = clean_float
+        else:
+            convert_other = None
 
-            # strip string fields
-            elif isinstance(record[f], str):
-                record[f] = record[f].strip().replace("\x00", "")
-        return record
+        def convert(value):
+            if value in blank_values:
+                return None
+            if isinstance(value, str):
+                return convert_str(value)
+            if convert_other is not None:
+                return convert_other(value)
+            return value
+
+        return convert
 
     def slugify(self, value):
         value = value.lower()
@@ -428,8 +681,8 @@ class BaseScraper(BaseCommand):
         # we assume the last item is a postcode
         if get_postcode:
             if len(address) > 1:
-                potential_postcode = self.parse_postcode(address[-1])
-                if potential_postcode and self.postcode_regex.match(potential_postcode):
+                potential_postcode = match_postcode(address[-1])
+                if potential_postcode:
                     postcode = potential_postcode
                     address = address[0:-1]
 
@@ -445,93 +698,13 @@ class BaseScraper(BaseCommand):
         return new_address, postcode
 
     def parse_url(self, url):
-        if url is None:
-            return None
-
-        url = url.strip()
-
-        if validators.url(url):
-            return url
-
-        if validators.url("http://%s" % url):
-            return "http://%s" % url
-
-        if url in [
-            "n.a",
-            "non.e",
-            ".0",
-            "-.-",
-            ".none",
-            ".nil",
-            "N/A",
-            "TBC",
-            "under construction",
-            ".n/a",
-            "0.0",
-            ".P",
-            b"",
-            "no.website",
-        ]:
-            return None
-
-        for i in [
-            "http;//",
-            "http//",
-            "http.//",
-            "http:\\\\",
-            "http://http://",
-            "www://",
-            "www.http://",
-        ]:
-            url = url.replace(i, "http://")
-        url = url.replace("http:/www", "http://www")
-
-        for i in ["www,", ":www", "www:", "www/", "www\\\\", ".www"]:
-            url = url.replace(i, "www.")
-
-        url = url.replace(",", ".")
-        url = url.replace("..", ".")
-
-        if validators.url(url):
-            return url
-
-        if validators.url("http://%s" % url):
-            return "http://%s" % url
+        return normalise_url(url)
 
     def parse_postcode(self, postcode):
         """
         standardises a postcode into the correct format
         """
-
-        if postcode is None:
-            return None
-
-        # check for blank/empty
-        # put in all caps
-        postcode = postcode.strip().upper()
-        if postcode == "":
-            return None
-
-        # replace any non alphanumeric characters
-        postcode = re.sub("[^0-9a-zA-Z]+", "", postcode)
-
-        if postcode == "":
-            return None
-
-        # check for nonstandard codes
-        if len(postcode) > 7:
-            return postcode
-
-        first_part = postcode[:-3].strip()
-        last_part = postcode[-3:].strip()
-
-        # check for incorrect characters
-        first_part = list(first_part)
-        last_part = list(last_part)
-        if last_part and last_part[0] == "O":
-            last_part[0] = "0"
-
-        return "%s %s" % ("".join(first_part), "".join(last_part))
+        return normalise_postcode(postcode)
 
     def add_org_type(self, orgtype):
         ot, _ = OrganisationType.objects.get_or_create(
@@ -544,12 +717,17 @@ class BaseScraper(BaseCommand):
 
 class CSVScraper(BaseScraper):
     def parse_file(self, response, source_url):
-        try:
-            csv_text = response.text
-        except AttributeError:
-            csv_text = response.content.decode(self.encoding)
+        if isinstance(response, requests.Response):
+            try:
+                csv_text = response.text
+            except AttributeError:
+                csv_text = response.content.decode(self.encoding)
+            csv_file = io.StringIO(csv_text)
+        else:
+            # a file downloaded with `download_file`, read row by row
+            csv_file = io.TextIOWrapper(response, encoding=self.encoding, newline="")
 
-        with io.StringIO(csv_text) as a:
+        with csv_file as a:
             csvreader = csv.DictReader(a)
             for k, row in enumerate(csvreader):
                 self.parse_row(row)
@@ -573,10 +751,8 @@ class HTMLScraper(BaseScraper):
     def fetch_file(self):
         self.files = {}
         for u in self.start_urls:
-            r = self.session.get(u, verify=self.verify_certificate)
-            r.raise_for_status()
+            self.files[u] = self.fetch_url(u)
             self.set_access_url(u)
-            self.files[u] = r
 
     def parse_file(self, response, source_url):
         self.logger.info(source_url)
@@ -1,46 +1,147 @@
-from typing import List
+import datetime
+import json
+from typing import Iterable, List, Sequence
 
-from django.db import NotSupportedError, connections
+from django.db import NotSupportedError, connections, transaction
 from django.db.models import Manager, Model
 from django.db.models.constants import OnConflict
 from django.db.models.query import QuerySet
-from psycopg2.extras import execute_values
 
 
-# from https://gist.github.com/aisayko/dcacd546bcb17a740dec703de6b2377e
-def bulk_upsert(model: Model, fields: List[str], values: List[List], by: List[str]):
+def copy_value(value) -> str:
     """
-    Return the tuple of (inserted, updated) ids
+    Format a python value for PostgreSQL's COPY text format. Lists are
+    formatted as array literals, so JSON lists need to be dumped first.
     """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        value = "t" if value else "f"
+    elif isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.isoformat()
+    elif isinstance(value, dict):
+        value = json.dumps(value)
+    elif isinstance(value, (list, tuple)):
+        value = "{{{}}}".format(
+            ",".join(
+                "NULL"
+                if v is None
+                else '"{}"'.format(str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                for v in value
+            )
+        )
+    else:
+        value = str(value)
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
 
-    def comma_separated(items):
-        return ", ".join([f'"{i}"' for i in items])
 
-    if values:
-        stmt = """
-            INSERT INTO "{table}" ({fields_str})
-            VALUES %s
-            ON CONFLICT ({by})
-            DO
-            UPDATE SET ({set_fields})=({set_values})
-        """
-        set_fields = comma_separated([f for f in fields if f not in by])
-        set_values = ", ".join([f'EXCLUDED."{f}"' for f in fields if f not in by])
-
-        formatted_sql = stmt.format(
-            table=model._meta.db_table,
-            fields_str=comma_separated(fields),
-            by=comma_separated(by),
-            set_fields=set_fields,
-            set_values=set_values,
+class CopyStream:
+    """
+    File-like object that formats rows lazily as they are read by COPY
+    """
+
+    def __init__(self, rows: Iterable[Sequence]):
+        self.rows = iter(rows)
+        self.buffer = ""
+        self.row_count = 0
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self.buffer) < size:
+            try:
+                row = next(self.rows)
+            except StopIteration:
+                break
+            self.buffer += "\t".join(copy_value(v) for v in row) + "\n"
+            self.row_count += 1
+        if size < 0:
+            data, self.buffer = self.buffer, ""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def comma_separated(items):
+    return ", ".join([f'"{i}"' for i in items])
+
+
+def bulk_copy(cursor, table: str, fields: List[str], rows: Iterable[Sequence]) -> int:
+    """
+    Stream rows into a table using `COPY ... FROM STDIN`
+
+    Returns the number of rows copied
+    """
+    stream = CopyStream(rows)
+    cursor.copy_expert(
+        'COPY "{table}" ({fields}) FROM STDIN'.format(
+            table=table,
+            fields=comma_separated(fields),
+        ),
+        stream,
+    )
+    return stream.row_count
+
+
+def bulk_upsert(model: Model, fields: List[str], values: List[dict], by: List[str]):
+    """
+    Insert or update records by copying them into a temporary staging table
+    and merging into the model's table with `INSERT ... ON CONFLICT`. Where
+    a key appears more than once the last record is used.
+    """
+    if not values:
+        return
+
+    table = model._meta.db_table
+    staging_table = "{}_staging".format(table)
+    update_fields = [f for f in fields if f not in by]
+    if update_fields:
+        on_conflict = "DO UPDATE SET {}".format(
+            ", ".join([f'"{f}" = EXCLUDED."{f}"' for f in update_fields])
         )
+    else:
+        on_conflict = "DO NOTHING"
 
-        with connections["data"].cursor() as cursor:
-            execute_values(
-                cursor,
-                formatted_sql,
-                [tuple(row.get(f) for f in fields) for row in values],
+    # the staging table is dropped at the end of the transaction, so there
+    # needs to be one open even if the caller is in autocommit mode
+    with transaction.atomic(using="data"), connections["data"].cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS "{staging_table}"')
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE "{staging}" ON COMMIT DROP AS
+            SELECT {fields_str} FROM "{table}" WITH NO DATA
+            """.format(
+                staging=staging_table,
+                fields_str=comma_separated(fields),
+                table=table,
             )
+        )
+        bulk_copy(
+            cursor,
+            staging_table,
+            fields,
+            (tuple(row.get(f) for f in fields) for row in values),
+        )
+        cursor.execute(
+            """
+            INSERT INTO "{table}" ({fields_str})
+            SELECT DISTINCT ON ({by}) {fields_str}
+            FROM "{staging}"
+            ORDER BY {by}, ctid DESC
+            ON CONFLICT ({by})
+            {on_conflict}
+            """.format(
+                table=table,
+                staging=staging_table,
+                fields_str=comma_separated(fields),
+                by=comma_separated(by),
+                on_conflict=on_conflict,
+            )
+        )
+        cursor.execute(f'DROP TABLE "{staging_table}"')
 
 
 class BulkQuerySet(QuerySet):
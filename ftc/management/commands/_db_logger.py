@@ -1,31 +1,81 @@
 import logging
+import time
 
-from ftc.models import Scrape
+from ftc.models import Scrape, ScrapeLog
 
 
 class ScrapeHandler(logging.StreamHandler):
+    """
+    Log handler that stores the log for a scrape in the database.
+
+    Messages are buffered and written as a new `ScrapeLog` chunk once the
+    buffer reaches `flush_size` characters, when `flush_interval` seconds have
+    passed since the last write, on an error and at teardown.
+    """
+
+    flush_size = 64 * 1024
+    flush_interval = 10
+
     def __init__(self, scrape, expected_records=1):
         logging.StreamHandler.__init__(self)
         self.scrape = scrape
         self.expected_records = expected_records
-        self.log = ""
+        self.buffer = []
+        self.buffer_size = 0
+        self.chunks = []
+        self.last_flush = time.monotonic()
 
     def emit(self, record):
-        msg = self.format(record)
-        self.scrape.log += msg + self.terminator
-        self.log += msg + self.terminator
+        msg = self.format(record) + self.terminator
+        self.buffer.append(msg)
+        self.buffer_size += len(msg)
         if record.levelno in (logging.WARNING, logging.ERROR, logging.CRITICAL):
             self.scrape.errors += 1
-        self.scrape.save()
+        if (
+            record.levelno >= logging.ERROR
+            or self.buffer_size >= self.flush_size
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            self.last_flush = time.monotonic()
+            if not self.buffer:
+                return
+            chunk = "".join(self.buffer)
+            self.buffer = []
+            self.buffer_size = 0
+            self.chunks.append(chunk)
+            ScrapeLog.objects.create(scrape=self.scrape, log=chunk)
+            Scrape.objects.filter(pk=self.scrape.pk).update(errors=self.scrape.errors)
+        finally:
+            self.release()
+
+    def teardown(self, expected_records=None):
+        """
+        Write any remaining log and set the final status of the scrape.
+        `expected_records` overrides the value given when the handler was
+        created, for runs where finding no records isn't a failure.
+        """
+        if expected_records is None:
+            expected_records = self.expected_records
         self.flush()
 
-    def teardown(self):
-        if self.expected_records and (self.scrape.items == 0):
+        # chunks written inside a transaction that has been rolled back
+        # need to be written again
+        log_chunks = ScrapeLog.objects.filter(scrape=self.scrape)
+        if log_chunks.count() < len(self.chunks):
+            log_chunks.delete()
+            ScrapeLog.objects.bulk_create(
+                [ScrapeLog(scrape=self.scrape, log=chunk) for chunk in self.chunks]
+            )
+
+        if expected_records and (self.scrape.items == 0):
             self.scrape.status = Scrape.ScrapeStatus.FAILED
         elif self.scrape.errors > 0:
             self.scrape.status = Scrape.ScrapeStatus.ERRORS
         else:
             self.scrape.status = Scrape.ScrapeStatus.SUCCESS
-        if self.log and not self.scrape.log:
-            self.scrape.log = self.log
         self.scrape.save()
@@ -0,0 +1,137 @@
+import re
+from functools import lru_cache
+
+import validators
+
+POSTCODE_REGEX = re.compile(
+    r"([Gg][Ii][Rr] 0[Aa]{2})|((([A-Za-z][0-9]{1,2})|(([A-Za-z][A-Ha-hJ-Yj-y][0-9]{1,2})|(([A-Za-z][0-9][A-Za-z])|([A-Za-z][A-Ha-hJ-Yj-y][0-9][A-Za-z]?))))\s?[0-9][A-Za-z]{2})"
+)
+
+# postcodes that `normalise_postcode` would return unchanged
+CANONICAL_POSTCODE_REGEX = re.compile(r"[0-9A-Z]{1,4} [0-9A-NP-Z][0-9A-Z]{2}")
+NON_ALPHANUMERIC_REGEX = re.compile(r"[^0-9a-zA-Z]+")
+
+# values found in website fields that aren't websites
+BLANK_URLS = frozenset(
+    [
+        "n.a",
+        "non.e",
+        ".0",
+        "-.-",
+        ".none",
+        ".nil",
+        "N/A",
+        "TBC",
+        "under construction",
+        ".n/a",
+        "0.0",
+        ".P",
+        b"",
+        "no.website",
+    ]
+)
+HTTP_TYPOS = (
+    "http;//",
+    "http//",
+    "http.//",
+    "http:\\\\",
+    "http://http://",
+    "www://",
+    "www.http://",
+)
+WWW_TYPOS = ("www,", ":www", "www:", "www/", "www\\\\", ".www")
+
+# the same postcodes and websites appear many times across imports
+POSTCODE_CACHE_SIZE = 2**18
+URL_CACHE_SIZE = 2**16
+
+
+def normalise_postcode(postcode):
+    """
+    standardises a postcode into the correct format
+    """
+    if postcode is None:
+        return None
+
+    # most postcodes are already in the right format
+    if CANONICAL_POSTCODE_REGEX.fullmatch(postcode):
+        return postcode
+
+    return _normalise_postcode(postcode)
+
+
+@lru_cache(maxsize=POSTCODE_CACHE_SIZE)
+def _normalise_postcode(postcode):
+    # check for blank/empty
+    # put in all caps
+    postcode = postcode.strip().upper()
+    if postcode == "":
+        return None
+
+    # replace any non alphanumeric characters
+    postcode = NON_ALPHANUMERIC_REGEX.sub("", postcode)
+
+    if postcode == "":
+        return None
+
+    # check for nonstandard codes
+    if len(postcode) > 7:
+        return postcode
+
+    first_part = postcode[:-3]
+    last_part = postcode[-3:]
+
+    # check for incorrect characters
+    if last_part[:1] == "O":
+        last_part = "0" + last_part[1:]
+
+    return first_part + " " + last_part
+
+
+@lru_cache(maxsize=POSTCODE_CACHE_SIZE)
+def match_postcode(value):
+    """
+    Standardise a value and return it if it looks like a postcode, otherwise
+    return `None`
+    """
+    postcode = normalise_postcode(value)
+    if postcode and POSTCODE_REGEX.match(postcode):
+        return postcode
+    return None
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def normalise_url(url):
+    """
+    Check that a website is a valid URL, fixing common mistakes and adding
+    a scheme if it doesn't have one. Returns `None` if it can't be fixed.
+    """
+    if url is None:
+        return None
+
+    url = url.strip()
+
+    if validators.url(url):
+        return url
+
+    if validators.url("http://%s" % url):
+        return "http://%s" % url
+
+    if url in BLANK_URLS:
+        return None
+
+    for i in HTTP_TYPOS:
+        url = url.replace(i, "http://")
+    url = url.replace("http:/www", "http://www")
+
+    for i in WWW_TYPOS:
+        url = url.replace(i, "www.")
+
+    url = url.replace(",", ".")
+    url = url.replace("..", ".")
+
+    if validators.url(url):
+        return url
+
+    if validators.url("http://%s" % url):
+        return "http://%s" % url
@@ -0,0 +1,243 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+import django
+from django.core import management
+from django.db import connections
+
+
+@dataclass
+class Step:
+    """
+    A management command run as part of a pipeline, once all the steps in
+    `depends` have finished successfully
+    """
+
+    name: str
+    command: str = None
+    args: tuple = ()
+    depends: tuple = ()
+
+    def __post_init__(self):
+        if self.command is None:
+            self.command = self.name
+
+
+def scraper_steps(commands, depends=()):
+    return [Step(command, depends=tuple(depends)) for command in commands]
+
+
+# scrapers only replace the records for their own spider, so they can run at
+# the same time as each other
+IMPORT_ALL_STEPS = scraper_steps(
+    [
+        "import_casc",
+        "import_coe",
+        "import_gor",
+        "import_govuk",
+        "import_ror",
+        "import_hesa",
+        "import_officeforstudents",
+        "import_la_mysociety",
+        "import_manual_links",
+        "import_mutuals",
+        "import_nhsods",
+        "import_rsl",
+        "import_schools_gias",
+        "import_schools_scotland",
+        "import_schools_wales",
+        # "import_schools_ni",
+    ]
+)
+
+IMPORT_CHARITIES_STEPS = scraper_steps(
+    [
+        "import_ccni",
+        # "import_oscr",
+        "import_ccew",
+    ]
+) + [
+    Step("import_ukcat", depends=("import_ccni", "import_ccew")),
+    # writes to the same classification tables as `import_ukcat`
+    Step("calculate_scale", depends=("import_ccni", "import_ccew", "import_ukcat")),
+    Step("import_names", depends=("import_ccni", "import_ccew")),
+]
+
+IMPORT_OTHER_DATA_STEPS = scraper_steps(
+    [
+        "import_gender_pay_gap",
+        "import_360giving",
+        "import_cqc",
+        "import_wikidata",
+    ]
+) + [
+    # both grant imports rebuild the grant summary table
+    Step("import_national_lottery", depends=("import_360giving",)),
+]
+
+
+def update_steps(import_steps, es_index_args=(), extra_steps=()):
+    """
+    Steps for the scheduled updates: run the imports, then update geodata
+    and the search index once they have all finished. `es_index` runs
+    `update_orgids`, which rewrites `linked_orgs`, so the downloads and any
+    extra steps wait for it.
+    """
+    imports = tuple(step.name for step in import_steps)
+    return [
+        *import_steps,
+        Step("update_geodata", depends=imports),
+        Step("es_index", args=tuple(es_index_args), depends=("update_geodata",)),
+        Step(
+            "export_downloads",
+            args=("--upload-to-storage",),
+            depends=("es_index",),
+        ),
+        *extra_steps,
+    ]
+
+
+PIPELINES = {
+    "all": IMPORT_ALL_STEPS,
+    "charities": IMPORT_CHARITIES_STEPS,
+    "other_data": IMPORT_OTHER_DATA_STEPS,
+    "daily": update_steps(
+        IMPORT_ALL_STEPS + IMPORT_CHARITIES_STEPS,
+        es_index_args=["--incremental"],
+        extra_steps=[Step("refresh_data_views", depends=("es_index",))],
+    ),
+    "saturday": update_steps(
+        IMPORT_ALL_STEPS + IMPORT_CHARITIES_STEPS + [Step("import_ch")],
+        es_index_args=["--incremental"],
+        extra_steps=[
+            Step(
+                "output_ccew_laua",
+                command="output_ccew",
+                args=("--upload-to-storage", "--geo-field", "geo_laua", "all"),
+                depends=("update_geodata",),
+            ),
+            Step(
+                "output_ccew_rgn",
+                command="output_ccew",
+                args=("--upload-to-storage", "--geo-field", "geo_rgn", "all"),
+                depends=("update_geodata",),
+            ),
+        ],
+    ),
+    "sunday": update_steps(
+        IMPORT_ALL_STEPS + IMPORT_CHARITIES_STEPS + IMPORT_OTHER_DATA_STEPS,
+    ),
+}
+
+
+def run_step(command, args):
+    """
+    Run a management command in a worker process, returning how long it
+    took and the error message if it fails
+    """
+    start = time.monotonic()
+    error = None
+    try:
+        management.call_command(command, *args)
+    except Exception as err:
+        error = repr(err)
+    finally:
+        connections.close_all()
+    return round(time.monotonic() - start, 1), error
+
+
+class PipelineRunner:
+    """
+    Run the steps of a pipeline in a pool of worker processes, starting each
+    step as soon as the steps it depends on have finished. Each step gets a
+    fresh process, so memory used by one step isn't held on to while the
+    next one runs. Steps that depend on a failed step are skipped. If a
+    worker process dies (for example if it runs out of memory) the steps
+    that were running fail and the rest are skipped.
+
+    `on_step` is called with the name and result of a step whenever its
+    status changes, so that progress can be saved.
+    """
+
+    def __init__(self, steps, workers=1, on_step=None):
+        self.steps = {step.name: step for step in steps}
+        self.workers = workers
+        self.on_step = on_step
+        self.results = {}
+
+    def is_ready(self, step, finished):
+        # dependencies that aren't part of this run are treated as finished
+        return all(d in finished or d not in self.steps for d in step.depends)
+
+    def run(self, finished=()):
+        finished = set(finished)
+        failed = set()
+        pending = {
+            name: step for name, step in self.steps.items() if name not in finished
+        }
+        running = {}
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+            max_tasks_per_child=1,
+        ) as executor:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    if any(d in failed for d in step.depends):
+                        del pending[name]
+                        failed.add(name)
+                        self.set_status(name, "skipped")
+                    elif self.is_ready(step, finished):
+                        del pending[name]
+                        future = executor.submit(run_step, step.command, step.args)
+                        running[future] = name
+                        self.set_status(name, "running")
+
+                if not running:
+                    # the remaining steps depend on each other
+                    for name in pending:
+                        self.set_status(name, "skipped")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        seconds, error = future.result()
+                    except Exception as err:
+                        broken = broken or isinstance(err, BrokenProcessPool)
+                        failed.add(name)
+                        self.set_status(name, "failed", error=repr(err))
+                        continue
+                    if error:
+                        failed.add(name)
+                    else:
+                        finished.add(name)
+                    self.set_status(
+                        name,
+                        "failed" if error else "success",
+                        seconds=seconds,
+                        error=error,
+                    )
+
+                if broken:
+                    # no more steps can be run in a broken pool
+                    for name in running.values():
+                        self.set_status(
+                            name, "failed", error="Worker process terminated"
+                        )
+                    for name in pending:
+                        self.set_status(name, "skipped")
+                    break
+        return self.results
+
+    def set_status(self, name, status, **kwargs):
+        self.results[name] = {"status": status, **kwargs}
+        if self.on_step:
+            self.on_step(name, self.results[name])
@@ -1,15 +1,25 @@
 import argparse
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import batched
 
+import django
 from django.conf import settings
 from django.core import management
+from django.db.models import Q
+from elasticsearch.helpers import parallel_bulk, scan
 
 from ftc.documents import OrganisationGroup
 from ftc.management.commands._base_scraper import BaseScraper
+from ftc.management.commands.update_orgids import Command as UpdateOrgidsCommand
+from ftc.models import Organisation, Scrape
 
 ALIAS = "full-organisation-load"
 PATTERN = ALIAS + "-*"
 REQUEST_TIMEOUT = 3600
+PARTITIONS_PER_WORKER = 4
+INCREMENTAL_CHUNK_SIZE = 10000
 
 
 class OrganisationGroupAlias(OrganisationGroup):
@@ -31,6 +41,29 @@ class OrganisationGroupAlias(OrganisationGroup):
         return super(OrganisationGroupAlias, self)._get_index(index, required)
 
 
+def index_partition(index, linked_orgs_range):
+    """
+    Index one range of organisation groups. Run in a worker process, so it
+    uses its own database and elasticsearch connections.
+    """
+    doc = OrganisationGroupAlias(alias=index)
+    qs = doc.get_indexing_queryset(linked_orgs_range=linked_orgs_range, progress=False)
+    success = 0
+    errors = []
+    for ok, item in parallel_bulk(
+        client=doc._get_connection(),
+        actions=doc._get_actions(qs, "index"),
+        chunk_size=doc.django.queryset_pagination,
+        raise_on_error=False,
+        request_timeout=REQUEST_TIMEOUT,
+    ):
+        if ok:
+            success += 1
+        else:
+            errors.append(item)
+    return success, errors
+
+
 class Command(BaseScraper):
     help = "Add Organisations to elasticsearch index"
     name = "es_load"
@@ -54,14 +87,54 @@ class Command(BaseScraper):
             help="Run `update_orgids` before indexing",
             default=True,
         )
+        parser.add_argument(
+            "--incremental",
+            action=argparse.BooleanOptionalAction,
+            help="Only update the organisations that have changed since the last index",
+            default=False,
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Number of processes used to build and index documents",
+            default=1,
+        )
 
-    def run_scraper(self, *args, **options):
+    def handle(self, *args, **options):
         # setup logging to capture elasticsearch output
         self.logging_setup()
 
-        # run the update_orgids scraper
-        if options["update_orgids"]:
-            management.call_command("update_orgids")
+        # run the update_orgids scraper before the indexing transaction starts
+        # so that its changes are visible to any indexing workers
+        self.changed_orgids = set()
+        if options.get("update_orgids", True):
+            try:
+                update_orgids = UpdateOrgidsCommand()
+                management.call_command(update_orgids)
+                self.changed_orgids = update_orgids.changed_orgids
+            except Exception as err:
+                self.logger.exception(err)
+                self.scrape_logger.teardown()
+                raise
+
+        super().handle(*args, **options)
+
+    def run_scraper(self, *args, **options):
+        if options.get("incremental"):
+            last_scrape = (
+                Scrape.objects.filter(
+                    spider=self.name,
+                    status__in=[
+                        Scrape.ScrapeStatus.SUCCESS,
+                        Scrape.ScrapeStatus.ERRORS,
+                    ],
+                )
+                .order_by("-start_time")
+                .first()
+            )
+            if last_scrape:
+                return self.run_incremental(last_scrape)
+            self.logger.info("No previous index found, rebuilding the full index")
 
         # create new index
         next_index = PATTERN.replace("*", str(self.scrape.id))
@@ -86,15 +159,19 @@ class Command(BaseScraper):
 
         # populate the index (bulk)
         parallel = options["parallel"]
+        workers = options.get("workers") or 1
         self.logger.info(
             "Indexing {} '{}' objects {}".format(
                 doc.get_queryset().count() if options["count"] else "all",
                 doc.django.model.__name__,
-                "(parallel)" if parallel else "",
+                "(parallel)" if (parallel or workers > 1) else "",
             )
         )
-        qs = doc.get_indexing_queryset()
-        result = doc.update(qs, parallel=parallel, request_timeout=REQUEST_TIMEOUT)
+        if workers > 1:
+            result = self.index_partitions(doc, next_index, workers)
+        else:
+            qs = doc.get_indexing_queryset()
+            result = doc.update(qs, parallel=parallel, request_timeout=REQUEST_TIMEOUT)
         self.scrape.items = result[0]
         self.scrape.results = {
             "records_indexed": result[0],
@@ -126,6 +203,145 @@ class Command(BaseScraper):
 
         self.scrape_logger.teardown()
 
+    def run_incremental(self, last_scrape):
+        """
+        Update the documents in the live index for any groups that contain an
+        organisation that has changed since the last successful index, and
+        remove the documents for groups whose organisations have disappeared.
+        """
+        doc = OrganisationGroup()
+        es = doc._get_connection()
+
+        self.logger.info(
+            "Finding organisations changed since {:%Y-%m-%d %H:%M}".format(
+                last_scrape.start_time
+            )
+        )
+        changed_orgids = set(self.changed_orgids)
+        changed_orgids.update(
+            Organisation.objects.filter(
+                Q(scrape_id__gt=last_scrape.id)
+                | Q(dateModified__gt=last_scrape.start_time)
+            )
+            .values_list("org_id", flat=True)
+            .iterator()
+        )
+        self.logger.info(
+            "Found {:,.0f} changed organisations".format(len(changed_orgids))
+        )
+
+        # any remaining members of a missing group are indexed again
+        deleted, missing_orgids = self.delete_missing_groups(doc, es)
+        changed_orgids = sorted(changed_orgids | missing_orgids)
+
+        success = 0
+        for i in range(0, len(changed_orgids), INCREMENTAL_CHUNK_SIZE):
+            org_ids = changed_orgids[i : i + INCREMENTAL_CHUNK_SIZE]
+            groups = list(doc.get_indexing_queryset(org_ids=org_ids, progress=False))
+            if groups:
+                result = doc.update(groups, request_timeout=REQUEST_TIMEOUT)
+                success += result[0]
+
+            # remove any documents for groups that have been merged or
+            # have a different main organisation
+            result = es.delete_by_query(
+                index=doc._index._name,
+                body={
+                    "query": {
+                        "bool": {
+                            "filter": [{"terms": {"orgIDs": org_ids}}],
+                            "must_not": [
+                                {"ids": {"values": [str(g.org_id) for g in groups]}}
+                            ],
+                        }
+                    }
+                },
+                request_timeout=REQUEST_TIMEOUT,
+            )
+            deleted += result.get("deleted", 0)
+            self.logger.info(
+                "Updated {:,.0f} groups, deleted {:,.0f} ({:,.0f} of {:,.0f} organisations)".format(
+                    success,
+                    deleted,
+                    min(i + INCREMENTAL_CHUNK_SIZE, len(changed_orgids)),
+                    len(changed_orgids),
+                )
+            )
+
+        self.scrape.items = success
+        self.scrape.results = {
+            "records_indexed": success,
+            "records_deleted": deleted,
+        }
+        self.logger.info("Indexing objects - done")
+
+        # it isn't an error if nothing has changed
+        self.scrape_logger.teardown(expected_records=0)
+
+    def delete_missing_groups(self, doc, es):
+        """
+        Delete the documents for groups whose main organisation is no longer
+        in the database, returning the number deleted and the orgIDs that
+        were in those groups
+        """
+        self.logger.info("Finding groups that are no longer in the database")
+        deleted = 0
+        missing_orgids = set()
+        hits = scan(
+            es,
+            index=doc._index._name,
+            query={"_source": ["orgIDs"]},
+            request_timeout=REQUEST_TIMEOUT,
+        )
+        for chunk in batched(hits, INCREMENTAL_CHUNK_SIZE):
+            existing = set(
+                Organisation.objects.filter(
+                    org_id__in=[hit["_id"] for hit in chunk]
+                ).values_list("org_id", flat=True)
+            )
+            missing = [hit for hit in chunk if hit["_id"] not in existing]
+            if not missing:
+                continue
+            for hit in missing:
+                missing_orgids.update(hit["_source"].get("orgIDs", []))
+            result = es.delete_by_query(
+                index=doc._index._name,
+                body={"query": {"ids": {"values": [hit["_id"] for hit in missing]}}},
+                request_timeout=REQUEST_TIMEOUT,
+            )
+            deleted += result.get("deleted", 0)
+        self.logger.info("Deleted {:,.0f} missing groups".format(deleted))
+        return deleted, missing_orgids
+
+    def index_partitions(self, doc, index, workers):
+        partitions = doc.get_partitions(workers * PARTITIONS_PER_WORKER)
+        self.logger.info(
+            "Indexing {:,.0f} partitions using {:,.0f} workers".format(
+                len(partitions), workers
+            )
+        )
+        success = 0
+        errors = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as executor:
+            futures = {
+                executor.submit(index_partition, index, partition): partition
+                for partition in partitions
+            }
+            for future in as_completed(futures):
+                partition_success, partition_errors = future.result()
+                success += partition_success
+                errors.extend(partition_errors)
+                self.logger.info(
+                    "Indexed {:,.0f} groups [{} to {}]".format(
+                        partition_success, *futures[future]
+                    )
+                )
+        return success, errors
+
     def logging_setup(self):
         # hook into elasticsearch logger too
         es_logger = logging.getLogger("elasticsearch")
@@ -0,0 +1,110 @@
+import argparse
+import importlib.util
+
+from boto3 import session
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ftc.export import (
+    DOWNLOADS_SPIDER,
+    snapshot_key,
+    snapshot_path,
+    write_parquet_snapshot,
+    write_snapshot,
+)
+from ftc.models import Organisation, OrganisationType, Scrape, Source
+
+# headers for each file stored in the storage bucket
+STORAGE_ARGS = {
+    "csv.gz": {"ContentType": "text/csv", "ContentEncoding": "gzip"},
+    "parquet": {"ContentType": "application/vnd.apache.parquet"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the CSV and parquet bulk downloads for all organisations and "
+        "for each organisation type and source"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--parquet",
+            action=argparse.BooleanOptionalAction,
+            help="Also write parquet files (needs pyarrow, on by default if installed)",
+            default=importlib.util.find_spec("pyarrow") is not None,
+        )
+        parser.add_argument(
+            "--upload-to-storage",
+            action="store_true",
+            help="Upload files to S3 or compatible storage after export",
+        )
+
+    def handle(self, *args, **options):
+        self.s3_client = None
+        if options["upload_to_storage"]:
+            s3_session = session.Session()
+            self.s3_client = s3_session.client(
+                "s3",
+                region_name=settings.S3_REGION,
+                endpoint_url=settings.S3_ENDPOINT,
+                aws_access_key_id=settings.S3_ACCESS_ID,
+                aws_secret_access_key=settings.S3_SECRET_KEY,
+            )
+
+        downloads = [(None, "all", Organisation.objects.all())]
+        for orgtype in OrganisationType.objects.order_by("slug"):
+            downloads.append(
+                (
+                    "type",
+                    orgtype.slug,
+                    Organisation.objects.filter(
+                        organisationType__overlap=[orgtype.slug]
+                    ),
+                )
+            )
+        for source in Source.objects.order_by("id"):
+            downloads.append(
+                ("source", source.id, Organisation.objects.filter(source=source))
+            )
+
+        uploaded = []
+        for kind, name, queryset in downloads:
+            csv_path = snapshot_path(kind, name, "csv.gz")
+            write_snapshot(queryset, csv_path)
+            self.stdout.write("{} saved".format(csv_path))
+            files = [("csv.gz", csv_path)]
+            if options["parquet"]:
+                parquet_path = snapshot_path(kind, name, "parquet")
+                write_parquet_snapshot(csv_path, parquet_path)
+                self.stdout.write("{} saved".format(parquet_path))
+                files.append(("parquet", parquet_path))
+
+            if self.s3_client:
+                for filetype, path in files:
+                    key = snapshot_key(kind, name, filetype)
+                    self.s3_client.upload_file(
+                        path,
+                        settings.S3_BUCKET,
+                        key,
+                        ExtraArgs={
+                            "ACL": "public-read",
+                            "ContentDisposition": 'attachment; filename="{}.{}"'.format(
+                                name, filetype.removesuffix(".gz")
+                            ),
+                            **STORAGE_ARGS[filetype],
+                        },
+                    )
+                    uploaded.append(key)
+                    self.stdout.write("{} uploaded to s3".format(key))
+
+        # the web servers link to the files uploaded by the latest run
+        if uploaded:
+            Scrape.objects.create(
+                spider=DOWNLOADS_SPIDER,
+                status=Scrape.ScrapeStatus.SUCCESS,
+                items=len(uploaded),
+                errors=0,
+                log="",
+                result={"uploaded": uploaded},
+            )
@@ -1,31 +1,6 @@
-from django.core import management
-from django.core.management.base import BaseCommand
+from ftc.management.commands.run_pipeline import Command as PipelineCommand
 
 
-class Command(BaseCommand):
-    scrapers = [
-        "casc",
-        "coe",
-        "gor",
-        "govuk",
-        "ror",
-        "hesa",
-        "officeforstudents",
-        "la_mysociety",
-        "manual_links",
-        "mutuals",
-        "nhsods",
-        "rsl",
-        "schools_gias",
-        "schools_scotland",
-        "schools_wales",
-        # "schools_ni",
-    ]
-
-    def handle(self, *args, **options):
-        scrapers_to_run = ["import_{}".format(scraper) for scraper in self.scrapers]
-        for scraper in scrapers_to_run:
-            try:
-                management.call_command(scraper)
-            except Exception:
-                self.stdout.write(self.style.ERROR("Command {} failed".format(scraper)))
+class Command(PipelineCommand):
+    help = "Run the imports for non-charity organisations"
+    pipeline = "all"
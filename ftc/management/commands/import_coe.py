@@ -17,6 +17,8 @@ class Command(HTMLScraper):
     start_urls = [
         "https://www.churchofengland.org/resources/churchcare/churchcare-grants/open-grant-data-360-giving",
     ]
+    # the data files are linked from the start page
+    skip_unchanged_files = False
     org_id_prefix = "GB-COE"
     id_field = "church code"
     source = {
@@ -14,6 +14,8 @@ class Command(HTMLScraper):
     start_urls = [
         "https://www.gov.uk/government/publications/current-registered-providers-of-social-housing",
     ]
+    # the data files are linked from the start page
+    skip_unchanged_files = False
     org_id_prefix = "GB-SHPE"
     id_field = "registration number"
     source = {
@@ -50,6 +50,8 @@ class Command(CSVScraper):
         ],
     }
 
+    stream_files = True
+    encoding = "cp1252"
     date_format = "%d-%m-%Y"
     gias_url_format = "https://ea-edubase-api-prod.azurewebsites.net/edubase/downloads/public/edubasealldata{:%Y%m%d}.csv"
     date_fields = ["OpenDate", "CloseDate"]
@@ -80,9 +82,8 @@ class Command(CSVScraper):
             for day in date_range:
                 link = u.format(day.strftime("%Y%m%d"))
                 self.logger.info(f"Attempting to fetch {link}")
-                response = self.session.get(link)
                 try:
-                    response.raise_for_status()
+                    response = self.download_file(link)
                 except HTTPError as e:
                     self.logger.error(f"Error fetching {link}: {e}")
                     continue
@@ -47,6 +47,8 @@ class Command(HTMLScraper):
     name = "schools_scotland"
     allowed_domains = ["gov.scot"]
     start_urls = ["https://www.gov.scot/publications/school-contact-details/"]
+    # the data files are linked from the start page
+    skip_unchanged_files = False
     skip_rows = 7
     org_id_prefix = "GB-SCOTEDU"
     id_field = "seed_code"
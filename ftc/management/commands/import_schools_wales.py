@@ -37,6 +37,8 @@ class Command(HTMLScraper):
     name = "schools_wales"
     allowed_domains = ["gov.wales"]
     start_urls = ["https://gov.wales/address-list-schools"]
+    # the data files are linked from the start page
+    skip_unchanged_files = False
     org_id_prefix = "GB-WALEDU"
     id_field = "School Number"
     date_fields = []
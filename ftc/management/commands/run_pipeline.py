@@ -0,0 +1,133 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ftc.management.commands._pipeline import PIPELINES, PipelineRunner
+from ftc.models import Scrape
+
+# steps run one at a time unless asked, to fit in the memory of a small
+# worker dyno
+DEFAULT_WORKERS = 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a pipeline of import and update commands, running steps that "
+        "don't depend on each other at the same time"
+    )
+    pipeline = None
+
+    def add_arguments(self, parser):
+        if not self.pipeline:
+            parser.add_argument(
+                "pipeline", type=str, choices=PIPELINES.keys(), help="Pipeline to run"
+            )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Number of steps to run at the same time",
+            default=DEFAULT_WORKERS,
+        )
+        parser.add_argument(
+            "--only",
+            type=str,
+            nargs="+",
+            help="Only run these steps",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Only run the steps that didn't succeed in the last run",
+        )
+
+    def handle(self, *args, **options):
+        pipeline = self.pipeline or options["pipeline"]
+        steps = PIPELINES[pipeline]
+        spider = "pipeline_{}".format(pipeline)
+
+        if options.get("only"):
+            unknown = set(options["only"]) - {step.name for step in steps}
+            if unknown:
+                raise CommandError("Unknown steps: {}".format(", ".join(unknown)))
+            steps = [step for step in steps if step.name in options["only"]]
+
+        # steps that succeeded in the last run are kept in the results of
+        # this one, so that it can be resumed again
+        results = {}
+        if options.get("resume"):
+            last_run = (
+                Scrape.objects.filter(spider=spider).order_by("-start_time").first()
+            )
+            if not last_run or not last_run.result:
+                raise CommandError("No previous run of {} to resume".format(pipeline))
+            results = {
+                name: result
+                for name, result in last_run.result.get("steps", {}).items()
+                if result["status"] == "success"
+            }
+
+        self.scrape = Scrape.objects.create(
+            spider=spider,
+            status=Scrape.ScrapeStatus.RUNNING,
+            result={"steps": results},
+        )
+
+        def on_step(name, result):
+            self.scrape.result["steps"][name] = result
+            self.scrape.save(update_fields=["result", "finish_time"])
+            if result["status"] == "running":
+                return
+            style = (
+                self.style.SUCCESS
+                if result["status"] == "success"
+                else self.style.ERROR
+            )
+            self.stdout.write(
+                style(
+                    "{} {}{}".format(
+                        name,
+                        result["status"],
+                        " ({:,.1f}s)".format(result["seconds"])
+                        if "seconds" in result
+                        else "",
+                    )
+                )
+            )
+
+        runner = PipelineRunner(steps, workers=options["workers"], on_step=on_step)
+        try:
+            runner.run(finished=results.keys())
+        finally:
+            self.finish_scrape(steps)
+
+        failed = [
+            name
+            for name, r in self.scrape.result["steps"].items()
+            if r["status"] != "success"
+        ]
+        if failed:
+            raise CommandError("Steps did not succeed: {}".format(", ".join(failed)))
+
+    def finish_scrape(self, steps):
+        """
+        Record the outcome of the run, even if the pipeline stopped part way
+        through
+        """
+        step_results = self.scrape.result["steps"]
+        for step in steps:
+            if step.name not in step_results:
+                step_results[step.name] = {"status": "skipped"}
+            elif step_results[step.name]["status"] == "running":
+                step_results[step.name] = {
+                    "status": "failed",
+                    "error": "Pipeline stopped while the step was running",
+                }
+
+        statuses = [r["status"] for r in step_results.values()]
+        self.scrape.items = statuses.count("success")
+        self.scrape.errors = len(statuses) - self.scrape.items
+        if not self.scrape.errors:
+            self.scrape.status = Scrape.ScrapeStatus.SUCCESS
+        elif self.scrape.items:
+            self.scrape.status = Scrape.ScrapeStatus.ERRORS
+        else:
+            self.scrape.status = Scrape.ScrapeStatus.FAILED
+        self.scrape.save()
@@ -1,4 +1,7 @@
+from django.db import connections
+
 from ftc.management.commands._base_scraper import SQLRunner
+from ftc.management.commands._bulk_upsert import bulk_copy
 from ftc.models import OrgidScheme
 
 UPDATE_ORGIDS_SQL = {
@@ -43,104 +46,9 @@ UPDATE_ORGIDS_SQL = {
     ]
     from priorities
     """.format(",".join([f"'{p}'" for p in OrgidScheme.PRIORITIES])),
-    "Add linked orgIDs": """
-        UPDATE ftc_organisation o
-        SET "linked_orgs" = a.linked_orgs
-        FROM (
-            WITH RECURSIVE a AS (
-                SELECT ftc_organisationlink.org_id_a,
-                    ftc_organisationlink.org_id_b
-                FROM ftc_organisationlink
-                UNION
-                SELECT ftc_organisationlink.org_id_b AS org_id_a,
-                    ftc_organisationlink.org_id_a AS org_id_b
-                FROM ftc_organisationlink
-                UNION
-                SELECT ftc_organisationlink.org_id_a,
-                    ftc_organisationlink.org_id_a AS org_id_b
-                FROM ftc_organisationlink
-                UNION
-                SELECT ftc_organisationlink.org_id_b AS org_id_a,
-                    ftc_organisationlink.org_id_b
-                FROM ftc_organisationlink
-            ),
-            search_graph(org_id_a, org_id_b) AS (
-                SELECT a.org_id_a, a.org_id_b
-                FROM a
-                UNION
-                SELECT sg.org_id_a, a.org_id_b
-                FROM a
-                    INNER JOIN search_graph sg
-                        ON a.org_id_a = sg.org_id_b
-            )
-            SELECT org_id_a AS "org_id",
-                array_agg(org_id_b ORDER BY o.priority, org_id_b ASC NULLS LAST) AS linked_orgs
-            FROM search_graph
-                LEFT OUTER JOIN ftc_organisation o
-                    ON search_graph.org_id_b = o.org_id
-            GROUP BY org_id_a
-        ) AS a
-        WHERE a.org_id = o.org_id;
-    """,
-    "Add verified linked orgIDs": """
-        UPDATE ftc_organisation o
-        SET "linked_orgs_verified" = a.linked_orgs_verified
-        FROM (
-            WITH RECURSIVE official_sources AS (
-                SELECT distinct source_id
-                FROM ftc_organisation 
-            ),
-            official_links AS (
-                SELECT fo.*
-                FROM ftc_organisationlink fo
-                INNER JOIN official_sources s
-                    ON fo.source_id = s.source_id
-            ),
-            a AS (
-                SELECT official_links.org_id_a,
-                    official_links.org_id_b
-                FROM official_links
-                UNION
-                SELECT official_links.org_id_b AS org_id_a,
-                    official_links.org_id_a AS org_id_b
-                FROM official_links
-                UNION
-                SELECT official_links.org_id_a,
-                    official_links.org_id_a AS org_id_b
-                FROM official_links
-                UNION
-                SELECT official_links.org_id_b AS org_id_a,
-                    official_links.org_id_b
-                FROM official_links
-            ),
-            search_graph(org_id_a, org_id_b) AS (
-                SELECT a.org_id_a, a.org_id_b
-                FROM a
-                UNION
-                SELECT sg.org_id_a, a.org_id_b
-                FROM a
-                    INNER JOIN search_graph sg
-                        ON a.org_id_a = sg.org_id_b
-            )
-            SELECT org_id_a AS "org_id",
-                array_agg(org_id_b ORDER BY o.priority, org_id_b ASC NULLS LAST) AS linked_orgs_verified
-            FROM search_graph
-                LEFT OUTER JOIN ftc_organisation o
-                    ON search_graph.org_id_b = o.org_id
-            GROUP BY org_id_a
-        ) AS a
-        WHERE a.org_id = o.org_id
-    """,
-    "Add missing orgIDs": """
-        UPDATE ftc_organisation
-        SET linked_orgs = string_to_array(org_id, '')
-        WHERE linked_orgs IS NULL
-    """,
-    "Add missing orgIDs (linked orgs verified)": """
-        UPDATE ftc_organisation
-        SET linked_orgs_verified = string_to_array(org_id, '')
-        WHERE linked_orgs_verified IS NULL
-    """,
+}
+
+UPDATE_NAMES_SQL = {
     "Add names from grant data": """
         INSERT INTO charity_charityname ("charity_id", "name", "name_type")
         SELECT "recipientOrganization_id" AS "charity_id",
@@ -154,6 +62,113 @@ UPDATE_ORGIDS_SQL = {
     """,
 }
 
+# edges used to find the linked organisations for each field
+LINKED_ORGS_EDGES_SQL = {
+    "linked_orgs": """
+        SELECT org_id_a, org_id_b
+        FROM ftc_organisationlink
+    """,
+    "linked_orgs_verified": """
+        SELECT org_id_a, org_id_b
+        FROM ftc_organisationlink
+        WHERE source_id IN (
+            SELECT DISTINCT source_id
+            FROM ftc_organisation
+        )
+    """,
+}
+
+COMPONENTS_TABLE = "ftc_linked_orgs_components"
+
+UPDATE_LINKED_ORGS_SQL = {
+    "Create components table": f"""
+        CREATE TEMPORARY TABLE "{COMPONENTS_TABLE}" (
+            org_id varchar(200) NOT NULL,
+            component varchar(200) NOT NULL
+        ) ON COMMIT DROP
+    """,
+    "Index components table": f"""
+        CREATE INDEX ON "{COMPONENTS_TABLE}" (component);
+        CREATE INDEX ON "{COMPONENTS_TABLE}" (org_id);
+        ANALYZE "{COMPONENTS_TABLE}";
+    """,
+    "Update changed linked orgs": f"""
+        UPDATE ftc_organisation o
+        SET "{{field}}" = a.linked_orgs
+        FROM (
+            SELECT c.org_id, l.linked_orgs
+            FROM "{COMPONENTS_TABLE}" c
+                INNER JOIN (
+                    SELECT c.component,
+                        array_agg(c.org_id ORDER BY o.priority, c.org_id ASC NULLS LAST) AS linked_orgs
+                    FROM "{COMPONENTS_TABLE}" c
+                        LEFT OUTER JOIN ftc_organisation o
+                            ON c.org_id = o.org_id
+                    GROUP BY c.component
+                ) l
+                    ON c.component = l.component
+        ) AS a
+        WHERE a.org_id = o.org_id
+            AND o."{{field}}" IS DISTINCT FROM a.linked_orgs
+        RETURNING o.org_id
+    """,
+    "Update unlinked orgs": f"""
+        UPDATE ftc_organisation o
+        SET "{{field}}" = string_to_array(o.org_id, '')
+        WHERE o."{{field}}" IS DISTINCT FROM string_to_array(o.org_id, '')
+            AND NOT EXISTS (
+                SELECT 1
+                FROM "{COMPONENTS_TABLE}" c
+                WHERE c.org_id = o.org_id
+            )
+        RETURNING o.org_id
+    """,
+    "Drop components table": f"""
+        DROP TABLE "{COMPONENTS_TABLE}"
+    """,
+}
+
+
+class UnionFind:
+    """
+    Disjoint set of organisation identifiers, used to find groups of
+    organisations that are connected by links
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        parent = self.parent
+        if item not in parent:
+            parent[item] = item
+            self.size[item] = 1
+            return item
+        root = item
+        while parent[root] != root:
+            # path halving
+            parent[root] = parent[parent[root]]
+            root = parent[root]
+        return root
+
+    def union(self, a, b):
+        root_a = self.find(a)
+        root_b = self.find(b)
+        if root_a == root_b:
+            return
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+
+    def components(self):
+        """
+        Yield an (item, component) tuple for each item
+        """
+        for item in self.parent:
+            yield (item, self.find(item))
+
 
 class Command(SQLRunner):
     help = "Find linked orgIDs"
@@ -162,9 +177,56 @@ class Command(SQLRunner):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.post_sql = UPDATE_ORGIDS_SQL
+        self.post_sql = UPDATE_NAMES_SQL
+        # org IDs where linked_orgs or linked_orgs_verified has changed
+        self.changed_orgids = set()
 
     def run_scraper(self, *args, **options):
+        self.execute_sql_statements(UPDATE_ORGIDS_SQL)
+        for field, edges_sql in LINKED_ORGS_EDGES_SQL.items():
+            self.update_linked_orgs(field, edges_sql)
+
         # close the spider
         self.close_spider()
         self.logger.info("Spider finished")
+
+    def get_components(self, edges_sql):
+        components = UnionFind()
+        with connections["data"].chunked_cursor() as cursor:
+            cursor.execute(edges_sql)
+            for org_id_a, org_id_b in cursor:
+                components.union(org_id_a, org_id_b)
+        return components
+
+    def update_linked_orgs(self, field, edges_sql):
+        """
+        Find the connected groups of organisations using union-find over the
+        link table, and only update the organisations where the group has
+        changed
+        """
+        self.logger.info("Finding connected organisations [{}]".format(field))
+        components = self.get_components(edges_sql)
+        self.logger.info(
+            "Found {:,.0f} linked organisations [{}]".format(
+                len(components.parent), field
+            )
+        )
+
+        for sql_name, sql in UPDATE_LINKED_ORGS_SQL.items():
+            self.logger.info("Starting SQL: {} [{}]".format(sql_name, field))
+            self.cursor.execute(sql.format(field=field))
+            if sql_name == "Create components table":
+                bulk_copy(
+                    self.cursor,
+                    COMPONENTS_TABLE,
+                    ["org_id", "component"],
+                    components.components(),
+                )
+            elif sql_name.startswith("Update"):
+                self.changed_orgids.update(row[0] for row in self.cursor.fetchall())
+                self.logger.info(
+                    "Updated {:,.0f} organisations [{}]".format(
+                        self.cursor.rowcount, field
+                    )
+                )
+            self.logger.info("Finished SQL: {} [{}]".format(sql_name, field))
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ftc", "0046_auto_20260117_1711"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScrapeLog",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("log", models.TextField(editable=False)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "scrape",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="log_chunks",
+                        to="ftc.scrape",
+                    ),
+                ),
+            ],
+        ),
+    ]
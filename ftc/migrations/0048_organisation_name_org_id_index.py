@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ftc", "0047_scrapelog"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="organisation",
+            index=models.Index(
+                fields=["name", "org_id"], name="ftc_organis_name_b36b9e_idx"
+            ),
+        ),
+    ]
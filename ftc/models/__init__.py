@@ -8,7 +8,7 @@ from ftc.models.orgid import Orgid, OrgidField
 from ftc.models.orgid_scheme import OrgidScheme
 from ftc.models.personal_data import PersonalData
 from ftc.models.related_organisation import RelatedOrganisation
-from ftc.models.scrape import Scrape
+from ftc.models.scrape import Scrape, ScrapeLog
 from ftc.models.source import Source
 from ftc.models.vocabulary import Vocabulary, VocabularyEntries
 
@@ -25,6 +25,7 @@ __all__ = [
     "PersonalData",
     "RelatedOrganisation",
     "Scrape",
+    "ScrapeLog",
     "Source",
     "Vocabulary",
     "VocabularyEntries",
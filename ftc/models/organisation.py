@@ -237,6 +237,7 @@ class Organisation(models.Model):
             GinIndex(fields=["linked_orgs_verified"]),
             GinIndex(fields=["alternateName"]),
             GinIndex(fields=["organisationType"]),
+            models.Index(fields=["name", "org_id"]),
         ]
 
     def __str__(self):
@@ -251,8 +252,9 @@ class Organisation(models.Model):
     @cached_property
     def classifications(self):
         classes = (
-            OrganisationClassification.objects.prefetch_related("vocabulary")
-            .prefetch_related("vocabulary__vocabulary")
+            OrganisationClassification.objects.select_related(
+                "vocabulary__vocabulary", "vocabulary__parent__parent"
+            )
             .filter(org_id=self.org_id)
             .all()
         )
@@ -353,11 +355,15 @@ class Organisation(models.Model):
                 link.title = f"{link.title} ({link.entity})"
             yield link
 
-    def wikidata_links(self):
+    @cached_property
+    def wikidata_items(self):
         from other_data.models.wikidata import WikiDataItem
 
+        return list(WikiDataItem.objects.filter(org_id__in=self.orgIDs).order_by("pk"))
+
+    def wikidata_links(self):
         links_seen = set()
-        for item in WikiDataItem.objects.filter(org_id__in=self.orgIDs).all():
+        for item in self.wikidata_items:
             item_links = []
             if item.twitter:
                 handle = item.twitter.lstrip("@")
@@ -444,13 +450,9 @@ class Organisation(models.Model):
 
     @cached_property
     def wikidata_id(self):
-        from other_data.models.wikidata import WikiDataItem
-
-        item = WikiDataItem.objects.filter(
-            org_id__in=self.orgIDs, wikidata_id__isnull=False
-        ).first()
-        if item and item.wikidata_id:
-            return item.wikidata_id
+        for item in self.wikidata_items:
+            if item.wikidata_id:
+                return item.wikidata_id
         return None
 
     @cached_property
@@ -26,6 +26,39 @@ class RelatedOrganisation:
         orgs = Organisation.objects.filter(linked_orgs__contains=[org_id])
         return cls(orgs)
 
+    @classmethod
+    def prefetch(cls, related_orgs):
+        """
+        Load the locations and links for a list of RelatedOrganisation objects
+        using one query for each, instead of separate queries for each group
+        """
+        orgid_groups = {}
+        for related_org in related_orgs:
+            related_org.locations = []
+            related_org.org_links = []
+            for orgid in related_org.orgIDs:
+                orgid_groups.setdefault(orgid, []).append(related_org)
+        if not orgid_groups:
+            return related_orgs
+
+        for location in OrganisationLocation.objects.filter(
+            org_id__in=orgid_groups.keys()
+        ):
+            for related_org in orgid_groups.get(location.org_id, []):
+                related_org.locations.append(location)
+
+        for link in OrganisationLink.objects.filter(
+            Q(org_id_a__in=orgid_groups.keys()) | Q(org_id_b__in=orgid_groups.keys())
+        ):
+            groups = {
+                id(related_org): related_org
+                for orgid in (link.org_id_a, link.org_id_b)
+                for related_org in orgid_groups.get(orgid, [])
+            }
+            for related_org in groups.values():
+                related_org.org_links.append(link)
+        return related_orgs
+
     @cached_property
     def orgIDs(self):
         return list(set(self.get_all("orgIDs")))
@@ -63,38 +96,41 @@ class RelatedOrganisation:
     @cached_property
     def parents(self):
         parents = [parent_id for parent_id in self.get_all("parent") if parent_id]
-        return Organisation.objects.filter(org_id__in=parents).exclude(
-            orgIDs__overlap=self.orgIDs
+        return list(
+            Organisation.objects.filter(org_id__in=parents)
+            .exclude(orgIDs__overlap=self.orgIDs)
+            .select_related("source", "organisationTypePrimary")
         )
 
     @cached_property
     def children(self):
-        return Organisation.objects.filter(parent__in=self.orgIDs)
+        return list(
+            Organisation.objects.filter(parent__in=self.orgIDs).select_related(
+                "source", "organisationTypePrimary"
+            )
+        )
 
     @cached_property
     def source_ids(self):
         sources = list(self.get_all("source_id"))
-        sources.extend(
-            list(
-                OrganisationLink.objects.filter(
-                    Q(org_id_a__in=self.orgIDs) | Q(org_id_b__in=self.orgIDs)
-                ).values_list("source_id", flat=True)
-            )
-        )
+        sources.extend([link.source_id for link in self.org_links])
         return list(set(sources))
 
     @cached_property
     def locations(self):
         return OrganisationLocation.objects.filter(org_id__in=self.orgIDs)
 
-    def hq_region(self, areatype):
+    @cached_property
+    def hq_location(self):
         for location in self.locations:
             if (
                 location.locationType
-                != OrganisationLocation.LocationTypes.REGISTERED_OFFICE
+                == OrganisationLocation.LocationTypes.REGISTERED_OFFICE
             ):
-                continue
-            return getattr(location, f"geo_{areatype}", None)
+                return location
+
+    def hq_region(self, areatype):
+        return getattr(self.hq_location, f"geo_{areatype}", None)
 
     @cached_property
     def geocodes(self):
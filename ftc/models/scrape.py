@@ -29,3 +29,25 @@ class Scrape(models.Model):
         return "{} [{}] {:%Y-%m-%d %H:%M}".format(
             self.spider, self.status, self.start_time
         )
+
+    def get_log(self):
+        """
+        Return the full log, made up of any log stored on the scrape itself
+        and the chunks written while the scrape was running
+        """
+        return (self.log or "") + "".join(
+            self.log_chunks.order_by("id").values_list("log", flat=True)
+        )
+
+
+class ScrapeLog(models.Model):
+    scrape = models.ForeignKey(
+        Scrape,
+        on_delete=models.CASCADE,
+        related_name="log_chunks",
+    )
+    log = models.TextField(editable=False)
+    created = models.DateTimeField(auto_now_add=True, editable=False)
+
+    def __str__(self):
+        return "{} [{}]".format(self.scrape, self.id)
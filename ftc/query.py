@@ -1,8 +1,5 @@
-import copy
-import json
-import os
+from collections import defaultdict
 
-from django.conf import settings
 from django.core.paginator import Paginator
 from django.db.models import Count, F, Func, Q
 from django.shortcuts import Http404
@@ -10,6 +7,13 @@ from elasticsearch_dsl import A
 
 from ftc.documents import DSEPaginator, OrganisationGroup
 from ftc.models import Organisation, OrganisationLocation, RelatedOrganisation
+from other_data.models import (
+    CQCLocation,
+    CQCProvider,
+    Grant,
+    GrantSummary,
+    WikiDataItem,
+)
 from reconcile.query import RECONCILE_QUERY
 
 
@@ -32,6 +36,200 @@ def get_linked_organisations(org_id):
     return RelatedOrganisation(related_orgs)
 
 
+def get_organisations(org_ids, canonical=False):
+    """
+    Find the organisation for each of a list of organisation identifiers,
+    using the `orgIDs` index to look them all up at once. Returns a dict of
+    the identifiers to the organisation found, or None.
+
+    If `canonical` is true then the main record from the group of linked
+    organisations is returned instead, using one more query.
+    """
+    org_ids = list(dict.fromkeys(org_ids))
+    orgs = list(
+        Organisation.objects.filter(
+            Q(orgIDs__overlap=org_ids) | Q(org_id__in=org_ids)
+        ).select_related("organisationTypePrimary", "source")
+    )
+    candidates = defaultdict(list)
+    for org in orgs:
+        for org_id in set(org.orgIDs or []) | {org.org_id}:
+            candidates[org_id].append(org)
+
+    results = {}
+    for org_id in org_ids:
+        matches = candidates.get(org_id)
+        if not matches:
+            results[org_id] = None
+            continue
+        exact = [org for org in matches if org.org_id == org_id]
+        results[org_id] = exact[0] if exact else RelatedOrganisation(matches).records[0]
+
+    if canonical:
+        found = [org.org_id for org in results.values() if org]
+        groups = defaultdict(list)
+        if found:
+            for org in Organisation.objects.filter(
+                linked_orgs__overlap=found
+            ).select_related("organisationTypePrimary", "source"):
+                for linked_org_id in org.linked_orgs:
+                    groups[linked_org_id].append(org)
+        for org_id, org in results.items():
+            if org and groups.get(org.org_id):
+                results[org_id] = RelatedOrganisation(groups[org.org_id]).records[0]
+
+    # load the locations for all the organisations found in one query
+    found = {id(org): org for org in results.values() if org}
+    locations = defaultdict(list)
+    if found:
+        for location in OrganisationLocation.objects.filter(
+            org_id__in={org.org_id for org in found.values()}
+        ):
+            locations[location.org_id].append(location)
+    for org in found.values():
+        org.locations = locations[org.org_id]
+
+    return results
+
+
+GRANT_DIRECTIONS = {
+    "received": "recipientOrganization_id",
+    "given": "fundingOrganization_id",
+}
+GRANT_SUMMARY_TOP_FIELDS = {
+    "received": "received_top_funders",
+    "given": "given_top_recipients",
+}
+GRANT_SOURCE_FIELDS = ("spider", "publisher_prefix", "publisher_name", "license")
+GRANTS_PREVIEW = 10
+GRANTS_PER_PAGE = 50
+
+
+def get_grants(orgids, direction):
+    """
+    Grants received by or given by any of a list of organisation identifiers,
+    most recent first
+    """
+    field = GRANT_DIRECTIONS[direction]
+    return Grant.objects.filter(**{f"{field}__in": orgids}).order_by("-awardDate", "pk")
+
+
+def get_grants_summary(orgids):
+    """
+    Combine the precomputed grant summaries for a list of organisation
+    identifiers, for the grants received and the grants given
+    """
+    summaries = list(GrantSummary.objects.filter(org_id__in=orgids).order_by("org_id"))
+    result = {}
+    for direction in GRANT_DIRECTIONS:
+        summary = {"grants": 0, "earliest": None, "latest": None, "orgids": []}
+        by_year = defaultdict(
+            lambda: defaultdict(lambda: {"grants": 0, "amountAwarded": 0})
+        )
+        sources = defaultdict(int)
+        top = {}
+        for row in summaries:
+            grants = getattr(row, f"{direction}_grants")
+            if not grants:
+                continue
+            summary["grants"] += grants
+            summary["orgids"].append(row.org_id)
+            for field, func in (("earliest", min), ("latest", max)):
+                value = getattr(row, f"{direction}_{field}")
+                if value:
+                    summary[field] = func(summary[field] or value, value)
+            for year, currencies in getattr(row, f"{direction}_by_year").items():
+                for currency, values in currencies.items():
+                    by_year[int(year)][currency]["grants"] += values["grants"]
+                    by_year[int(year)][currency]["amountAwarded"] += values[
+                        "amountAwarded"
+                    ]
+            for source in getattr(row, f"{direction}_sources"):
+                key = tuple(source[f] for f in GRANT_SOURCE_FIELDS)
+                sources[key] += source["grants"]
+            for counterparty in getattr(row, GRANT_SUMMARY_TOP_FIELDS[direction]):
+                if counterparty["org_id"] in top:
+                    top[counterparty["org_id"]]["grants"] += counterparty["grants"]
+                else:
+                    top[counterparty["org_id"]] = dict(counterparty)
+
+        summary["by_year"] = {
+            year: {
+                currency: by_year[year][currency] for currency in sorted(by_year[year])
+            }
+            for year in sorted(by_year, reverse=True)
+        }
+        summary["sources"] = [
+            dict(zip(GRANT_SOURCE_FIELDS, key), grants=grants)
+            for key, grants in sorted(sources.items())
+        ]
+        summary["top"] = sorted(
+            top.values(), key=lambda c: (-c["grants"], c["org_id"])
+        )[:GRANTS_PREVIEW]
+        result[direction] = summary
+    return result
+
+
+def get_organisation_page(org_id):
+    """
+    Load an organisation and all the related data shown on its page.
+
+    Each type of related data is fetched in a single query for the whole group
+    of linked organisations, so the number of queries does not depend on the
+    number of linked records, locations or grants.
+    """
+    related_orgs = list(
+        Organisation.objects.filter(linked_orgs__contains=[org_id]).select_related(
+            "source", "organisationTypePrimary"
+        )
+    )
+    org = next((o for o in related_orgs if o.org_id == org_id), None)
+    if org is None:
+        org = get_organisation(org_id)
+    if not related_orgs:
+        related_orgs = [org]
+    related_orgs = RelatedOrganisation(related_orgs)
+    RelatedOrganisation.prefetch([related_orgs])
+
+    wikidata = list(
+        WikiDataItem.objects.filter(org_id__in=related_orgs.orgIDs).order_by("pk")
+    )
+    records = {id(record): record for record in related_orgs.records + [org]}
+    for record in records.values():
+        record.locations = [
+            location
+            for location in related_orgs.locations
+            if location.org_id == record.org_id
+        ]
+        record.wikidata_items = [
+            item for item in wikidata if item.org_id in record.orgIDs
+        ]
+
+    cqc = list(CQCProvider.objects.filter(org_id__in=related_orgs.orgIDs))
+    cqc_locations = defaultdict(list)
+    if cqc:
+        for location in CQCLocation.objects.filter(
+            provider_id__in=[provider.id for provider in cqc]
+        ):
+            cqc_locations[(location.provider_id, location.scrape_id)].append(location)
+    for provider in cqc:
+        provider.locations = cqc_locations[(provider.id, provider.scrape_id)]
+
+    grants_summary = get_grants_summary(related_orgs.orgIDs)
+
+    return dict(
+        org=org,
+        related_orgs=related_orgs,
+        cqc=cqc,
+        grants_received=list(
+            get_grants(related_orgs.orgIDs, "received")[:GRANTS_PREVIEW]
+        ),
+        grants_received_summary=grants_summary["received"],
+        grants_given_summary=grants_summary["given"],
+        wikidata=wikidata,
+    )
+
+
 def random_query(active=False, orgtype=None, aggregate=False, source=None):
     query = {
         "query": {
@@ -88,13 +286,6 @@ class OrganisationSearch:
         self.aggregation = {}
 
         self.set_criteria(**kwargs)
-        if settings.DEBUG:
-            with open(
-                os.path.join(os.path.dirname(__file__), "..", "reconcile", "query.json")
-            ) as a:
-                self.es_query = json.load(a)
-        else:
-            self.es_query = copy.deepcopy(RECONCILE_QUERY)
 
     def set_criteria(
         self,
@@ -162,36 +353,6 @@ class OrganisationSearch:
         Fetch the reconciliation query and insert the query term
         """
 
-        params = {}
-
-        sort_by = False
-        if self.term:
-            for param in self.es_query["params"]:
-                params[param] = self.term
-        else:
-            self.es_query["inline"]["query"]["function_score"]["query"]["bool"][
-                "must"
-            ] = {"match_all": {}}
-            # first two functions reference the {{name}} parameter
-            self.es_query["inline"]["query"]["function_score"]["functions"] = (
-                self.es_query["inline"]["query"]["function_score"]["functions"][2:]
-            )
-            sort_by = "sortname"
-
-        # add postcode
-        if self.postcode:
-            self.es_query["inline"]["query"]["function_score"]["functions"].append(
-                {"filter": {"match": {"postalCode": "{{postcode}}"}}, "weight": 2}
-            )
-            params["postcode"] = self.postcode
-
-        # add domain searching
-        if self.domain:
-            self.es_query["inline"]["query"]["function_score"]["functions"].append(
-                {"filter": {"term": {"domain": "{{domain}}"}}, "weight": 200000}
-            )
-            params["domain"] = self.domain
-
         filter_ = []
         # check for base organisation type
         if self.base_orgtype:
@@ -215,19 +376,17 @@ class OrganisationSearch:
         elif self.active is False:
             filter_.append({"match": {"active": False}})
 
-        if filter_:
-            self.es_query["inline"]["query"]["function_score"]["query"]["bool"][
-                "filter"
-            ] = filter_
-
+        query, params = RECONCILE_QUERY.build(
+            self.term, postcode=self.postcode, domain=self.domain, filter_=filter_
+        )
         q = (
             OrganisationGroup.search()
-            .update_from_dict(self.es_query["inline"])
+            .update_from_dict(query)
             .params(track_total_hits=True)
             .index(OrganisationGroup._default_index())
         )
-        if sort_by:
-            q = q.sort(sort_by)
+        if not self.term:
+            q = q.sort("sortname")
 
         if with_aggregation:
             by_source = A("terms", field="source", size=150)
@@ -2,8 +2,10 @@ import datetime
 from unittest.mock import patch
 
 import django.test
+from django.db import connections
 from django.utils import timezone
 
+from findthatcharity.jinja2 import clear_local_cache
 from ftc.models import (
     Organisation,
     OrganisationClassification,
@@ -12,12 +14,23 @@ from ftc.models import (
     Source,
     Vocabulary,
 )
+from other_data.management.commands.import_360giving import GRANT_SUMMARY_SQL
+
+
+def update_grant_summary():
+    """Rebuild the grant summary table, as the grant importers do"""
+    with connections["data"].cursor() as cursor:
+        for sql in GRANT_SUMMARY_SQL.values():
+            cursor.execute(sql)
 
 
 class TestCase(django.test.TestCase):
     databases = {"data", "admin"}
 
     def setUp(self):
+        # lookups cached in memory by an earlier test
+        clear_local_cache()
+
         # setup elasticsearch patcher
         self.es_patcher = patch("ftc.documents.get_connection")
         self.addCleanup(self.es_patcher.stop)
@@ -1,6 +1,7 @@
 from unittest import TestCase
 
-from ftc.documents import OrganisationGroup
+import ftc.tests
+from ftc.documents import OrganisationGroup, render_template
 from ftc.models import Organisation
 
 # from django.test import TestCase
@@ -26,3 +27,39 @@ class TestDocuments(TestCase):
             d = OrganisationGroup()
             with self.subTest(n1=n1, n2=n2):
                 assert d.prepare_sortname(o) == n2
+
+    def test_render_template(self):
+        template = {
+            "query": {
+                "bool": {
+                    "must": [
+                        {"match_phrase": {"name": "{{name}}"}},
+                        {"simple_query_string": {"query": "{{ name }} trust"}},
+                    ],
+                    "filter": [{"term": {"domain": "{{domain}}"}}],
+                }
+            },
+            "size": 10,
+        }
+        result = render_template(template, {"name": 'Test "Charity"'})
+        must = result["query"]["bool"]["must"]
+        assert must[0]["match_phrase"]["name"] == 'Test "Charity"'
+        assert must[1]["simple_query_string"]["query"] == 'Test "Charity" trust'
+        assert result["query"]["bool"]["filter"][0]["term"]["domain"] == ""
+        assert result["size"] == 10
+        assert (
+            template["query"]["bool"]["must"][0]["match_phrase"]["name"] == "{{name}}"
+        )
+
+
+class TestIndexing(ftc.tests.TestCase):
+    def test_get_indexing_queryset(self):
+        d = OrganisationGroup()
+        # one query for the organisations, then one each for the locations
+        # and links of the whole chunk of groups
+        with self.assertNumQueries(3, using="data"):
+            docs = [
+                d.prepare(group) for group in d.get_indexing_queryset(progress=False)
+            ]
+        self.assertEqual(len(docs), 2)
+        self.assertIn("GB-CHC-1234", [doc["org_id"] for doc in docs])
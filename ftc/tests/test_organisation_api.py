@@ -2,6 +2,9 @@ import json
 import logging
 import os
 
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
 from ftc.tests import TestCase
 
 logger = logging.getLogger(__name__)
@@ -106,3 +109,107 @@ class TestOrganisationAPI(TestCase):
         self.assertEqual(len(data["result"]), 4)
         ids = sorted([x["id"] for x in data["result"]])
         self.assertEqual(ids, ["GB-CHC-1234", "GB-CHC-5", "GB-CHC-6", "GB-EDU-123/ABC"])
+
+    def test_filter_organisations_cursor(self):
+        response = self.client.get("/api/v1/organisations?active=true&limit=3")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["count"], 4)
+        self.assertIsNone(data["previous"])
+        first_page = [x["id"] for x in data["result"]]
+        self.assertEqual(len(first_page), 3)
+
+        with CaptureQueriesContext(connections["data"]) as queries:
+            response = self.client.get(data["next"])
+        self.assertEqual(response.status_code, 200)
+        # the cursor is compared as a row, which can use the (name, org_id) index
+        self.assertTrue(
+            any('ROW("ftc_organisation"."name"' in q["sql"] for q in queries)
+        )
+        data = response.json()
+        self.assertIsNone(data["count"])
+        self.assertIsNone(data["next"])
+        self.assertEqual(
+            sorted(first_page + [x["id"] for x in data["result"]]),
+            ["GB-CHC-1234", "GB-CHC-5", "GB-CHC-6", "GB-EDU-123/ABC"],
+        )
+
+        response = self.client.get(data["previous"])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([x["id"] for x in data["result"]], first_page)
+        self.assertIsNone(data["previous"])
+
+    def test_filter_organisations_invalid_cursor(self):
+        response = self.client.get("/api/v1/organisations?cursor=blah")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Invalid cursor")
+
+    def test_get_organisations_bulk(self):
+        response = self.client.post(
+            "/api/v1/organisations/_bulk",
+            {
+                "org_ids": ["GB-CHC-1234", "GB-EDU-123/ABC", "GB-CHC-BLAHBLAH"],
+                "charity_numbers": ["6"],
+                "company_numbers": ["123456"],
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["count"], 3)
+        self.assertEqual(data["params"]["queries"], 5)
+        self.assertEqual(
+            [(r["query"], r["found"]) for r in data["result"]],
+            [
+                ("GB-CHC-1234", True),
+                ("GB-EDU-123/ABC", True),
+                ("GB-CHC-BLAHBLAH", False),
+                ("6", True),
+                ("123456", False),
+            ],
+        )
+        self.assertEqual(data["result"][0]["result"]["id"], "GB-CHC-1234")
+        self.assertEqual(
+            data["result"][0]["result"]["organisationTypePrimary"]["title"],
+            "Registered Charity",
+        )
+        self.assertEqual(data["result"][3]["result"]["id"], "GB-CHC-6")
+        self.assertIsNone(data["result"][2]["result"])
+
+    def test_get_organisations_bulk_canonical(self):
+        response = self.client.post(
+            "/api/v1/organisations/_bulk",
+            {"org_ids": ["GB-CHC-6", "GB-CHC-1234"], "canonical": True},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [r["result"]["id"] for r in data["result"]], ["GB-CHC-5", "GB-CHC-1234"]
+        )
+
+    def test_get_organisations_bulk_ndjson(self):
+        response = self.client.post(
+            "/api/v1/organisations/_bulk",
+            {"org_ids": ["GB-CHC-1234", "GB-CHC-BLAHBLAH"]},
+            content_type="application/json",
+            headers={"Accept": "application/x-ndjson"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["result"]["id"], "GB-CHC-1234")
+        self.assertFalse(lines[1]["found"])
+
+    def test_get_organisations_bulk_limit(self):
+        response = self.client.post(
+            "/api/v1/organisations/_bulk",
+            {"org_ids": ["GB-CHC-{}".format(i) for i in range(5001)]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
@@ -1,7 +1,17 @@
+import datetime
+import json
+
 from django.shortcuts import Http404
 
-from ftc.query import OrganisationSearch, get_linked_organisations, get_organisation
-from ftc.tests import TestCase
+from ftc.query import (
+    OrganisationSearch,
+    get_grants_summary,
+    get_linked_organisations,
+    get_organisation,
+)
+from ftc.tests import TestCase, update_grant_summary
+from other_data.models import Grant
+from reconcile.query import RECONCILE_QUERY
 
 
 class QueryTests(TestCase):
@@ -38,3 +48,87 @@ class QueryTests(TestCase):
     def test_organisation_search_set_criteria(self):
         s = OrganisationSearch()
         self.assertIsNone(s.term)
+
+    def test_reconcile_query_build(self):
+        before = json.dumps(RECONCILE_QUERY.__dict__)
+
+        query, params = RECONCILE_QUERY.build(
+            "Test",
+            postcode="SW1A 1AA",
+            domain="example.com",
+            filter_=[{"terms": {"source": ["ccew"]}}],
+        )
+        function_score = query["query"]["function_score"]
+        self.assertEqual(params["name"], "Test")
+        self.assertEqual(params["postcode"], "SW1A 1AA")
+        self.assertEqual(params["domain"], "example.com")
+        self.assertEqual(
+            len(function_score["functions"]), len(RECONCILE_QUERY.functions) + 2
+        )
+        self.assertEqual(
+            function_score["query"]["bool"]["filter"],
+            [{"terms": {"source": ["ccew"]}}],
+        )
+        self.assertEqual(query["_source"], {"excludes": ["complete_names"]})
+
+        query, params = RECONCILE_QUERY.build()
+        function_score = query["query"]["function_score"]
+        self.assertEqual(params, {})
+        self.assertEqual(function_score["query"]["bool"], {"must": {"match_all": {}}})
+        self.assertNotIn("{{", json.dumps(function_score["functions"]))
+
+        # the base query is not changed by the overlays
+        self.assertEqual(json.dumps(RECONCILE_QUERY.__dict__), before)
+
+    def test_get_grants_summary(self):
+        for award_date, currency, amount in (
+            (datetime.date(2020, 1, 1), "GBP", 100),
+            (datetime.date(2020, 6, 1), "GBP", 200),
+            (datetime.date(2020, 6, 1), "EUR", 50),
+            (datetime.date(2019, 1, 1), "GBP", 300),
+        ):
+            Grant.objects.create(
+                grant_id="360G-test-{}-{}".format(award_date, currency),
+                title="Test grant",
+                description="Test grant",
+                currency=currency,
+                amountAwarded=amount,
+                awardDate=award_date,
+                recipientOrganization_id="GB-CHC-1234",
+                fundingOrganization_id="GB-GOR-1",
+                fundingOrganization_name="Funder",
+                publisher_prefix="360G-test",
+                publisher_name="Test publisher",
+                license="CC-BY",
+                scrape=self.scrape,
+            )
+
+        update_grant_summary()
+
+        summary = get_grants_summary(["GB-CHC-1234", "GB-GOR-1"])
+        received = summary["received"]
+        self.assertEqual(received["grants"], 4)
+        self.assertEqual(received["earliest"], datetime.date(2019, 1, 1))
+        self.assertEqual(received["latest"], datetime.date(2020, 6, 1))
+        self.assertEqual(list(received["by_year"].keys()), [2020, 2019])
+        self.assertEqual(
+            received["by_year"][2020],
+            {
+                "EUR": {"grants": 1, "amountAwarded": 50},
+                "GBP": {"grants": 2, "amountAwarded": 300},
+            },
+        )
+        self.assertEqual(received["orgids"], ["GB-CHC-1234"])
+        self.assertEqual(received["sources"][0]["grants"], 4)
+        self.assertEqual(
+            received["top"], [{"org_id": "GB-GOR-1", "name": "Funder", "grants": 4}]
+        )
+
+        given = summary["given"]
+        self.assertEqual(given["grants"], 4)
+        self.assertEqual(given["orgids"], ["GB-GOR-1"])
+        self.assertEqual(given["top"][0]["org_id"], "GB-CHC-1234")
+
+        summary = get_grants_summary(["GB-CHC-1234"])
+        self.assertEqual(summary["given"]["grants"], 0)
+        self.assertEqual(summary["given"]["by_year"], {})
@@ -1,11 +1,32 @@
+import datetime
+import logging
 import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
 
 import requests_mock
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase
 
+import ftc.tests
 from ftc.management.commands._base_scraper import BaseScraper
+from ftc.management.commands._bulk_upsert import CopyStream, copy_value
+from ftc.management.commands._db_logger import ScrapeHandler
+from ftc.management.commands._pipeline import PIPELINES, PipelineRunner, Step
 from ftc.management.commands.import_casc import Command as CASCCommand
 from ftc.management.commands.import_ror import Command as RORCommand
+from ftc.management.commands.update_orgids import Command as UpdateOrgidsCommand
+from ftc.management.commands.update_orgids import UnionFind
+from ftc.models import (
+    Organisation,
+    OrganisationLink,
+    OrganisationLocation,
+    Scrape,
+    Source,
+)
+from geo.management.commands.update_geodata import UPDATE_GEODATA_SQL
 
 MOCK_FILES = (
     (
@@ -60,6 +81,296 @@ class BaseScraperTests(TestCase):
         for url, expected in org_ids:
             self.assertEqual(scraper.get_org_id({"id": url}), expected)
 
+    def test_parse_postcode(self):
+        BaseScraper.name = "test"
+        scraper = BaseScraper()
+        postcodes = [
+            ("SW1A 1AA", "SW1A 1AA"),
+            (" sw1a1aa ", "SW1A 1AA"),
+            ("SW1A-1AA", "SW1A 1AA"),
+            ("AB1 OCD", "AB1 0CD"),
+            ("", None),
+            ("  - ", None),
+            (None, None),
+            ("NOT A POSTCODE", "NOTAPOSTCODE"),
+        ]
+        for postcode, expected in postcodes:
+            self.assertEqual(scraper.parse_postcode(postcode), expected)
+
+    def test_split_address(self):
+        BaseScraper.name = "test"
+        scraper = BaseScraper()
+        self.assertEqual(
+            scraper.split_address("1 Main Street, Town, sw1a1aa"),
+            (["1 Main Street", "Town", None], "SW1A 1AA"),
+        )
+        self.assertEqual(
+            scraper.split_address("1 Main Street, Town, County, Country"),
+            (["1 Main Street", "Town", "County, Country"], None),
+        )
+
+    def test_clean_fields(self):
+        BaseScraper.name = "test"
+        scraper = BaseScraper()
+        scraper.date_fields = ["date"]
+        scraper.date_format = {"date": "%d/%m/%Y"}
+        scraper.bool_fields = ["bool"]
+        scraper.float_fields = ["float"]
+        records = [
+            (
+                {
+                    " date ": "01/02/2020",
+                    "bool": " Yes",
+                    "float": "1.5",
+                    "str": " a\x00 ",
+                },
+                {
+                    "date": datetime.datetime(2020, 2, 1),
+                    "bool": True,
+                    "float": 1.5,
+                    "str": "a",
+                },
+            ),
+            (
+                {" date ": "2020-02-01", "bool": "maybe", "float": "x", "str": ""},
+                {"date": None, "bool": "maybe", "float": None, "str": None},
+            ),
+            (
+                {"date": "", "bool": "n", "float": 2, "str": 3},
+                {"date": None, "bool": False, "float": 2.0, "str": 3},
+            ),
+        ]
+        for record, expected in records:
+            self.assertEqual(scraper.clean_fields(record), expected)
+        self.assertEqual(len(scraper.clean_plans), 2)
+        self.assertEqual(
+            scraper.clean_fields({"str": "n/a"}, blank_values=["", "n/a"]),
+            {"str": None},
+        )
+
+
+class ScrapeHandlerTests(TestCase):
+    databases = {"data", "admin"}
+
+    def test_buffered_log(self):
+        scrape = Scrape.objects.create(
+            spider="test", status=Scrape.ScrapeStatus.RUNNING, log=""
+        )
+        handler = ScrapeHandler(scrape)
+        handler.flush_size = 100
+        logger = logging.getLogger("ftc.test_buffered_log")
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+        logger.info("first message")
+        self.assertEqual(scrape.log_chunks.count(), 0)
+        for i in range(10):
+            logger.warning("warning %s", i)
+        self.assertGreater(scrape.log_chunks.count(), 0)
+
+        scrape.items = 1
+        handler.teardown()
+        logger.removeHandler(handler)
+
+        scrape.refresh_from_db()
+        self.assertEqual(scrape.errors, 10)
+        self.assertEqual(scrape.status, Scrape.ScrapeStatus.ERRORS)
+        log = scrape.get_log()
+        self.assertTrue(log.startswith("first message\n"))
+        self.assertTrue(log.endswith("warning 9\n"))
+
+    def test_teardown_expected_records(self):
+        for expected_records, status in (
+            (None, Scrape.ScrapeStatus.FAILED),
+            (0, Scrape.ScrapeStatus.SUCCESS),
+        ):
+            with self.subTest(expected_records=expected_records):
+                scrape = Scrape.objects.create(
+                    spider="test", status=Scrape.ScrapeStatus.RUNNING, log=""
+                )
+                handler = ScrapeHandler(scrape)
+                handler.teardown(expected_records=expected_records)
+                scrape.refresh_from_db()
+                self.assertEqual(scrape.status, status)
+
+
+class BulkCopyTests(TestCase):
+    def test_copy_value(self):
+        values = [
+            (None, "\\N"),
+            ("", ""),
+            (True, "t"),
+            (False, "f"),
+            (12, "12"),
+            (datetime.date(2020, 1, 2), "2020-01-02"),
+            ("tab\there", "tab\\there"),
+            ("line\nbreak", "line\\nbreak"),
+            ("back\\slash", "back\\\\slash"),
+            (["a", None, 'b"c'], '{"a",NULL,"b\\\\"c"}'),
+            ({"a": 1}, '{"a": 1}'),
+        ]
+        for value, expected in values:
+            self.assertEqual(copy_value(value), expected)
+
+    def test_copy_stream(self):
+        stream = CopyStream([(1, "a", None), (2, "b", "c")])
+        chunks = []
+        while chunk := stream.read(4):
+            chunks.append(chunk)
+        self.assertEqual("".join(chunks), "1\ta\t\\N\n2\tb\tc\n")
+        self.assertEqual(stream.row_count, 2)
+
+
+class UnionFindTests(SimpleTestCase):
+    def test_components(self):
+        components = UnionFind()
+        for a, b in [("A", "B"), ("C", "D"), ("B", "C"), ("E", "F"), ("A", "A")]:
+            components.union(a, b)
+        groups = {}
+        for item, component in components.components():
+            groups.setdefault(component, set()).add(item)
+        self.assertEqual(
+            sorted(groups.values(), key=len), [{"E", "F"}, {"A", "B", "C", "D"}]
+        )
+
+
+class UpdateOrgidsTests(ftc.tests.TestCase):
+    def add_link(self, org_id_a, org_id_b, source):
+        OrganisationLink.objects.create(
+            org_id_a=org_id_a,
+            org_id_b=org_id_b,
+            spider="test",
+            source=source,
+            scrape=self.scrape,
+        )
+
+    def test_update_orgids(self):
+        # links from a source that no organisations come from aren't verified
+        other_source = Source.objects.create(id="other", data={"title": "Other"})
+        self.add_link("GB-CHC-5", "GB-CHC-6", self.source)
+        self.add_link("GB-CHC-6", "GB-EDU-123/ABC", other_source)
+        self.add_link("GB-CHC-1234", "GB-CHC-999", self.source)
+
+        command = UpdateOrgidsCommand()
+        command.handle()
+
+        linked_orgs = {
+            org.org_id: (org.linked_orgs, org.linked_orgs_verified)
+            for org in Organisation.objects.all()
+        }
+        self.assertEqual(
+            linked_orgs,
+            {
+                "GB-CHC-1234": (
+                    ["GB-CHC-1234", "GB-CHC-999"],
+                    ["GB-CHC-1234", "GB-CHC-999"],
+                ),
+                "GB-CHC-5": (
+                    ["GB-CHC-5", "GB-CHC-6", "GB-EDU-123/ABC"],
+                    ["GB-CHC-5", "GB-CHC-6"],
+                ),
+                "GB-CHC-6": (
+                    ["GB-CHC-5", "GB-CHC-6", "GB-EDU-123/ABC"],
+                    ["GB-CHC-5", "GB-CHC-6"],
+                ),
+                "GB-EDU-123/ABC": (
+                    ["GB-CHC-5", "GB-CHC-6", "GB-EDU-123/ABC"],
+                    ["GB-EDU-123/ABC"],
+                ),
+            },
+        )
+
+        # only the organisations where a field changed are updated
+        self.assertEqual(
+            command.changed_orgids, {"GB-CHC-1234", "GB-CHC-6", "GB-EDU-123/ABC"}
+        )
+
+        # nothing changes when the links are the same
+        command = UpdateOrgidsCommand()
+        command.handle()
+        self.assertEqual(command.changed_orgids, set())
+
+
+class PipelineTests(SimpleTestCase):
+    def test_pipeline_dependencies(self):
+        for pipeline, steps in PIPELINES.items():
+            names = [step.name for step in steps]
+            self.assertEqual(len(names), len(set(names)), pipeline)
+
+            # every step must come after the steps it depends on
+            seen = set()
+            for step in steps:
+                for depends in step.depends:
+                    with self.subTest(pipeline=pipeline, step=step.name):
+                        self.assertIn(depends, seen)
+                seen.add(step.name)
+
+    def test_update_pipelines(self):
+        for pipeline in ("daily", "saturday", "sunday"):
+            steps = {step.name: step for step in PIPELINES[pipeline]}
+            self.assertIn("import_ccew", steps["update_geodata"].depends)
+            self.assertEqual(steps["es_index"].depends, ("update_geodata",))
+            # es_index updates linked_orgs, which the downloads include
+            self.assertEqual(steps["export_downloads"].depends, ("es_index",))
+        steps = {step.name: step for step in PIPELINES["daily"]}
+        self.assertEqual(steps["refresh_data_views"].depends, ("es_index",))
+
+
+class BrokenExecutor:
+    """
+    Stands in for the process pool, with the worker running `broken` dying
+    """
+
+    def __init__(self, broken, **kwargs):
+        self.broken = broken
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def submit(self, fn, command, args):
+        future = Future()
+        if command == self.broken:
+            future.set_exception(BrokenProcessPool("worker died"))
+        else:
+            future.set_result((1.0, None))
+        return future
+
+
+class PipelineRunnerTests(TestCase):
+    databases = {"data", "admin"}
+
+    def test_broken_pool(self):
+        steps = [Step("a"), Step("b"), Step("c", depends=("b",))]
+        with patch(
+            "ftc.management.commands._pipeline.ProcessPoolExecutor",
+            lambda **kwargs: BrokenExecutor("a", **kwargs),
+        ):
+            results = PipelineRunner(steps, workers=2).run()
+        self.assertEqual(results["a"]["status"], "failed")
+        self.assertEqual(results["b"]["status"], "success")
+        self.assertEqual(results["c"]["status"], "skipped")
+
+    def test_scrape_finished_on_error(self):
+        def run(runner, finished=()):
+            runner.set_status("import_ccni", "success", seconds=1.0, error=None)
+            runner.set_status("import_ccew", "running")
+            raise RuntimeError("pipeline stopped")
+
+        with patch.object(PipelineRunner, "run", run):
+            with self.assertRaises(RuntimeError):
+                call_command("run_pipeline", "charities")
+
+        scrape = Scrape.objects.get(spider="pipeline_charities")
+        self.assertEqual(scrape.status, Scrape.ScrapeStatus.ERRORS)
+        self.assertEqual(scrape.items, 1)
+        steps = scrape.result["steps"]
+        self.assertEqual(steps["import_ccew"]["status"], "failed")
+        self.assertEqual(steps["import_ukcat"]["status"], "skipped")
+        self.assertEqual(scrape.errors, len(steps) - 1)
+
 
 class ScraperTests(TestCase):
     databases = {"data", "admin"}
@@ -78,6 +389,67 @@ class CASCCommandTests(ScraperTests):
             scraper = CASCCommand()
             scraper.handle()
 
+    def test_casc_scraper_streamed(self):
+        with requests_mock.Mocker() as m:
+            self.mock_csv_downloads(m)
+            scraper = CASCCommand()
+            scraper.stream_files = True
+            scraper.handle()
+            self.assertEqual(scraper.files, {})
+            self.assertTrue(Organisation.objects.filter(spider="casc").exists())
+
+    def test_casc_scraper_unchanged(self):
+        with requests_mock.Mocker() as m:
+            self.mock_csv_downloads(m)
+            first = CASCCommand()
+            first.handle()
+            OrganisationLocation.objects.create(
+                org_id=Organisation.objects.filter(spider="casc").first().org_id,
+                name="SW1A 1AA",
+                geoCode="SW1A 1AA",
+                geoCodeType=OrganisationLocation.GeoCodeTypes.POSTCODE,
+                spider="casc",
+                source_id="casc",
+                scrape=first.scrape,
+            )
+            second = CASCCommand()
+            second.handle()
+            self.assertTrue(second.scrape.result["unchanged"])
+            self.assertEqual(second.scrape.status, Scrape.ScrapeStatus.SUCCESS)
+            self.assertEqual(second.scrape.items, first.scrape.items)
+
+            # the previous records now belong to the latest scrape
+            for model in (Organisation, OrganisationLocation):
+                self.assertEqual(
+                    set(
+                        model.objects.filter(spider="casc").values_list(
+                            "scrape_id", flat=True
+                        )
+                    ),
+                    {second.scrape.id},
+                )
+
+            # so update_geodata doesn't treat the locations as out of date
+            with connections["data"].cursor() as cursor:
+                cursor.execute(
+                    UPDATE_GEODATA_SQL[
+                        "delete any records from location that aren't based on current scrapes"
+                    ]
+                )
+            self.assertTrue(OrganisationLocation.objects.filter(spider="casc").exists())
+
+            # `--force` imports the files even if they haven't changed
+            third = CASCCommand()
+            third.handle(force=True)
+            self.assertEqual(
+                set(
+                    Organisation.objects.filter(spider="casc").values_list(
+                        "scrape_id", flat=True
+                    )
+                ),
+                {third.scrape.id},
+            )
+
 
 class RORCommandTests(ScraperTests):
     def test_ror_scraper(self):
@@ -1,6 +1,47 @@
+import csv
+import datetime
+import gzip
+import io
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.urls import reverse
 
-from ftc.tests import TestCase
+from findthatcharity.jinja2 import (
+    clear_local_cache,
+    get_data_version,
+    get_geoname,
+    get_orgtypes,
+)
+from ftc.export import stream_copy
+from ftc.models import Organisation, OrganisationType, Scrape
+from ftc.tests import TestCase, update_grant_summary
+from geo.models import GeoLookup
+from other_data.models import Grant
+
+
+def create_grants(scrape, recipient, funder, count):
+    for i in range(count):
+        Grant.objects.create(
+            grant_id="360G-test-{}-{}-{}".format(funder, recipient, i),
+            title="Test grant {}".format(i),
+            description="Test grant",
+            currency="GBP",
+            amountAwarded=1000,
+            awardDate=datetime.date(2020 - (i % 3), 1, 1),
+            recipientOrganization_id=recipient,
+            recipientOrganization_name="Recipient",
+            fundingOrganization_id=funder,
+            fundingOrganization_name="Funder",
+            publisher_prefix="360G-test",
+            publisher_name="Test publisher",
+            license="CC-BY",
+            scrape=scrape,
+        )
+    update_grant_summary()
 
 
 class OrganisationViewTests(TestCase):
@@ -38,6 +79,237 @@ class OrganisationViewTests(TestCase):
         )
         self.assertEqual(response.status_code, 404)
 
+    def test_organisation_query_count(self):
+        url = reverse("orgid_html", kwargs={"org_id": "GB-CHC-1234"})
+
+        def count_queries():
+            with CaptureQueriesContext(connections["data"]) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        # first request fills the lookup caches
+        count_queries()
+        base_queries = count_queries()
+
+        ot = OrganisationType.objects.get(title="Registered Charity")
+        linked_orgs = ["GB-CHC-1234"] + ["GB-COH-{}".format(i) for i in range(5)]
+        Organisation.objects.filter(org_id="GB-CHC-1234").update(
+            linked_orgs=linked_orgs
+        )
+        for org_id in linked_orgs[1:]:
+            Organisation.objects.create(
+                org_id=org_id,
+                orgIDs=[org_id],
+                linked_orgs=linked_orgs,
+                name="Linked organisation {}".format(org_id),
+                active=True,
+                organisationTypePrimary=ot,
+                parent="GB-CHC-1234",
+                source=self.source,
+                scrape=self.scrape,
+                organisationType=[ot.slug],
+            )
+        create_grants(self.scrape, "GB-CHC-1234", "GB-GOR-1", 5)
+        create_grants(self.scrape, "GB-GOR-1", "GB-CHC-1234", 5)
+
+        self.assertEqual(count_queries(), base_queries)
+
+    def test_organisation_grants(self):
+        create_grants(self.scrape, "GB-CHC-1234", "GB-GOR-1", 12)
+        create_grants(self.scrape, "GB-GOR-1", "GB-CHC-1234", 4)
+
+        response = self.client.get(
+            reverse("orgid_html", kwargs={"org_id": "GB-CHC-1234"})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Received 12 grants")
+        self.assertContains(response, "Showing most recent 10 grants")
+        self.assertContains(response, "made 4 grants")
+        self.assertContains(response, "fundingOrganization=GB-CHC-1234")
+
+        response = self.client.get(
+            reverse("orgid_grants_received", kwargs={"org_id": "GB-CHC-1234"})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Showing all 12 grants")
+        self.assertContains(response, "Test grant 11")
+
+        response = self.client.get(
+            reverse("orgid_grants_given", kwargs={"org_id": "GB-CHC-1234"})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Showing all 4 grants")
+
+    def test_orgid_type_csv(self):
+        response = self.client.get(
+            reverse("orgid_type_download", kwargs={"orgtype": "registered-charity"})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(
+            csv.DictReader(
+                io.StringIO(b"".join(response.streaming_content).decode("utf8"))
+            )
+        )
+        self.assertEqual(
+            [r["id"] for r in rows],
+            ["GB-CHC-1234", "GB-CHC-5", "GB-CHC-6", "GB-EDU-123/ABC"],
+        )
+        self.assertEqual(rows[0]["name"], "Test organisation")
+        self.assertEqual(rows[0]["active"], "True")
+        self.assertEqual(rows[0]["orgIDs"], "['GB-CHC-1234']")
+        self.assertEqual(rows[1]["orgIDs"], "['GB-CHC-5', 'GB-CHC-6']")
+        self.assertEqual(rows[0]["organisationTypePrimary"], "Registered Charity")
+        self.assertEqual(rows[0]["source"], "ts")
+        self.assertEqual(rows[0]["postalCode"], "")
+
+    def test_orgid_type_csv_lists(self):
+        # lists are formatted the same as str() of the python list
+        org_ids = ["GB-CHC-1234", "GB-X-O'Brien", 'GB-X-"A"', "GB-X-'A' \\ \"B\""]
+        Organisation.objects.filter(org_id="GB-CHC-1234").update(orgIDs=org_ids)
+        response = self.client.get(
+            reverse("orgid_type_download", kwargs={"orgtype": "registered-charity"})
+        )
+        rows = list(
+            csv.DictReader(
+                io.StringIO(b"".join(response.streaming_content).decode("utf8"))
+            )
+        )
+        self.assertEqual(rows[0]["orgIDs"], str(org_ids))
+
+    def test_stream_copy_chunks(self):
+        queryset = Organisation.objects.all()
+        rows = b"".join(stream_copy(queryset)).splitlines()
+        self.assertEqual(len(rows), 4)
+        # every range of org IDs is copied once, in order
+        self.assertEqual(
+            b"".join(stream_copy(queryset, chunk_rows=1)).splitlines(), rows
+        )
+        self.assertEqual(
+            b"".join(stream_copy(queryset, chunk_rows=3)).splitlines(), rows
+        )
+
+    def test_orgid_type_csv_empty_strings(self):
+        # empty strings are written unquoted, the same as nulls
+        Organisation.objects.filter(org_id="GB-CHC-1234").update(
+            charityNumber="", companyNumber=None, url=""
+        )
+        response = self.client.get(
+            reverse("orgid_type_download", kwargs={"orgtype": "registered-charity"})
+        )
+        lines = b"".join(response.streaming_content).decode("utf8").splitlines()
+        self.assertTrue(lines[1].startswith("GB-CHC-1234,Test organisation,,,,,"))
+        self.assertNotIn('""', lines[1])
+
+    def test_orgid_type_csv_snapshot(self):
+        url = reverse("orgid_type_download", kwargs={"orgtype": "registered-charity"})
+        live = b"".join(self.client.get(url).streaming_content)
+
+        with tempfile.TemporaryDirectory() as downloads_dir:
+            with override_settings(DOWNLOADS_DIR=downloads_dir):
+                call_command("export_downloads", "--no-parquet", stdout=io.StringIO())
+
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Encoding"], "gzip")
+                self.assertEqual(response["Accept-Ranges"], "bytes")
+                compressed = b"".join(response.streaming_content)
+                self.assertEqual(gzip.decompress(compressed), live)
+                etag = response["ETag"]
+
+                response = self.client.get(
+                    url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 304)
+
+                response = self.client.get(
+                    url, HTTP_ACCEPT_ENCODING="gzip", HTTP_RANGE="bytes=10-"
+                )
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(
+                    response["Content-Range"],
+                    "bytes 10-{}/{}".format(len(compressed) - 1, len(compressed)),
+                )
+                self.assertEqual(b"".join(response.streaming_content), compressed[10:])
+
+                # clients that don't accept gzip get the decompressed file
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn("Content-Encoding", response)
+                self.assertEqual(b"".join(response.streaming_content), live)
+
+                # filtered downloads are generated from the database
+                response = self.client.get(url, {"active": "true"})
+                self.assertNotIn("ETag", response)
+
+    @override_settings(DOWNLOADS_URL="https://storage.example.com/ftc/")
+    def test_orgid_type_csv_uploaded(self):
+        url = reverse("orgid_type_download", kwargs={"orgtype": "registered-charity"})
+        scrape = Scrape.objects.create(
+            spider="export_downloads",
+            status=Scrape.ScrapeStatus.SUCCESS,
+            log="",
+            result={"uploaded": ["downloads/type/registered-charity.csv.gz"]},
+        )
+        clear_local_cache()
+
+        response = self.client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertRedirects(
+            response,
+            "https://storage.example.com/ftc/downloads/type/registered-charity.csv.gz?v={}".format(
+                scrape.id
+            ),
+            fetch_redirect_response=False,
+        )
+
+        # clients that don't accept gzip get the download from the database
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        # files that weren't uploaded aren't redirected
+        response = self.client.get(
+            reverse("orgid_type_download", kwargs={"orgtype": "local-authority"}),
+            headers={"Accept-Encoding": "gzip"},
+        )
+        self.assertEqual(response.status_code, 200)
+
     def test_index(self):
         response = self.client.get("/")
         self.assertEqual(response.status_code, 200)
+
+
+class LookupCacheTests(TestCase):
+    def test_get_orgtypes_cached(self):
+        orgtypes = get_orgtypes()
+        self.assertIn("registered-charity", orgtypes)
+        # lookups read from the data database, and the shared cache is
+        # stored in the admin database
+        with (
+            self.assertNumQueries(0, using="data"),
+            self.assertNumQueries(0, using="admin"),
+        ):
+            self.assertIs(get_orgtypes(), orgtypes)
+
+    def test_get_orgtypes_new_scrape(self):
+        get_orgtypes()
+        OrganisationType.objects.create(title="New Organisation Type")
+        Scrape.objects.create(status=Scrape.ScrapeStatus.SUCCESS, spider="test", log="")
+        self.assertNotIn("new-organisation-type", get_orgtypes())
+
+        # the latest scrape is checked again once the local cache expires
+        clear_local_cache()
+        self.assertIn("new-organisation-type", get_orgtypes())
+
+    def test_get_geoname(self):
+        GeoLookup.objects.create(geoCode="E12000007", geoCodeType="rgn", name="London")
+        self.assertEqual(get_geoname("E12000007"), "London")
+        with (
+            self.assertNumQueries(0, using="data"),
+            self.assertNumQueries(0, using="admin"),
+        ):
+            self.assertEqual(get_geoname("E12000007"), "London")
+            self.assertEqual(get_geoname("X99999999"), "X99999999")
+
+        # the map of every geography is too big for the shared cache
+        self.assertIsNone(cache.get("geonames:{}".format(get_data_version())))
@@ -26,12 +26,24 @@ urlpatterns = [
         {"filetype": "csv", "orgtype": None},
         name="orgid_all_download",
     ),
+    path(
+        "all.parquet",
+        views.orgid_type,
+        {"filetype": "parquet", "orgtype": None},
+        name="orgid_all_parquet",
+    ),
     path(
         "type/<slug:orgtype>.csv",
         views.orgid_type,
         {"filetype": "csv"},
         name="orgid_type_download",
     ),
+    path(
+        "type/<slug:orgtype>.parquet",
+        views.orgid_type,
+        {"filetype": "parquet"},
+        name="orgid_type_parquet",
+    ),
     path("type/<slug:orgtype>.html", views.orgid_type),
     path("type/<slug:orgtype>", views.orgid_type, name="orgid_type"),
     path(
@@ -40,6 +52,12 @@ urlpatterns = [
         {"filetype": "csv"},
         name="orgid_source_download",
     ),
+    path(
+        "source/<str:source>.parquet",
+        views.orgid_type,
+        {"filetype": "parquet"},
+        name="orgid_source_parquet",
+    ),
     path("source/<str:source>.html", views.orgid_type),
     path("source/<str:source>", views.orgid_type, name="orgid_source"),
     path("scrapes/feed.rss", feeds.ScrapesFeedRSS()),
@@ -59,5 +77,17 @@ urlpatterns = [
         {"filetype": "html", "preview": True},
         name="orgid_html_preview",
     ),
+    path(
+        "<path:org_id>/grants/received",
+        views.get_org_grants,
+        {"direction": "received"},
+        name="orgid_grants_received",
+    ),
+    path(
+        "<path:org_id>/grants/given",
+        views.get_org_grants,
+        {"direction": "given"},
+        name="orgid_grants_given",
+    ),
     path("<path:org_id>", views.get_org_by_id, {"filetype": "html"}, name="orgid_html"),
 ]
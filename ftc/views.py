@@ -1,14 +1,23 @@
-import csv
-from collections import defaultdict
+import gzip
+import os
+import re
 
 import requests
 from charity_django.companies.models import Company
 from django.conf import settings
 from django.core.cache import cache
-from django.db.models import CharField, Value
-from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
-from django.shortcuts import get_object_or_404, render
+from django.core.paginator import Paginator
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.views.decorators.clickjacking import xframe_options_exempt
 from django_sql_dashboard.models import Dashboard
 from elasticsearch.exceptions import RequestError
@@ -17,15 +26,27 @@ from markdownify import markdownify as md_to_html
 from charity.models import Charity
 from findthatcharity.utils import can_view_postcode
 from ftc.documents import OrganisationGroup
+from ftc.export import snapshot_path, snapshot_url, stream_export
 from ftc.models import Organisation, OrganisationType, RelatedOrganisation, Source
 from ftc.query import (
+    GRANTS_PER_PAGE,
     OrganisationSearch,
+    get_grants,
     get_linked_organisations,
     get_organisation,
+    get_organisation_page,
     random_query,
 )
 from ftcprofile.controller import user_get_org_tags
-from other_data.models import CQCProvider, Grant, WikiDataItem
+
+# request parameters that filter a download, so it can't use a snapshot
+DOWNLOAD_FILTERS = ("orgtype", "source", "location", "q", "active")
+DOWNLOAD_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
 
 
 # site homepage
@@ -76,10 +97,10 @@ def about(request):
 
 @xframe_options_exempt
 def get_org_by_id(request, org_id, filetype="html", preview=False, as_charity=False):
-    org = get_organisation(org_id)
     charity = Charity.objects.filter(id=org_id).first()
 
     if filetype == "json":
+        org = get_organisation(org_id)
         return JsonResponse(
             RelatedOrganisation([org]).to_json(
                 as_charity,
@@ -88,45 +109,8 @@ def get_org_by_id(request, org_id, filetype="html", preview=False, as_charity=Fa
             )
         )
 
-    related_orgs = list(
-        Organisation.objects.filter(linked_orgs__contains=[org_id]).select_related(
-            "source"
-        )
-    )
-    if not related_orgs:
-        related_orgs = [org]
-    related_orgs = RelatedOrganisation(related_orgs)
-
-    additional_data = dict(
-        cqc=CQCProvider.objects.filter(org_id__in=related_orgs.orgIDs).all(),
-        grants_received=list(
-            Grant.objects.filter(recipientOrganization_id__in=related_orgs.orgIDs)
-            .order_by("-awardDate")
-            .all()
-        ),
-        grants_given=list(
-            Grant.objects.filter(fundingOrganization_id__in=related_orgs.orgIDs)
-            .order_by("-awardDate")
-            .all()
-        ),
-        wikidata=WikiDataItem.objects.filter(org_id__in=related_orgs.orgIDs).all(),
-    )
-
-    additional_data["grants_given_by_year"] = defaultdict(
-        lambda: defaultdict(
-            lambda: {
-                "grants": 0,
-                "amountAwarded": 0,
-            }
-        )
-    )
-    for g in additional_data["grants_given"]:
-        additional_data["grants_given_by_year"][g.awardDate.year][g.currency][
-            "grants"
-        ] += 1
-        additional_data["grants_given_by_year"][g.awardDate.year][g.currency][
-            "amountAwarded"
-        ] += g.amountAwarded
+    context = get_organisation_page(org_id)
+    org = context["org"]
 
     template = "charity.html.j2" if charity else "org.html.j2"
     if preview:
@@ -136,11 +120,9 @@ def get_org_by_id(request, org_id, filetype="html", preview=False, as_charity=Fa
         request,
         template,
         {
-            "org": org,
-            "related_orgs": related_orgs,
             "charity": charity,
             "tags": user_get_org_tags(request.user, org.org_id),
-            **additional_data,
+            **context,
         },
     )
 
@@ -157,6 +139,22 @@ def get_org_by_id(request, org_id, filetype="html", preview=False, as_charity=Fa
     return result
 
 
+def get_org_grants(request, org_id, direction="received"):
+    """Paginated list of the grants received or given by an organisation"""
+    org = get_organisation(org_id)
+    related_orgs = get_linked_organisations(org.org_id)
+    paginator = Paginator(get_grants(related_orgs.orgIDs, direction), GRANTS_PER_PAGE)
+    return render(
+        request,
+        "org_grants.html.j2",
+        {
+            "org": org,
+            "direction": direction,
+            "res": paginator.get_page(request.GET.get("page")),
+        },
+    )
+
+
 @xframe_options_exempt
 def get_orgid_canon(request, org_id):
     related_orgs = get_linked_organisations(org_id)
@@ -175,17 +173,6 @@ def get_random_org(request):
         return JsonResponse(r.__dict__["_d_"])
 
 
-# https://docs.djangoproject.com/en/3.1/howto/outputting-csv/#streaming-csv-files
-class Echo:
-    """An object that implements just the write method of the file-like
-    interface.
-    """
-
-    def write(self, value):
-        """Write the value by returning it, instead of storing in a buffer."""
-        return value
-
-
 def orgid_type(request, orgtype=None, source=None, filetype="html"):
     base_query = None
     download_url = request.build_absolute_uri() + "&filetype=csv"
@@ -212,49 +199,52 @@ def orgid_type(request, orgtype=None, source=None, filetype="html"):
     s.set_criteria_from_request(request)
     show_postcode = can_view_postcode(request)
 
-    if filetype == "csv":
-        postcodefield = "postalCode" if show_postcode else "dummyPostalCode"
-        columns = {
-            "org_id": "id",
-            "name": "name",
-            "charityNumber": "charityNumber",
-            "companyNumber": "companyNumber",
-            postcodefield: "postalCode",
-            "url": "url",
-            "latestIncome": "latestIncome",
-            "latestIncomeDate": "latestIncomeDate",
-            "dateRegistered": "dateRegistered",
-            "dateRemoved": "dateRemoved",
-            "active": "active",
-            "dateModified": "dateModified",
-            "orgIDs": "orgIDs",
-            "linked_orgs": "linked_orgs",
-            "linked_orgs_verified": "linked_orgs_verified",
-            "organisationType": "organisationType",
-            "organisationTypePrimary__title": "organisationTypePrimary",
-            "source": "source",
-        }
-
-        def stream():
-            buffer_ = Echo()
-            writer = csv.writer(buffer_)
-            yield writer.writerow(columns.values())
+    if filetype in DOWNLOAD_CONTENT_TYPES:
+        filename = "{}.{}".format(
+            base_query.slug if base_query else "findthatcharity-search-results",
+            filetype,
+        )
+
+        # use the file written by `export_downloads` unless the request
+        # has extra filters or needs postcodes
+        response = None
+        if not show_postcode and not any(
+            request.GET.get(f, "all") not in ("", "all") for f in DOWNLOAD_FILTERS
+        ):
+            if orgtype:
+                kind, name = "type", orgtype
+            elif source:
+                kind, name = "source", source
+            else:
+                kind, name = None, "all"
+            stored_filetype = "csv.gz" if filetype == "csv" else filetype
+
+            # files uploaded to storage are served from there, as long as
+            # the client can accept them gzipped
+            url = snapshot_url(kind, name, stored_filetype)
+            if url and (
+                stored_filetype != "csv.gz"
+                or "gzip" in request.headers.get("Accept-Encoding", "")
+            ):
+                response = redirect(url)
+            else:
+                response = snapshot_response(
+                    request,
+                    snapshot_path(kind, name, stored_filetype),
+                    filename,
+                    filetype,
+                )
+
+        if response is None:
+            if filetype != "csv":
+                raise Http404("Download not available")
             s.run_db()
-            res = (
-                s.query.annotate(dummyPostalCode=Value(None, output_field=CharField()))
-                .values_list(*columns.keys())
-                .order_by("org_id")
+            response = StreamingHttpResponse(
+                stream_export(s.query, show_postcode), content_type="text/csv"
+            )
+            response["Content-Disposition"] = 'attachment; filename="{}"'.format(
+                filename
             )
-            prev_id = None
-            for r in res:
-                if r[0] != prev_id:
-                    yield writer.writerow(r)
-                prev_id = r[0]
-
-        response = StreamingHttpResponse(stream(), content_type="text/csv")
-        response["Content-Disposition"] = 'attachment; filename="{}.csv"'.format(
-            base_query.slug if base_query else "findthatcharity-search-results"
-        )
         response["X-Robots-Tag"] = "noindex"
         return response
 
@@ -284,6 +274,98 @@ def orgid_type(request, orgtype=None, source=None, filetype="html"):
     )
 
 
+def snapshot_response(request, path, filename, filetype):
+    """
+    Serve a pre-generated download, with an ETag so that clients can check
+    whether it has changed and support for resuming with a `Range` header.
+
+    Gzipped files are sent as they are to clients that accept gzip, and
+    decompressed on the fly for any others. Returns `None` if the file
+    hasn't been generated.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    etag = '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size)
+    compressed = path.endswith(".gz")
+    if compressed and "gzip" not in request.headers.get("Accept-Encoding", ""):
+        etag = etag[:-1] + '-identity"'
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(stat.st_mtime)
+        )
+        if response is None:
+            response = StreamingHttpResponse(
+                read_gzip(path), content_type=DOWNLOAD_CONTENT_TYPES[filetype]
+            )
+    else:
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(stat.st_mtime)
+        )
+        if response is None:
+            response = ranged_file_response(request, path, stat.st_size, etag)
+            response["Content-Type"] = DOWNLOAD_CONTENT_TYPES[filetype]
+            response["Accept-Ranges"] = "bytes"
+            if compressed:
+                response["Content-Encoding"] = "gzip"
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    if compressed:
+        response["Vary"] = "Accept-Encoding"
+    if response.status_code in (200, 206):
+        response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
+    return response
+
+
+def read_gzip(path):
+    with gzip.open(path, "rb") as f:
+        while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+            yield chunk
+
+
+def ranged_file_response(request, path, size, etag):
+    """
+    Response containing a file, or the part of it asked for in a single
+    `Range` header. Multiple ranges aren't supported, so the whole file is
+    sent instead.
+    """
+    match = RANGE_RE.match(request.headers.get("Range", ""))
+    if_range = request.headers.get("If-Range")
+    if not match or (if_range and if_range != etag) or match.groups() == ("", ""):
+        return FileResponse(open(path, "rb"))
+
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        # a suffix range gives the number of bytes from the end of the file
+        start = max(size - int(end), 0)
+        end = size - 1
+    if start >= size or start > end:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = "bytes */{}".format(size)
+        return response
+
+    def read_range():
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    response = StreamingHttpResponse(read_range(), status=206)
+    response["Content-Range"] = "bytes {}-{}/{}".format(start, end, size)
+    response["Content-Length"] = end - start + 1
+    return response
+
+
 @xframe_options_exempt
 def company_detail(request, company_number, filetype="html"):
     company = get_object_or_404(Company, CompanyNumber=company_number)
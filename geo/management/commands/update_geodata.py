@@ -1,6 +1,29 @@
 from django.core import management
+from django.db import connections
 
 from ftc.management.commands._base_scraper import SQLRunner
+from ftc.management.commands._bulk_upsert import bulk_copy
+from ftc.management.commands._normalise import normalise_postcode
+
+POSTCODES_TABLE = "geo_postcode_updates"
+
+UPDATE_POSTCODES_SQL = {
+    "Create postcodes table": f"""
+        CREATE TEMPORARY TABLE "{POSTCODES_TABLE}" (
+            "postalCode" varchar(255) NOT NULL,
+            new_postcode varchar(255)
+        ) ON COMMIT DROP
+    """,
+    "Update misformatted postcodes": f"""
+        UPDATE ftc_organisation o
+        SET "postalCode" = p.new_postcode
+        FROM "{POSTCODES_TABLE}" p
+        WHERE o."postalCode" = p."postalCode"
+    """,
+    "Drop postcodes table": f"""
+        DROP TABLE "{POSTCODES_TABLE}"
+    """,
+}
 
 UPDATE_GEODATA_SQL = {
     "Remove personal data in Organisations": """
@@ -55,20 +78,6 @@ UPDATE_GEODATA_SQL = {
                     ON pd.org_id = ANY(o.linked_orgs)
 )
     """,
-    "Remove blank postcodes": """
-        update ftc_organisation
-        set "postalCode" = null
-        where trim("postalCode") = '';
-    """,
-    "Update misformatted postcodes": """
-        update ftc_organisation
-        set "postalCode" = concat_ws(
-            ' ',
-            trim(left(replace("postalCode", ' ', ''), length(replace("postalCode", ' ', ''))-3)),
-            right(replace("postalCode", ' ', ''), 3)
-        )
-        where "postalCode" is not null;
-    """,
     'convert "ENGLAND AND WALES" to "ENGLAND" and "WALES"': """
         insert into ftc_organisationlocation (
             "org_id",
@@ -258,6 +267,39 @@ class Command(SQLRunner):
             management.call_command("import_geolookups")
         except Exception:
             self.stdout.write(self.style.ERROR("Command import_geolookups failed"))
+        self.update_postcodes()
         # close the spider
         self.close_spider()
         self.logger.info("Spider finished")
+
+    def update_postcodes(self):
+        """
+        Standardise postcodes in the same way as the scrapers, only updating
+        the organisations where the postcode changes
+        """
+        updates = []
+        with connections["data"].chunked_cursor() as cursor:
+            cursor.execute(
+                'SELECT DISTINCT "postalCode" FROM ftc_organisation WHERE "postalCode" IS NOT NULL'
+            )
+            for (postcode,) in cursor:
+                new_postcode = normalise_postcode(postcode)
+                if new_postcode != postcode:
+                    updates.append((postcode, new_postcode))
+        self.logger.info("Found {:,.0f} misformatted postcodes".format(len(updates)))
+
+        for sql_name, sql in UPDATE_POSTCODES_SQL.items():
+            self.logger.info("Starting SQL: {}".format(sql_name))
+            self.cursor.execute(sql)
+            if sql_name == "Create postcodes table":
+                bulk_copy(
+                    self.cursor,
+                    POSTCODES_TABLE,
+                    ["postalCode", "new_postcode"],
+                    updates,
+                )
+            elif sql_name.startswith("Update"):
+                self.logger.info(
+                    "Updated {:,.0f} organisations".format(self.cursor.rowcount)
+                )
+            self.logger.info("Finished SQL: {}".format(sql_name))
@@ -40,6 +40,153 @@ from view_latest_grant g
 """.format(Grant.RecipientType.ORGANISATION, Grant.RecipientType.INDIVIDUAL)
 
 
+# number of funders or recipients kept for each organisation
+GRANT_SUMMARY_TOP = 10
+
+# (organisation field, counterparty id field, counterparty name field,
+# top counterparties column) for each direction
+GRANT_SUMMARY_DIRECTIONS = {
+    "received": (
+        "recipientOrganization_id",
+        "fundingOrganization_id",
+        "fundingOrganization_name",
+        "received_top_funders",
+    ),
+    "given": (
+        "fundingOrganization_id",
+        "recipientOrganization_id",
+        "recipientOrganization_name",
+        "given_top_recipients",
+    ),
+}
+
+GRANT_SUMMARY_SQL = {
+    "Delete grant summary": """
+    DELETE FROM other_data_grantsummary
+    """,
+    "Add grant summary organisations": """
+    INSERT INTO other_data_grantsummary (
+        org_id,
+        received_grants, received_by_year, received_sources, received_top_funders,
+        given_grants, given_by_year, given_sources, given_top_recipients
+    )
+    SELECT org_id, 0, '{}', '[]', '[]', 0, '{}', '[]', '[]'
+    FROM (
+        SELECT "recipientOrganization_id" AS org_id
+        FROM other_data_grant
+        WHERE "recipientOrganization_id" IS NOT NULL
+        UNION
+        SELECT "fundingOrganization_id" AS org_id
+        FROM other_data_grant
+    ) AS o
+    """,
+}
+for direction, (
+    org_field,
+    other_field,
+    other_name_field,
+    top_column,
+) in GRANT_SUMMARY_DIRECTIONS.items():
+    GRANT_SUMMARY_SQL[f"Add grants {direction} totals"] = f"""
+    UPDATE other_data_grantsummary s
+    SET {direction}_grants = a.grants,
+        {direction}_earliest = a.earliest,
+        {direction}_latest = a.latest
+    FROM (
+        SELECT "{org_field}" AS org_id,
+            count(*) AS grants,
+            min("awardDate") AS earliest,
+            max("awardDate") AS latest
+        FROM other_data_grant
+        WHERE "{org_field}" IS NOT NULL
+        GROUP BY 1
+    ) AS a
+    WHERE s.org_id = a.org_id
+    """
+    GRANT_SUMMARY_SQL[f"Add grants {direction} by year"] = f"""
+    UPDATE other_data_grantsummary s
+    SET {direction}_by_year = a.by_year
+    FROM (
+        SELECT org_id, jsonb_object_agg(year, currencies) AS by_year
+        FROM (
+            SELECT org_id, year, jsonb_object_agg(
+                currency,
+                jsonb_build_object('grants', grants, 'amountAwarded', amount_awarded)
+            ) AS currencies
+            FROM (
+                SELECT "{org_field}" AS org_id,
+                    extract(year FROM "awardDate")::int AS year,
+                    currency,
+                    count(*) AS grants,
+                    sum("amountAwarded") AS amount_awarded
+                FROM other_data_grant
+                WHERE "{org_field}" IS NOT NULL
+                GROUP BY 1, 2, 3
+            ) AS c
+            GROUP BY org_id, year
+        ) AS y
+        GROUP BY org_id
+    ) AS a
+    WHERE s.org_id = a.org_id
+    """
+    GRANT_SUMMARY_SQL[f"Add grants {direction} sources"] = f"""
+    UPDATE other_data_grantsummary s
+    SET {direction}_sources = a.sources
+    FROM (
+        SELECT org_id, jsonb_agg(jsonb_build_object(
+            'spider', spider,
+            'publisher_prefix', publisher_prefix,
+            'publisher_name', publisher_name,
+            'license', license,
+            'grants', grants
+        ) ORDER BY spider, publisher_prefix, grants DESC) AS sources
+        FROM (
+            SELECT "{org_field}" AS org_id,
+                spider,
+                publisher_prefix,
+                publisher_name,
+                license,
+                count(*) AS grants
+            FROM other_data_grant
+            WHERE "{org_field}" IS NOT NULL
+            GROUP BY 1, 2, 3, 4, 5
+        ) AS c
+        GROUP BY org_id
+    ) AS a
+    WHERE s.org_id = a.org_id
+    """
+    GRANT_SUMMARY_SQL[f"Add grants {direction} top counterparties"] = f"""
+    UPDATE other_data_grantsummary s
+    SET {top_column} = a.top
+    FROM (
+        SELECT org_id, jsonb_agg(jsonb_build_object(
+            'org_id', other_id,
+            'name', name,
+            'grants', grants
+        ) ORDER BY grants DESC, other_id) AS top
+        FROM (
+            SELECT org_id, other_id, name, grants,
+                row_number() OVER (
+                    PARTITION BY org_id ORDER BY grants DESC, other_id
+                ) AS rank
+            FROM (
+                SELECT "{org_field}" AS org_id,
+                    "{other_field}" AS other_id,
+                    max("{other_name_field}") AS name,
+                    count(*) AS grants
+                FROM other_data_grant
+                WHERE "{org_field}" IS NOT NULL
+                    AND "{other_field}" IS NOT NULL
+                GROUP BY 1, 2
+            ) AS c
+        ) AS r
+        WHERE rank <= {GRANT_SUMMARY_TOP}
+        GROUP BY org_id
+    ) AS a
+    WHERE s.org_id = a.org_id
+    """
+
+
 class Command(BaseScraper):
     name = "360g"
     float_fields = [
@@ -78,7 +225,7 @@ class Command(BaseScraper):
         )
 
     def run_scraper(self, *args, **options):
-        self.post_sql = {}
+        self.post_sql = GRANT_SUMMARY_SQL
 
         # setup database connection
         self.logger.info("Connecting to database")
@@ -45,6 +45,8 @@ class Command(HTMLScraper):
     start_urls = [
         "https://www.cqc.org.uk/about-us/transparency/using-cqc-data",
     ]
+    # the data files are linked from the start page
+    skip_unchanged_files = False
     date_fields = [
         "Location HSCA start date",
         "Location HSCA End Date",
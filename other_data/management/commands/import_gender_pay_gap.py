@@ -47,6 +47,8 @@ class Command(HTMLScraper):
     start_urls = [
         "https://gender-pay-gap.service.gov.uk/viewing/download",
     ]
+    # the data files are linked from the start page
+    skip_unchanged_files = False
     float_fields = [
         "DiffMeanHourlyPercent",
         "DiffMedianHourlyPercent",
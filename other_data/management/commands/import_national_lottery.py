@@ -6,6 +6,7 @@ from urllib.parse import urlencode
 from django.db.models.functions import ExtractMonth, ExtractYear
 
 from ftc.management.commands._base_scraper import CSVScraper
+from other_data.management.commands.import_360giving import GRANT_SUMMARY_SQL
 from other_data.models import Grant
 
 NL_API_URL = "https://nationallottery.dcms.gov.uk/api/v1/grants/csv-export/"
@@ -45,6 +46,10 @@ class Command(CSVScraper):
     }
     models_to_delete = [Grant]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.post_sql = GRANT_SUMMARY_SQL
+
     def _get_existing_grants(self):
         grants_to_match = Grant.objects.filter(
             fundingOrganization_type="Lottery Distributor"
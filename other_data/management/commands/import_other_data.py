@@ -1,19 +1,6 @@
-from django.core import management
-from django.core.management.base import BaseCommand
+from ftc.management.commands.run_pipeline import Command as PipelineCommand
 
 
-class Command(BaseCommand):
-    scrapers = [
-        "gender_pay_gap",
-        "360giving",
-        "national_lottery",
-        "cqc",
-        "wikidata",
-    ]
-
-    def handle(self, *args, **options):
-        for scraper in self.scrapers:
-            try:
-                management.call_command("import_{}".format(scraper))
-            except Exception:
-                self.stdout.write(self.style.ERROR("Command {} failed".format(scraper)))
+class Command(PipelineCommand):
+    help = "Run the imports for other data about organisations"
+    pipeline = "other_data"
@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+import ftc.models.orgid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("other_data", "0019_wikidataitem_bluesky_wikidataitem_instagram_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GrantSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "org_id",
+                    ftc.models.orgid.OrgidField(max_length=200, unique=True),
+                ),
+                ("received_grants", models.IntegerField(default=0)),
+                ("received_earliest", models.DateField(blank=True, null=True)),
+                ("received_latest", models.DateField(blank=True, null=True)),
+                ("received_by_year", models.JSONField(default=dict)),
+                ("received_sources", models.JSONField(default=list)),
+                ("received_top_funders", models.JSONField(default=list)),
+                ("given_grants", models.IntegerField(default=0)),
+                ("given_earliest", models.DateField(blank=True, null=True)),
+                ("given_latest", models.DateField(blank=True, null=True)),
+                ("given_by_year", models.JSONField(default=dict)),
+                ("given_sources", models.JSONField(default=list)),
+                ("given_top_recipients", models.JSONField(default=list)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("other_data", "0020_grantsummary"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="grantsummary",
+            name="org_id",
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -8,7 +8,7 @@ from .cqc import (
     CQCRatings,
 )
 from .gender_pay_gap import GenderPayGap
-from .threesixtygiving import Grant
+from .threesixtygiving import Grant, GrantSummary
 from .wikidata import WikiDataItem
 
 __all__ = (
@@ -21,5 +21,6 @@ __all__ = (
     CQCLocation,
     GenderPayGap,
     Grant,
+    GrantSummary,
     WikiDataItem,
 )
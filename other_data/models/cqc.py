@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils.functional import cached_property
 
 from ftc.models import OrgidField
 
@@ -151,9 +152,11 @@ class CQCProvider(models.Model):
         db_index=True,
     )
 
-    @property
+    @cached_property
     def locations(self):
-        return CQCLocation.objects.filter(provider_id=self.id, scrape=self.scrape)
+        return list(
+            CQCLocation.objects.filter(provider_id=self.id, scrape_id=self.scrape_id)
+        )
 
 
 class CQCBrand(models.Model):
@@ -146,3 +146,29 @@ class Grant(models.Model):
                 )
             return month_str
         return s
+
+
+class GrantSummary(models.Model):
+    """
+    Summary of the grants received and given by an organisation, rebuilt by
+    the grant importers after the grants have been loaded
+    """
+
+    # OrgidField is fixed at 200 characters, but the grant identifier fields
+    # are declared with up to 255
+    org_id = models.CharField(max_length=255, unique=True)
+    received_grants = models.IntegerField(default=0)
+    received_earliest = models.DateField(null=True, blank=True)
+    received_latest = models.DateField(null=True, blank=True)
+    received_by_year = models.JSONField(default=dict)
+    received_sources = models.JSONField(default=list)
+    received_top_funders = models.JSONField(default=list)
+    given_grants = models.IntegerField(default=0)
+    given_earliest = models.DateField(null=True, blank=True)
+    given_latest = models.DateField(null=True, blank=True)
+    given_by_year = models.JSONField(default=dict)
+    given_sources = models.JSONField(default=list)
+    given_top_recipients = models.JSONField(default=list)
+
+    def __str__(self):
+        return "<GrantSummary {}>".format(self.org_id)
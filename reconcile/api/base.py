@@ -9,7 +9,7 @@ from findthatcharity.jinja2 import get_orgtypes
 from ftc.documents import OrganisationGroup
 from ftc.models import Organisation, OrganisationType, Vocabulary
 from ftc.views import get_org_by_id
-from reconcile.query import do_extend_query, do_reconcile_query
+from reconcile.query import do_extend_query, do_reconcile_queries
 from reconcile.utils import convert_value
 
 from .schema import (
@@ -28,8 +28,8 @@ class Reconcile:
     preview = True
     base_type = "Organization"
 
-    def reconcile_query(self, *args, **kwargs):
-        return do_reconcile_query(*args, **kwargs)
+    def reconcile_queries(self, *args, **kwargs):
+        return do_reconcile_queries(*args, **kwargs)
 
     def _get_orgtypes_from_str(
         self, orgtype: Optional[Union[List[str], str]] = None
@@ -110,18 +110,20 @@ class Reconcile:
         orgtypes: List[OrganisationType] | List[str] | Literal["all"] = None,
     ) -> Dict[str, List[ReconciliationCandidate]]:
         orgtypes = self._get_orgtypes_from_str(orgtypes)
-        results = {}
-        for key, query in body.queries.items():
-            results[key] = self.reconcile_query(
-                query.query,
-                type_=self._get_orgtypes_from_str(query.type),
-                limit=query.limit,
-                properties=query.properties,
-                type_strict=query.type_strict,
-                result_key="result",
-                orgtypes=orgtypes,
-            )
-        return results
+        return self.reconcile_queries(
+            {
+                key: dict(
+                    query=query.query,
+                    type_=self._get_orgtypes_from_str(query.type),
+                    limit=query.limit,
+                    properties=query.properties,
+                    type_strict=query.type_strict,
+                )
+                for key, query in body.queries.items()
+            },
+            result_key="result",
+            orgtypes=orgtypes,
+        )
 
     def preview_view(
         self,
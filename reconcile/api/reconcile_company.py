@@ -6,7 +6,11 @@ from django.http import Http404
 from ninja import Form, Query, Router
 
 from ftc.documents import CompanyDocument
-from reconcile.companies import COMPANY_RECON_TYPE, do_extend_query, do_reconcile_query
+from reconcile.companies import (
+    COMPANY_RECON_TYPE,
+    do_extend_query,
+    do_reconcile_queries,
+)
 from reconcile.utils import convert_value
 
 from .base import Reconcile
@@ -35,8 +39,8 @@ class CompanyReconcile(Reconcile):
     preview = False
     base_type = "Company"
 
-    def reconcile_query(self, *args, **kwargs):
-        return do_reconcile_query(*args, **kwargs)
+    def reconcile_queries(self, *args, **kwargs):
+        return do_reconcile_queries(*args, **kwargs)
 
     def propose_properties(self, request, type_, limit=500):
         if type_ != self.base_type:
@@ -1,24 +1,23 @@
 from charity_django.utils.text import to_titlecase
 from django.utils.text import slugify
 
-from findthatcharity.utils import normalise_name
-from ftc.documents import CompanyDocument
+from findthatcharity.utils import normalise_name, normalise_names
+from ftc.documents import CompanyDocument, multi_search
 
 COMPANY_RECON_TYPE = {"id": "registered-company", "name": "Registered Company"}
 
 
-def do_reconcile_query(
+def reconcile_search(
     query,
     orgtypes="all",
     type_: list[str] = [],
     limit=5,
     properties=[],
     type_strict="should",
-    result_key="result",
 ):
-    if not query:
-        return {result_key: []}
-
+    """
+    Build the search for a company reconciliation query
+    """
     properties = {p.pid: p.v for p in properties} if properties else {}
 
     search_dict = {
@@ -56,9 +55,12 @@ def do_reconcile_query(
             }
         }
 
-    s = CompanyDocument.search().update_from_dict(search_dict)
-    result = s.execute()
+    return CompanyDocument.search().update_from_dict(search_dict)
+
 
+def reconcile_result(query, result, result_key="result"):
+    query_name = normalise_name(query)
+    result_names = normalise_names([o.CompanyName for o in result])
     return {
         result_key: [
             {
@@ -77,7 +79,7 @@ def do_reconcile_query(
                 ],
                 "score": o.meta.score,
                 "match": (
-                    (normalise_name(o.CompanyName) == normalise_name(query))
+                    (result_names[k] == query_name)
                     and (o.meta.score == result.hits.max_score)
                     and (k == 0)
                 ),
@@ -87,6 +89,49 @@ def do_reconcile_query(
     }
 
 
+def do_reconcile_query(
+    query,
+    orgtypes="all",
+    type_: list[str] = [],
+    limit=5,
+    properties=[],
+    type_strict="should",
+    result_key="result",
+):
+    if not query:
+        return {result_key: []}
+
+    s = reconcile_search(
+        query,
+        orgtypes=orgtypes,
+        type_=type_,
+        limit=limit,
+        properties=properties,
+        type_strict=type_strict,
+    )
+    return reconcile_result(query, s.execute(), result_key=result_key)
+
+
+def do_reconcile_queries(queries, orgtypes="all", result_key="result"):
+    """
+    Run a batch of company reconciliation queries using a single multi search
+    request, returning the results using the same keys as `queries`.
+    """
+    searches = {
+        key: (reconcile_search(**query, orgtypes=orgtypes), None)
+        for key, query in queries.items()
+        if query.get("query")
+    }
+    responses = dict(zip(searches.keys(), multi_search(list(searches.values()))))
+
+    return {
+        key: reconcile_result(query["query"], responses[key], result_key=result_key)
+        if key in responses
+        else {result_key: []}
+        for key, query in queries.items()
+    }
+
+
 def do_extend_query(ids, properties):
     all_fields = [p["id"] for p in properties]
     result = {"meta": [{"id": p, "name": p} for p in all_fields], "rows": {}}
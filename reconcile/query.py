@@ -1,9 +1,7 @@
-import copy
 import json
 import os
 
 from charity_django.utils.text import to_titlecase
-from django.conf import settings
 
 from charity.models import (
     CCEWCharityAreaOfOperation,
@@ -12,28 +10,100 @@ from charity.models import (
     CCEWCharityGoverningDocument,
 )
 from findthatcharity.jinja2 import get_orgtypes
-from findthatcharity.utils import normalise_name
-from ftc.documents import OrganisationGroup
+from findthatcharity.utils import normalise_name, normalise_names
+from ftc.documents import OrganisationGroup, multi_search
 from ftc.models import Organisation, OrganisationType
 from ftc.models.organisation_classification import OrganisationClassification
 from reconcile.utils import convert_value
 
+
+class ReconcileQuery:
+    """
+    Precompiled version of the search query in `query.json`.
+
+    The base query is split up once when it is loaded, and `build()` returns a
+    new search body for each request with the term, postcode, domain and
+    filters overlaid. The parts of the base query that don't change are shared
+    between requests rather than copied, so they must not be modified.
+    """
+
+    def __init__(self, template: dict):
+        body = template["inline"]
+        function_score = body["query"]["function_score"]
+
+        self.params = tuple(template["params"])
+        self.body = {k: v for k, v in body.items() if k != "query"}
+        self.function_score = {
+            k: v for k, v in function_score.items() if k not in ("query", "functions")
+        }
+        self.must = function_score["query"]["bool"]["must"]
+        self.functions = tuple(function_score["functions"])
+        # functions that reference the query term are left out without one
+        self.functions_without_term = tuple(
+            f for f in self.functions if "{{" not in json.dumps(f)
+        )
+
+    def build(self, term=None, postcode=None, domain=None, filter_=None):
+        """
+        Return the search body and template params for a query
+        """
+        params = {}
+        if term:
+            params = {param: term for param in self.params}
+            functions = list(self.functions)
+            must = self.must
+        else:
+            functions = list(self.functions_without_term)
+            must = {"match_all": {}}
+
+        # add postcode
+        if postcode:
+            functions.append(
+                {"filter": {"match": {"postalCode": "{{postcode}}"}}, "weight": 2}
+            )
+            params["postcode"] = postcode
+
+        # add domain searching
+        if domain:
+            functions.append(
+                {"filter": {"term": {"domain": "{{domain}}"}}, "weight": 200000}
+            )
+            params["domain"] = domain
+
+        bool_ = {"must": must}
+        if filter_:
+            bool_["filter"] = filter_
+
+        return (
+            {
+                **self.body,
+                "query": {
+                    "function_score": {
+                        **self.function_score,
+                        "query": {"bool": bool_},
+                        "functions": functions,
+                    }
+                },
+            },
+            params,
+        )
+
+
 with open(os.path.join(os.path.dirname(__file__), "query.json")) as a:
-    RECONCILE_QUERY = json.load(a)
+    RECONCILE_QUERY = ReconcileQuery(json.load(a))
 
 
-def do_reconcile_query(
+def reconcile_search(
     query: str,
     orgtypes: list[OrganisationType] = [],
     type_: list[OrganisationType] = [],
     limit: int = 5,
     properties: list[dict] = [],
     type_strict="should",
-    result_key="result",
 ):
-    if not query:
-        return {result_key: []}
-
+    """
+    Build the search and template params for a reconciliation query
+    """
     if type_:
         orgtypes = type_ + orgtypes
 
@@ -46,9 +116,12 @@ def do_reconcile_query(
         domain=properties_parsed.get("domain"),
     )
     q = OrganisationGroup.search().update_from_dict(query_template)[:limit]
-    result = q.execute(params=params)
-    all_orgtypes = get_orgtypes()
+    return q, params
+
 
+def reconcile_result(query: str, result, all_orgtypes, result_key="result"):
+    query_name = normalise_name(query)
+    result_names = normalise_names([o.name for o in result])
     return {
         result_key: [
             {
@@ -70,7 +143,7 @@ def do_reconcile_query(
                     if ot != o.organisationTypePrimary and ot in all_orgtypes
                 ],
                 "score": o.meta.score,
-                "match": (normalise_name(o.name) == normalise_name(query))
+                "match": (result_names[k] == query_name)
                 and (o.meta.score == result.hits.max_score)
                 and (k == 0),
             }
@@ -79,6 +152,59 @@ def do_reconcile_query(
     }
 
 
+def do_reconcile_query(
+    query: str,
+    orgtypes: list[OrganisationType] = [],
+    type_: list[OrganisationType] = [],
+    limit: int = 5,
+    properties: list[dict] = [],
+    type_strict="should",
+    result_key="result",
+):
+    if not query:
+        return {result_key: []}
+
+    q, params = reconcile_search(
+        query,
+        orgtypes=orgtypes,
+        type_=type_,
+        limit=limit,
+        properties=properties,
+        type_strict=type_strict,
+    )
+    result = q.execute(params=params)
+    return reconcile_result(query, result, get_orgtypes(), result_key=result_key)
+
+
+def do_reconcile_queries(
+    queries: dict[str, dict],
+    orgtypes: list[OrganisationType] = [],
+    result_key="result",
+):
+    """
+    Run a batch of reconciliation queries using a single multi search request.
+
+    `queries` is a dictionary of query keys to the keyword arguments for
+    `do_reconcile_query`, and the results are returned using the same keys.
+    """
+    searches = {
+        key: reconcile_search(**query, orgtypes=orgtypes)
+        for key, query in queries.items()
+        if query.get("query")
+    }
+    responses = dict(zip(searches.keys(), multi_search(list(searches.values()))))
+    all_orgtypes = get_orgtypes()
+
+    return {
+        key: reconcile_result(
+            query["query"], responses[key], all_orgtypes, result_key=result_key
+        )
+        if key in responses
+        else {result_key: []}
+        for key, query in queries.items()
+    }
+
+
 def do_extend_query(ids, properties):
     result = {"meta": [], "rows": {}}
     all_fields = [p["id"] for p in properties]
@@ -176,36 +302,6 @@ def recon_query(
     """
     Fetch the reconciliation query and insert the query term
     """
-    if settings.DEBUG:
-        with open(os.path.join(os.path.dirname(__file__), "query.json")) as a:
-            json_q = json.load(a)
-    else:
-        json_q = copy.deepcopy(RECONCILE_QUERY)
-
-    params = {}
-
-    if term:
-        for param in json_q["params"]:
-            params[param] = term
-    else:
-        json_q["inline"]["query"]["function_score"]["query"]["bool"]["must"] = {
-            "match_all": {}
-        }
-
-    # add postcode
-    if postcode:
-        json_q["inline"]["query"]["function_score"]["functions"].append(
-            {"filter": {"match": {"postalCode": "{{postcode}}"}}, "weight": 2}
-        )
-        params["postcode"] = postcode
-
-    # add domain searching
-    if domain:
-        json_q["inline"]["query"]["function_score"]["functions"].append(
-            {"filter": {"term": {"domain": "{{domain}}"}}, "weight": 200000}
-        )
-        params["domain"] = domain
-
     # check for organisation type
     filter_ = []
     if orgtypes and orgtypes != "all":
@@ -217,10 +313,9 @@ def recon_query(
     if source:
         filter_.append({"term": {"source": source}})
 
-    if filter_:
-        json_q["inline"]["query"]["function_score"]["query"]["bool"]["filter"] = filter_
-
-    return (json_q["inline"], params)
+    return RECONCILE_QUERY.build(
+        term, postcode=postcode, domain=domain, filter_=filter_
+    )
 
 
 def autocomplete_query(term, orgtype="all"):
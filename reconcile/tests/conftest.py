@@ -56,6 +56,16 @@ class ReconTestCase(TestCase):
         # set up jsonschema registry
         self.registry = Registry(retrieve=retrieve_schema_from_filesystem)
 
+    def mock_msearch(self, response):
+        """
+        Return `response` for every search in a multi search request
+        """
+
+        def msearch(body, **kwargs):
+            return {"responses": [response] * (len(body) // 2)}
+
+        self.mock_es.return_value.msearch.side_effect = msearch
+
     def do_request(self, method, *args, **kwargs):
         if method == "GET":
             return self.client.get(*args, **kwargs)
@@ -59,7 +59,7 @@ class TestReconcileAllAPI(ReconTestCase):
 
     def test_reconcile(self):
         expected_tests = 6
-        self.mock_es.return_value.search.return_value = RECON_RESPONSE
+        self.mock_msearch(RECON_RESPONSE)
         for base_url, schema_version, schema, method in self.get_test_cases(
             "reconciliation-result-batch.json", RECON_BASE_URLS, ["GET", "POST"]
         ):
@@ -90,7 +90,7 @@ class TestReconcileAllAPI(ReconTestCase):
 
     def test_reconcile_empty_query(self):
         expected_tests = 6
-        self.mock_es.return_value.search.return_value = RECON_RESPONSE
+        self.mock_msearch(RECON_RESPONSE)
         for base_url, schema_version, schema, method in self.get_test_cases(
             "reconciliation-result-batch.json", RECON_BASE_URLS, ["GET", "POST"]
         ):
@@ -120,7 +120,7 @@ class TestReconcileAllAPI(ReconTestCase):
 
     def test_reconcile_with_type(self):
         expected_tests = 6
-        self.mock_es.return_value.search.return_value = RECON_RESPONSE
+        self.mock_msearch(RECON_RESPONSE)
 
         for base_url, schema_version, schema, method in self.get_test_cases(
             "reconciliation-result-batch.json", RECON_BASE_URLS, ["GET", "POST"]
@@ -163,9 +163,13 @@ class TestReconcileAllAPI(ReconTestCase):
                 expected_tests -= 1
         self.assertEqual(expected_tests, 0)
 
+        # each batch is sent to elasticsearch in a single request
+        self.assertEqual(self.mock_es.return_value.msearch.call_count, 6)
+        self.mock_es.return_value.search.assert_not_called()
+
     def test_reconcile_empty(self):
         expected_tests = 6
-        self.mock_es.return_value.search.return_value = EMPTY_RESPONSE
+        self.mock_msearch(EMPTY_RESPONSE)
 
         for base_url, schema_version, schema, method in self.get_test_cases(
             "reconciliation-result-batch.json", RECON_BASE_URLS, ["GET", "POST"]
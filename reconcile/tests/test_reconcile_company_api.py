@@ -100,7 +100,7 @@ class TestCompanyReconcileAPI(ReconTestCase):
                 )
 
     def test_company_reconcile(self):
-        self.mock_es.return_value.search.return_value = RECON_RESPONSE
+        self.mock_msearch(RECON_RESPONSE)
 
         for base_url, schema_version, schema, method in self.get_test_cases(
             "reconciliation-result-batch.json", RECON_BASE_URLS, ["GET", "POST"]
@@ -129,7 +129,7 @@ class TestCompanyReconcileAPI(ReconTestCase):
                 )
 
     def test_company_reconcile_two(self):
-        self.mock_es.return_value.search.return_value = RECON_RESPONSE
+        self.mock_msearch(RECON_RESPONSE)
 
         for base_url, schema_version, schema, method in self.get_test_cases(
             "reconciliation-result-batch.json", RECON_BASE_URLS, ["GET", "POST"]
@@ -171,7 +171,7 @@ class TestCompanyReconcileAPI(ReconTestCase):
                 )
 
     def test_reconcile_empty(self):
-        self.mock_es.return_value.search.return_value = EMPTY_RESPONSE
+        self.mock_msearch(EMPTY_RESPONSE)
 
         for base_url, schema_version, schema, method in self.get_test_cases(
             "reconciliation-result-batch.json", RECON_BASE_URLS, ["GET", "POST"]
@@ -199,7 +199,7 @@ class TestCompanyReconcileAPI(ReconTestCase):
                 )
 
     def test_reconcile_empty_query(self):
-        self.mock_es.return_value.search.return_value = RECON_RESPONSE
+        self.mock_msearch(RECON_RESPONSE)
 
         for base_url, schema_version, schema, method in self.get_test_cases(
             "reconciliation-result-batch.json", RECON_BASE_URLS, ["GET", "POST"]
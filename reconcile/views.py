@@ -8,7 +8,7 @@ from django.views.decorators.csrf import csrf_exempt
 from findthatcharity.jinja2 import get_orgtypes
 from ftc.documents import OrganisationGroup
 from ftc.models import Organisation, OrganisationType, Vocabulary
-from reconcile.query import do_extend_query, do_reconcile_query
+from reconcile.query import do_extend_query, do_reconcile_queries
 
 
 @csrf_exempt
@@ -23,14 +23,12 @@ def index(request, orgtype="all"):
     queries = request.POST.get("queries", request.GET.get("queries"))
     if queries:
         queries = json.loads(queries)
-        results = {}
-        for query_id, query in queries.items():
+        for query in queries.values():
             if "type" in query:
                 query["type_"] = query.pop("type")
                 if query["type_"]:
                     query["type_"] = [OrganisationType.objects.get(slug=query["type_"])]
-            results[query_id] = do_reconcile_query(**query, orgtypes=orgtypes)
-        return JsonResponse(results)
+        return JsonResponse(do_reconcile_queries(queries, orgtypes=orgtypes))
 
     extend = request.POST.get("extend", request.GET.get("extend"))
     if extend:
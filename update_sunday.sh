@@ -1,5 +1 @@
-python ./manage.py import_all
-python ./manage.py import_charities
-python ./manage.py import_other_data
-python ./manage.py update_geodata
-python ./manage.py es_index
\ No newline at end of file
+python ./manage.py run_pipeline sunday --workers 2
\ No newline at end of file